@@ -21,7 +21,7 @@ PLUGIN_VERSION       = '.'.join([str(x) for x in PLUGIN_VERSION_TUPLE])
 PLUGIN_AUTHOR        = 'Thiago Oliveira'
 
 
-class AcePlugin(EditBookToolPlugin):
+class AcePlugin(EditBookToolPlugin, InterfaceActionBase):
 
     name                    = PLUGIN_NAME
     description             = PLUGIN_DESCRIPTION
@@ -33,7 +33,9 @@ class AcePlugin(EditBookToolPlugin):
     #: This field defines the GUI plugin class that contains all the code
     #: that actually does something. Its format is module_path:class_name
     #: The specified class must be defined in the specified module.
-    actual_plugin           = 'calibre_plugins.ACE.main:AceTool'
+    #: The editor tool is found by the editor in main.py; this one is the
+    #: action that checks books from the library.
+    actual_plugin           = 'calibre_plugins.ACE.batch:AceBatchAction'
 
     def is_customizable(self):
         '''
@@ -70,3 +72,10 @@ class AcePlugin(EditBookToolPlugin):
         :param config_widget: The widget returned by :meth:`config_widget`.
         '''
         config_widget.save_settings()
+
+    def cli_main(self, argv):
+        '''
+        Run the headless checker: calibre-debug -r ACE -- [options] book.epub ...
+        '''
+        from calibre_plugins.ACE.cli import main
+        raise SystemExit(main(argv))
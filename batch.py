@@ -0,0 +1,230 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Standard libraries
+import threading
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+# PyQt libraries
+try:
+    from qt.core import (Qt, QObject, pyqtSignal, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QProgressBar,
+                         QTreeWidget, QTreeWidgetItem, QDialogButtonBox, QPushButton)
+except ImportError:
+    from PyQt5.Qt import (Qt, QObject, pyqtSignal, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QProgressBar,
+                          QTreeWidget, QTreeWidgetItem, QDialogButtonBox, QPushButton)
+
+# Calibre libraries
+from calibre.gui2 import error_dialog
+from calibre.gui2.actions import InterfaceAction
+
+# Plugin libraries
+# The library action is created when calibre starts: the modules used to
+# check books are loaded by the first check.
+from calibre_plugins.ACE.store import SEVERITIES
+
+# Load translation files (.mo) on the folder 'translations'
+load_translations()
+
+
+# Checks many books with a bounded number of ACE processes at a time
+class BatchChecker(QObject):
+
+    # Emitted with a BookSummary for each checked book
+    book_done = pyqtSignal(object)
+    # Emitted once all books are checked, or the batch was cancelled
+    all_done = pyqtSignal()
+
+    def __init__(self, books, user_lang, split_lines, workers, parent=None):
+        QObject.__init__(self, parent)
+        # (book_id, title, epub_path)
+        self.books = list(books)
+        self.user_lang = user_lang
+        self.split_lines = split_lines
+        self.workers = max(1, workers)
+        self.queue = Queue()
+        self.cancelled = False
+        self.processes = set()
+        self.lock = threading.Lock()
+        self.running = 0
+
+    def start(self):
+        for book in self.books:
+            self.queue.put(book)
+        self.running = min(self.workers, len(self.books))
+        if not self.running:
+            self.all_done.emit()
+        for i in range(self.running):
+            t = threading.Thread(target=self.work, name='ACE batch check')
+            t.daemon = True
+            t.start()
+
+    def work(self):
+        from calibre_plugins.ACE.runner import check_book
+        while not self.cancelled:
+            try:
+                book_id, title, epub_path = self.queue.get_nowait()
+            except Empty:
+                break
+            summary = check_book(book_id, title, epub_path, self.user_lang, self.split_lines,
+                                 on_start=self.process_started)
+            if not self.cancelled:
+                self.book_done.emit(summary)
+        with self.lock:
+            self.running -= 1
+            last = self.running == 0
+        if last:
+            self.all_done.emit()
+
+    def process_started(self, process):
+        with self.lock:
+            self.processes = set(p for p in self.processes if p.poll() is None)
+            self.processes.add(process)
+            cancelled = self.cancelled
+        if cancelled:
+            process.kill()
+
+    # Stop checking: queued books are dropped and running checks are killed
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            processes = list(self.processes)
+        for process in processes:
+            try:
+                if process.poll() is None:
+                    process.kill()
+            except EnvironmentError:
+                pass
+
+
+# Progress and summary of a batch check
+class BatchDialog(QDialog):
+
+    def __init__(self, checker, parent=None):
+        QDialog.__init__(self, parent)
+        self.checker = checker
+        self.total = len(checker.books)
+        self.done = 0
+        self.failed = 0
+        self.setWindowTitle(_('ACE: checking {} books').format(self.total))
+        self.setWindowIcon(get_icons('images/icon.png'))
+        self.resize(800, 500)
+        layout = QVBoxLayout(self)
+
+        self.progress = QProgressBar(self)
+        self.progress.setRange(0, self.total)
+        layout.addWidget(self.progress)
+        self.status = QLabel(self)
+        layout.addWidget(self.status)
+
+        self.table = QTreeWidget(self)
+        self.table.setRootIsDecorated(False)
+        self.table.setUniformRowHeights(True)
+        self.table.setHeaderLabels([_('Title'), _('Result'), _('Critical'), _('Serious'),
+                                    _('Moderate'), _('Minor')])
+        self.table.setSortingEnabled(True)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        self.cancel_button = QPushButton(_('&Cancel'), self)
+        self.cancel_button.clicked.connect(self.cancel)
+        buttons.addWidget(self.cancel_button)
+        self.button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        self.button_box.rejected.connect(self.reject)
+        buttons.addWidget(self.button_box)
+        layout.addLayout(buttons)
+
+        self.result_labels = {'pass': _('Pass'), 'fail': _('Fail'), 'error': _('Error')}
+        checker.book_done.connect(self.book_done)
+        checker.all_done.connect(self.all_done)
+        self.update_status()
+
+    def update_status(self):
+        self.progress.setValue(self.done)
+        self.status.setText(_('{0} of {1} books checked, {2} with errors.').format(
+            self.done, self.total, self.failed))
+
+    def book_done(self, summary):
+        self.done += 1
+        if summary.status != 'pass':
+            self.failed += 1
+        item = QTreeWidgetItem([summary.title, self.result_labels[summary.status]])
+        for column, severity in enumerate(SEVERITIES, 2):
+            item.setData(column, Qt.DisplayRole, summary.counts[severity])
+        if summary.error:
+            item.setToolTip(1, summary.error[-2000:])
+        self.table.addTopLevelItem(item)
+        self.update_status()
+
+    def all_done(self):
+        # The command line found by the checks is saved on this thread
+        from calibre_plugins.ACE.runner import ace_executable
+        ace_executable.save()
+        self.cancel_button.setEnabled(False)
+        if self.checker.cancelled:
+            self.status.setText(self.status.text() + ' ' + _('Cancelled.'))
+        for column in range(1, 6):
+            self.table.resizeColumnToContents(column)
+
+    def cancel(self):
+        self.checker.cancel()
+        self.cancel_button.setEnabled(False)
+
+    def reject(self):
+        self.checker.cancel()
+        QDialog.reject(self)
+
+
+# Library action: check the accessibility of the selected books
+class AceBatchAction(InterfaceAction):
+
+    name = 'ACE'
+    action_spec = (_('ACE'), None, _('Check the accessibility of the selected books with ACE'), None)
+    action_type = 'current'
+    dont_add_to = frozenset(['context-menu-device'])
+
+    def genesis(self):
+        self.qaction.setIcon(get_icons('images/icon.png'))
+        self.qaction.triggered.connect(self.check_selected_books)
+
+    def check_selected_books(self):
+        import calibre_plugins.ACE.prefs as cfg
+        rows = self.gui.library_view.selectionModel().selectedRows()
+        if not rows:
+            return error_dialog(self.gui, _('No books selected'),
+                                _('Select the books to check with ACE.'), show=True)
+        db = self.gui.current_db.new_api
+        book_ids = list(map(self.gui.library_view.model().id, rows))
+        books = []
+        skipped = []
+        for book_id in book_ids:
+            title = db.field_for('title', book_id)
+            if db.has_format(book_id, 'EPUB'):
+                books.append((book_id, title, db.format_abspath(book_id, 'EPUB')))
+            else:
+                skipped.append(title)
+        if not books:
+            return error_dialog(self.gui, _('No EPUB books'),
+                                _('None of the selected books has an EPUB format.'), show=True)
+
+        checker = BatchChecker(books, cfg.user_language(), cfg.plugin_prefs['split_lines'],
+                               cfg.plugin_prefs['batch_workers'])
+        d = BatchDialog(checker, self.gui)
+        if skipped:
+            d.status.setToolTip(_('Books without an EPUB format:') + '\n' + '\n'.join(skipped))
+        checker.setParent(d)
+        checker.start()
+        d.exec_()
+        # Cancelled checks may still be ending: their threads hold the checker until then
+        checker.setParent(None)
+        d.deleteLater()
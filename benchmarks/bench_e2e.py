@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# End-to-end benchmarks of a check, like AceTool.run does it
+# Each book of the corpus (see corpus.py) is opened like the editor opens
+# it, then checked with the fake ACE (see fake_ace.py), so no Node.js,
+# Chromium or network access is needed:
+#  - save: an edit of one document is committed to the container
+#  - clone: the container is cloned (clone_container)
+#  - write, ace, parse, lines...: the AceWorker phases, in its own thread
+#  - dock: the results are added to a model and a tree view, in the GUI thread
+# The wall-clock time and the peak resident memory of the calibre process
+# are measured for each phase (phases overlap, as the GUI shows the rows
+# while the worker parses the report).
+#
+# The book itself must not change: if a check writes to it, the run fails.
+#
+# Modes:
+#  zipped: the book is written to an EPUB file for ACE
+#  unpacked: ACE checks the folder of the cloned container
+#  parallel: unpacked, and large books are split between several ACE processes
+#  cache: unpacked, with the report cache (the second, cached, check is measured)
+#  incremental: unpacked, one document is edited and checked again (the second check is measured)
+#  live: unpacked, only the edited document is checked, like the live checks of the editor
+#
+# Run with: calibre-debug -e benchmarks/bench_e2e.py [--sizes tiny,small,medium] [--modes zipped,unpacked]
+#               [--delay 1] [--per-document 0.01] [--repeat 3] [--corpus folder] [-o results.jsonl]
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stubs  # noqa
+import corpus  # noqa
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKE_ACE = os.path.join(HERE, 'fake_ace.py')
+FAKE_VERSION = '1.3.2'
+
+MODES = OrderedDict([
+    ('zipped', dict(unpacked=False)),
+    ('unpacked', dict(unpacked=True)),
+    ('parallel', dict(unpacked=True, parallel_parts=0)),
+    ('cache', dict(unpacked=True, cache=True)),
+    ('incremental', dict(unpacked=True, incremental_check=True)),
+    ('live', dict(unpacked=True, live=True)),
+])
+DEFAULT_SIZES = ('tiny', 'small', 'medium', 'large')
+
+
+# Current resident memory of this process in bytes, or None if unknown
+def current_rss():
+    try:
+        import psutil
+    except ImportError:
+        pass
+    else:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf(str('SC_PAGE_SIZE'))
+    except (EnvironmentError, ValueError, IndexError):
+        return None
+
+
+# Peak resident memory of the finished child processes (the ACE processes), in bytes
+def children_peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# Samples the resident memory while phases are running, to get their peaks
+class RssSampler(threading.Thread):
+
+    def __init__(self, interval=0.005):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.interval = interval
+        # Phase name -> [times entered, peak]
+        self.active = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def enter(self, name):
+        rss = current_rss() or 0
+        with self.lock:
+            entry = self.active.setdefault(name, [0, 0])
+            entry[0] += 1
+            entry[1] = max(entry[1], rss)
+
+    # Returns the peak since the phase was entered
+    def leave(self, name):
+        rss = current_rss() or 0
+        with self.lock:
+            entry = self.active[name]
+            entry[0] -= 1
+            entry[1] = max(entry[1], rss)
+            if entry[0] == 0:
+                del self.active[name]
+            return entry[1]
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            rss = current_rss() or 0
+            with self.lock:
+                for entry in self.active.values():
+                    entry[1] = max(entry[1], rss)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def measured_timer_class():
+    from calibre_plugins.ACE.timing import PhaseTimer
+
+    # A PhaseTimer that also records the peak memory of each phase
+    class MeasuredTimer(PhaseTimer):
+
+        def __init__(self, sampler):
+            PhaseTimer.__init__(self)
+            self.sampler = sampler
+            self.peaks = OrderedDict()
+
+        @contextmanager
+        def phase(self, name):
+            self.sampler.enter(name)
+            try:
+                with PhaseTimer.phase(self, name):
+                    yield
+            finally:
+                peak = self.sampler.leave(name)
+                with self.lock:
+                    self.peaks[name] = max(self.peaks.get(name, 0), peak)
+
+    return MeasuredTimer
+
+
+# Point the plugin to the fake ACE, run by the given Python interpreter
+def use_fake_ace(python, delay, per_document, assertions):
+    from calibre_plugins.ACE.runner import ace_executable, file_stamp
+    os.environ['ACE_FAKE_DELAY'] = str(delay)
+    os.environ['ACE_FAKE_PER_DOCUMENT'] = str(per_document)
+    os.environ['ACE_FAKE_ASSERTIONS'] = str(assertions)
+    os.environ['ACE_FAKE_VERSION'] = FAKE_VERSION
+    ace_executable.prefs = None
+    ace_executable.entry = {'node': python, 'script': FAKE_ACE, 'version': FAKE_VERSION,
+                            'node_stamp': file_stamp(python), 'script_stamp': file_stamp(FAKE_ACE)}
+
+
+def default_python():
+    if not getattr(sys, 'frozen', False):
+        return sys.executable
+    from calibre_plugins.ACE.runner import which
+    return which('python3') or which('python')
+
+
+# The dock of AceTool: rows are added as they come, then the columns are sized
+class Dock(object):
+
+    def __init__(self, timer):
+        self.timer = timer
+        self.model = None
+        self.tree = None
+        self.result = None
+
+    def create(self):
+        from calibre_plugins.ACE.results import ResultsModel
+        try:
+            from qt.core import QTreeView
+        except ImportError:
+            from PyQt5.Qt import QTreeView
+        self.model = ResultsModel()
+        self.tree = QTreeView()
+        self.tree.setRootIsDecorated(False)
+        self.tree.setUniformRowHeights(True)
+        self.tree.setModel(self.model)
+
+    def rows_ready(self, rows):
+        with self.timer.phase('dock'):
+            if self.model is None:
+                self.create()
+            self.model.append(rows)
+
+    def check_finished(self, result):
+        with self.timer.phase('dock'):
+            if self.model is None:
+                self.create()
+                self.model.append(result.error_messages)
+            self.tree.resizeColumnToContents(self.model.FILE)
+            self.tree.resizeColumnToContents(self.model.LINE)
+            self.tree.setSortingEnabled(True)
+        self.result = result
+
+
+# Edit a document of the book, like typing in the editor
+def edit_document(container, number):
+    name = container.href_to_name(corpus.chapter_name(number), container.opf_name)
+    root = container.parsed(name)
+    body = root[-1]
+    for section in body:
+        p = section.makeelement(section[-1].tag)
+        p.text = 'Edited at %f' % time.time()
+        section.append(p)
+        break
+    container.dirty(name)
+
+
+class Runner(object):
+
+    def __init__(self, work_dir, sampler):
+        self.work_dir = work_dir
+        self.sampler = sampler
+        self.timer_class = measured_timer_class()
+
+    # Check the book like AceTool.run, and return the timings
+    def check(self, container, settings, state=None, cache=None, edit=True):
+        from calibre.ebooks.oeb.polish.container import clone_container
+        from calibre_plugins.ACE.worker import AceWorker
+        try:
+            from qt.core import QEventLoop
+        except ImportError:
+            from PyQt5.Qt import QEventLoop
+
+        timer = self.timer_class(self.sampler)
+        if edit:
+            with timer.phase('save'):
+                edit_document(container, 1)
+        td = tempfile.mkdtemp(dir=self.work_dir)
+        container_dir = os.path.join(td, 'container')
+        os.mkdir(container_dir)
+        with timer.phase('clone'):
+            clone = clone_container(container, container_dir)
+        report_folder = os.path.join(self.work_dir, 'report')
+
+        only = None
+        if settings.get('live'):
+            only = {container.href_to_name(corpus.chapter_name(1), container.opf_name)}
+        dock = Dock(timer)
+        worker = AceWorker(clone, td, report_folder, 'en', False, None, settings.get('incremental_check', False),
+                           state, cache, FAKE_VERSION, settings.get('parallel_parts'),
+                           settings.get('unpacked', True), None, container.path_to_ebook, timer, only=only)
+        worker.rows_ready.connect(dock.rows_ready)
+        worker.result_ready.connect(dock.check_finished)
+        loop = QEventLoop()
+        worker.finished.connect(loop.quit)
+        worker.start()
+        loop.exec_()
+        worker.wait()
+
+        result = dock.result
+        record = OrderedDict()
+        record['total'] = round(timer.total(), 3)
+        record['phases'] = OrderedDict((name, round(duration, 3)) for name, duration in timer.phases.items())
+        record['peak_rss'] = OrderedDict((name, peak) for name, peak in timer.peaks.items())
+        record['rows'] = len(result.error_messages)
+        record['rechecked'] = result.rechecked
+        record['cached'] = result.cached
+        record['error'] = result.traceback or (result.stderr.strip() if result.return_code == 1 else None)
+        record.update(timer.stats)
+        return record, result
+
+    def measure(self, book_path, mode):
+        from calibre.ebooks.oeb.polish.container import get_container
+        settings = MODES[mode]
+        stamp = file_stamp(book_path)
+        start = time.time()
+        container = get_container(book_path, tweak_mode=True)
+        opened = time.time() - start
+        cache = None
+        if settings.get('cache'):
+            from calibre_plugins.ACE.cache import ReportCache
+            cache = ReportCache(tempfile.mkdtemp(dir=self.work_dir), 1024 * 1024 * 1024)
+        try:
+            record, result = self.check(container, settings, cache=cache)
+            # Measure the second check, once the first one has filled the cache or the state
+            if cache is not None:
+                # The cache is only used if the book didn't change
+                record, result = self.check(container, settings, cache=cache, edit=False)
+            elif settings.get('incremental_check'):
+                record, result = self.check(container, settings, state=result.state)
+        finally:
+            shutil.rmtree(container.root, ignore_errors=True)
+        record['open'] = round(opened, 3)
+        # Checks work on clones: the book itself must never be written
+        record['book_changed'] = file_stamp(book_path) != stamp
+        if record['book_changed']:
+            record['error'] = 'The check changed the original book on disk'
+            # Build it again for the next checks
+            os.remove(book_path)
+        return record
+
+
+def file_stamp(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime
+
+
+def megabytes(value):
+    return '%7.1f MB' % (value / (1024 * 1024)) if value else '      - MB'
+
+
+def print_record(size, mode, record):
+    print('\n%s / %s: %.3f s total, %d rows%s%s' % (
+        size, mode, record['total'], record['rows'],
+        ', %d documents checked again' % record['rechecked'] if record['rechecked'] else '',
+        ', from the cache' if record['cached'] else ''))
+    if record['error']:
+        print('  ERROR: %s' % record['error'].splitlines()[-1])
+    print('  %-12s %9.3f s' % ('open', record['open']))
+    for name, duration in record['phases'].items():
+        print('  %-12s %9.3f s  %s' % (name, duration, megabytes(record['peak_rss'].get(name))))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark complete ACE checks with a fake ACE')
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES),
+                        help='Books of the corpus to check: %s (default: %%(default)s)' % ', '.join(corpus.ORDER))
+    parser.add_argument('--modes', default=','.join(MODES), help='Modes to compare (default: %(default)s)')
+    parser.add_argument('--delay', type=float, default=1.0,
+                        help='Seconds the fake ACE takes to start (default: %(default)s)')
+    parser.add_argument('--per-document', type=float, default=0.01,
+                        help='Seconds the fake ACE takes for each document (default: %(default)s)')
+    parser.add_argument('--assertions', type=int, default=10,
+                        help='Assertions per document in the fake reports (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Checks of each book in each mode; the median one is shown (default: %(default)s)')
+    parser.add_argument('--corpus', default=os.path.join(tempfile.gettempdir(), 'ace_bench_corpus'),
+                        help='Folder of the generated books (default: %(default)s)')
+    parser.add_argument('--python', default=None, help='Python interpreter to run the fake ACE with')
+    parser.add_argument('-o', '--output', help='Append the results to this file, as lines of JSON')
+    opts = parser.parse_args(argv[1:])
+
+    stubbed = stubs.install()
+    if 'calibre' in stubbed:
+        print('The end-to-end benchmarks need calibre: run them with calibre-debug -e', file=sys.stderr)
+        return 2
+    if stubs.application() is None:
+        print('The end-to-end benchmarks need Qt', file=sys.stderr)
+        return 2
+    python = opts.python or default_python()
+    if python is None:
+        print('Python not found: use --python', file=sys.stderr)
+        return 2
+    use_fake_ace(python, opts.delay, opts.per_document, opts.assertions)
+
+    sampler = RssSampler()
+    sampler.start()
+    work_dir = tempfile.mkdtemp(prefix='ace_e2e_')
+    runner = Runner(work_dir, sampler)
+    output = open(opts.output, 'a') if opts.output else None
+    changed = []
+    try:
+        for size in opts.sizes.split(','):
+            book_path = corpus.fixture(opts.corpus, size)
+            for mode in opts.modes.split(','):
+                records = sorted((runner.measure(book_path, mode) for i in range(opts.repeat)),
+                                 key=lambda record: record['total'])
+                record = records[len(records) // 2]
+                print_record(size, mode, record)
+                if any(checked['book_changed'] for checked in records):
+                    changed.append('%s / %s' % (size, mode))
+                if output is not None:
+                    line = OrderedDict([('size', size), ('mode', mode), ('delay', opts.delay),
+                                        ('per_document', opts.per_document)])
+                    line.update(record)
+                    output.write(json.dumps(line) + '\n')
+    finally:
+        sampler.stop()
+        if output is not None:
+            output.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print('\nPeak memory of the ACE processes: %s' % megabytes(children_peak_rss()).strip())
+    if changed:
+        print('\nThe original book was changed by: %s' % ', '.join(changed))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
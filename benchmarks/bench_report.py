@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Benchmarks of report parsing and dock population
+# For each scenario, a synthetic report.json is generated (see synthetic.py)
+# and these are measured:
+#  - parse: report.parse_report, best of a few runs
+#  - memory: peak memory allocated by Python while parsing (tracemalloc)
+#  - populate: filling a results.ResultsModel in batches of 500 rows, like
+#    AceTool.rows_ready does while the report is parsed
+#  - dock_memory: memory kept by the filled model, for as long as the dock is open
+#  - sort: sorting the model by each column, like clicking the dock headers
+#  - filter: building the filter index and typing a search, then choosing a
+#    severity, a file and a rule in the filter bar (see ResultsModel.set_filter)
+#  - view: showing the model in a QTreeView and sizing its columns, like
+#    AceTool.finish_dock (only with the real Qt)
+# Results are compared with baseline.json; ratios over the threshold are
+# marked as regressions. Baselines depend on the machine: save your own
+# with --save before comparing changes.
+#
+# Run with: python benchmarks/bench_report.py [--quick] [--save] [--check] [--threshold 1.25]
+# (or calibre-debug -e benchmarks/bench_report.py, to use calibre's modules)
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stubs  # noqa
+import synthetic  # noqa
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+SCENARIOS = [
+    ('small', dict(documents=10, assertions=20)),
+    ('medium', dict(documents=100, assertions=50)),
+    ('snippets', dict(documents=100, assertions=50, snippet_size=2000, epub_type_ratio=1.0)),
+    ('large', dict(documents=500, assertions=100, images=5000)),
+]
+QUICK = ('small', 'medium')
+# Metrics where lower is better, and their units
+METRICS = [('parse', 's'), ('memory', 'MB'), ('populate', 's'), ('dock_memory', 'MB'), ('sort', 's'), ('filter', 's'),
+           ('view', 's')]
+
+
+def best_of(func, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def peak_memory(func):
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def retained_memory(func):
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        kept = func()  # noqa
+        return tracemalloc.get_traced_memory()[0] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def run_scenario(path, rows_per_batch=500, repeat=5):
+    from calibre_plugins.ACE.report import parse_report
+    from calibre_plugins.ACE.results import ResultsModel
+    results = {}
+    results['parse'] = best_of(lambda: parse_report(path, True), repeat)
+    results['memory'] = peak_memory(lambda: parse_report(path, True))
+    earl_outcome, error_messages = parse_report(path, True)
+    results['rows'] = len(error_messages)
+
+    def populate():
+        model = ResultsModel()
+        for i in range(0, len(error_messages), rows_per_batch):
+            model.append(error_messages[i:i + rows_per_batch])
+        return model
+    results['populate'] = best_of(populate, repeat)
+    results['dock_memory'] = retained_memory(populate)
+
+    model = populate()
+
+    def sort():
+        for column in range(model.columnCount()):
+            model.sort(column)
+        model.sort(-1)
+    results['sort'] = best_of(sort, repeat)
+
+    file_name = error_messages.files.strings[len(error_messages.files) // 2]
+    rule = error_messages.rule(0)
+
+    def filter_rows():
+        model.row_index = None
+        model.sort(ResultsModel.SEVERITY)
+        text = ''
+        for char in 'element has':
+            text += char
+            model.set_filter(text=text)
+        model.set_filter(1, None, None, text)
+        model.set_filter(1, file_name, None, text)
+        model.set_filter(None, None, rule, '')
+        model.set_filter()
+        model.sort(-1)
+    results['filter'] = best_of(filter_rows, repeat)
+
+    if stubs.application() is not None:
+        try:
+            from qt.core import QTreeView
+        except ImportError:
+            from PyQt5.Qt import QTreeView
+
+        def view():
+            tree = QTreeView()
+            tree.setUniformRowHeights(True)
+            tree.setModel(populate())
+            tree.resizeColumnToContents(ResultsModel.FILE)
+            tree.resizeColumnToContents(ResultsModel.LINE)
+            tree.setSortingEnabled(True)
+        results['view'] = best_of(view, repeat)
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark report parsing and dock population')
+    parser.add_argument('--quick', action='store_true', help='Only run the small scenarios')
+    parser.add_argument('--save', action='store_true', help='Save the results as the new baseline')
+    parser.add_argument('--check', action='store_true', help='Exit with code 1 if there are regressions')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='Ratio to the baseline considered a regression (default: %(default)s)')
+    opts = parser.parse_args(argv[1:])
+
+    stubbed = stubs.install()
+    if stubbed:
+        print('Using stubs for: %s' % ', '.join(stubbed))
+    try:
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+    except (EnvironmentError, ValueError):
+        baseline = {}
+
+    tdir = tempfile.mkdtemp(prefix='ace_bench_')
+    measured = {}
+    regressions = []
+    try:
+        for name, params in SCENARIOS:
+            if opts.quick and name not in QUICK:
+                continue
+            path = os.path.join(tdir, name + '.json')
+            synthetic.write_report(path, **params)
+            results = measured[name] = run_scenario(path)
+            results['size'] = os.path.getsize(path) / (1024 * 1024)
+            for key in results:
+                results[key] = round(results[key], 4)
+            print('\n%s: %d rows, %.1f MB report' % (name, results['rows'], results['size']))
+            for metric, unit in METRICS:
+                if metric not in results:
+                    continue
+                value = results[metric]
+                line = '  %-9s %9.3f %s' % (metric, value, unit)
+                base = baseline.get(name, {}).get(metric)
+                if base:
+                    ratio = value / base
+                    line += '   baseline %9.3f  x%.2f' % (base, ratio)
+                    # Very short timings are mostly noise
+                    if ratio > opts.threshold and value - base > 0.005:
+                        line += '  REGRESSION'
+                        regressions.append('%s/%s' % (name, metric))
+                print(line)
+    finally:
+        shutil.rmtree(tdir, ignore_errors=True)
+
+    if opts.save:
+        baseline.update(measured)
+        with open(BASELINE, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('\nBaseline saved to %s' % BASELINE)
+    if regressions:
+        print('\nRegressions: %s' % ', '.join(regressions))
+        if opts.check:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Microbenchmark: epub:type -> ARIA role lookup of ACE html snippets.
+# Compares report.snippet_roles against the BeautifulSoup code it replaced,
+# and checks both give the same roles.
+#
+# Run with: calibre-debug -e benchmarks/bench_snippets.py
+# (or plain python, with beautifulsoup4 installed)
+
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stubs  # noqa
+
+
+def load_report_module():
+    stubs.install()
+    from calibre_plugins.ACE import report
+    return report
+
+
+# The code path used before report.first_tag_attributes
+def soup_roles(snippet, getrole):
+    try:
+        from calibre.ebooks.BeautifulSoup import BeautifulStoneSoup
+    except ImportError:
+        from bs4 import BeautifulSoup
+
+        def BeautifulStoneSoup(markup):
+            return BeautifulSoup(markup, 'html.parser')
+    roles = []
+    soup = BeautifulStoneSoup(snippet)
+    tag = soup.contents[0]
+    if 'epub:type' in tag.attrs:
+        epub_type = tag['epub:type']
+        epub_type_list = epub_type.split()
+        for epub_type_item in epub_type_list:
+            roles.append(getrole(epub_type_item))
+    return roles
+
+
+def make_snippets(count, seed=0):
+    r = random.Random(seed)
+    epub_types = ['chapter', 'footnote', 'noteref', 'toc', 'bodymatter', 'frontmatter', 'list-item',
+                  'table-cell', 'page-list', 'pagebreak', 'z3998:poem', 'glossdef']
+    tags = ['section', 'aside', 'a', 'span', 'div', 'nav', 'li', 'td', 'p']
+    snippets = []
+    for i in range(count):
+        attrs = ['id="n%d"' % i, 'class="c%d x&amp;y"' % (i % 7)]
+        if r.random() < 0.9:
+            quote = r.choice(['"', "'"])
+            attrs.append('epub:type=%s%s%s' % (quote, ' '.join(r.sample(epub_types, r.randint(1, 2))), quote))
+        if r.random() < 0.3:
+            attrs.append('hidden')
+        r.shuffle(attrs)
+        tag = r.choice(tags)
+        snippets.append('<%s %s>%s</%s>' % (tag, ' '.join(attrs), 'Text <b epub:type="toc">bold</b> ' * 3, tag))
+    return snippets
+
+
+def main(count=20000):
+    report = load_report_module()
+    snippets = make_snippets(count)
+
+    for snippet in snippets:
+        expected = soup_roles(snippet, report.getrole)
+        actual = report.snippet_roles(snippet)
+        if expected != actual:
+            print('Mismatch for %r: %r != %r' % (snippet, actual, expected))
+            return 1
+
+    soup_time = min(timeit.repeat(lambda: [soup_roles(s, report.getrole) for s in snippets], number=1, repeat=3))
+    fast_time = min(timeit.repeat(lambda: [report.snippet_roles(s) for s in snippets], number=1, repeat=3))
+    print('%d snippets' % count)
+    print('BeautifulSoup:       %8.3f s' % soup_time)
+    print('first_tag_attributes:%8.3f s' % fast_time)
+    print('Speedup:             %8.1fx' % (soup_time / fast_time))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(x) for x in sys.argv[1:]]))
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Startup cost of the plugin modules
+# Each module is imported in a new Python process, once Qt and calibre are
+# loaded (they already are when calibre loads the plugin), and the time it
+# takes and the modules it loads are measured. Times are the best of a few
+# runs, compared with startup_baseline.json like in bench_report.py.
+#
+# When calibre starts, it loads __init__ (the plugin), main (the editor
+# tool, to create its toolbar icon and menu) and batch (the library action).
+# These must not load the modules used to check books: that fails the
+# check even if the times are fine. The editor tool's toolbar and menu
+# actions are created too, as calibre does, and counted with main.
+#
+# Run with: python benchmarks/bench_startup.py [--save] [--check] [--threshold 1.5] [--repeat 5]
+# (or calibre-debug -e benchmarks/bench_startup.py, to use calibre's modules)
+
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stubs  # noqa
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_baseline.json')
+
+MODULES = ['__init__', 'prefs', 'main', 'batch', 'config', 'store', 'report', 'runner', 'timing', 'results',
+           'navigation', 'incremental', 'cache', 'history', 'parallel', 'engine', 'worker', 'updates', 'cli',
+           'precheck']
+# Modules loaded when calibre starts, and the plugin modules they may load
+STARTUP = {
+    '__init__': set(),
+    'main': {'prefs'},
+    'batch': {'store'},
+}
+# Standard modules only needed while checking or showing a report
+HEAVY = ['webbrowser', 'logging.handlers', 'sqlite3', 'tracemalloc']
+
+
+# Run in the child process: import a module and print what it cost
+def measure(name):
+    stubs.install()
+    try:
+        import qt.core  # noqa
+    except ImportError:
+        try:
+            import PyQt5.Qt  # noqa
+        except ImportError:
+            pass
+    import calibre.utils.config  # noqa
+    app = stubs.application() if name == 'main' else None
+    before = set(sys.modules)
+    start = time.time()
+    try:
+        plugin_module = importlib.import_module('calibre_plugins.ACE.' + name)
+    except ImportError as err:
+        # A dependency that only calibre has
+        print(json.dumps({'error': str(err)}))
+        return
+    if app is not None:
+        create_actions(plugin_module.AceTool)
+    duration = time.time() - start
+    loaded = sorted(set(sys.modules) - before)
+    print(json.dumps({'time': duration, 'loaded': loaded}))
+
+
+# Create the toolbar and menu actions of the editor tool, like calibre
+def create_actions(tool_class):
+    try:
+        from qt.core import QIcon, QMainWindow
+    except ImportError:
+        from PyQt5.Qt import QIcon, QMainWindow
+    # The plugin's icons are only in its zip file
+    stubs.builtins.get_icons = lambda *args: QIcon()
+    stubs.builtins.__dict__.setdefault('I', lambda name: name)
+    tool = tool_class()
+    tool.gui = QMainWindow()
+    tool.register_shortcut = lambda *args, **kwargs: None
+    tool.create_action(for_toolbar=True)
+    tool.create_action(for_toolbar=False)
+
+
+def run_child(name):
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    env[str('ACE_STARTUP_MODULE')] = str(name)
+    if getattr(sys, 'frozen', False):
+        command = ['calibre-debug', '-e', os.path.abspath(__file__)]
+    else:
+        command = [sys.executable, os.path.abspath(__file__)]
+    output = subprocess.check_output(command, env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def plugin_modules(loaded):
+    prefix = 'calibre_plugins.ACE.'
+    return set(name[len(prefix):] for name in loaded if name.startswith(prefix))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Measure the import cost of the plugin modules')
+    parser.add_argument('--save', action='store_true', help='Save the results as the new baseline')
+    parser.add_argument('--check', action='store_true', help='Exit with code 1 if there are regressions')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='Ratio to the baseline considered a regression (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of each import (default: %(default)s)')
+    # The child processes get the module to import in the environment
+    if os.environ.get('ACE_STARTUP_MODULE'):
+        measure(os.environ['ACE_STARTUP_MODULE'])
+        return 0
+    opts = parser.parse_args(argv[1:])
+
+    try:
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+    except (EnvironmentError, ValueError):
+        baseline = {}
+
+    measured = {}
+    regressions = []
+    print('%-12s %9s %5s' % ('module', 'ms', 'mods'))
+    for name in MODULES:
+        runs = [run_child(name) for i in range(opts.repeat)]
+        if 'error' in runs[0]:
+            print('%-12s not measured: %s' % (name, runs[0]['error']))
+            continue
+        duration = min(run['time'] for run in runs) * 1000
+        loaded = runs[0]['loaded']
+        measured[name] = {'ms': round(duration, 2), 'modules': len(loaded)}
+        line = '%-12s %9.2f %5d' % (name, duration, len(loaded))
+        base = baseline.get(name, {}).get('ms')
+        if base:
+            ratio = duration / base
+            line += '   baseline %9.2f  x%.2f' % (base, ratio)
+            # Imports of a few milliseconds are mostly noise
+            if ratio > opts.threshold and duration - base > 2:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+
+        if name in STARTUP:
+            extra = plugin_modules(loaded) - STARTUP[name] - {name}
+            heavy = [module for module in HEAVY if module in loaded]
+            if extra or heavy:
+                print('  %s loads at startup: %s' % (name, ', '.join(sorted(extra) + heavy)))
+                regressions.append(name + ' (imports)')
+
+    if opts.save:
+        with open(BASELINE, 'w') as f:
+            json.dump(measured, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('\nBaseline saved to %s' % BASELINE)
+    if regressions:
+        print('\nRegressions: %s' % ', '.join(regressions))
+        if opts.check:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Checks of the warm ACE process (engine.AceEngine), with the stand-in
+# engine (see fake_engine.py), so no Node.js or Chromium is needed:
+#  - health: ping answers while the engine runs, and fails once it hangs
+#    or is killed
+#  - restart: a check still succeeds when the engine crashes during it
+#  - idle: the engine is stopped once it has been idle for idle_timeout
+#
+# Run with: python benchmarks/check_engine.py [--corpus folder]
+# (or calibre-debug -e benchmarks/check_engine.py, to use calibre's modules)
+# Exits with code 1 if a check fails.
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stubs  # noqa
+import corpus  # noqa
+from bench_e2e import default_python  # noqa
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKE_ENGINE = os.path.join(HERE, 'fake_engine.py')
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def expect(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+
+
+# Wait for a condition, for up to timeout seconds
+def eventually(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def check_health(engine, book, folder):
+    hang = os.environ['ACE_FAKE_ENGINE_HANG']
+    engine.start()
+    expect(engine.version == '1.3.2', 'the engine greeted with version %r' % engine.version)
+    expect(engine.ping(), 'ping failed on a running engine')
+    with open(hang, 'w'):
+        pass
+    try:
+        expect(not engine.ping(timeout=0.5), 'ping succeeded on a hung engine')
+    finally:
+        os.remove(hang)
+    engine.process.kill()
+    engine.process.wait()
+    expect(not engine.ping(), 'ping succeeded on a killed engine')
+
+
+def check_restart(engine, book, folder):
+    crash = os.environ['ACE_FAKE_ENGINE_CRASH']
+    engine.start()
+    pid = engine.process.pid
+    with open(crash, 'w'):
+        pass
+    report_folder = os.path.join(folder, 'report')
+    output, return_code = engine.check(book, report_folder, 'en')
+    expect(not os.path.exists(crash), 'the engine did not crash')
+    expect(return_code == 0, 'the check failed after the restart: %r' % (output,))
+    expect(os.path.exists(os.path.join(report_folder, 'report.json')), 'no report was written')
+    expect(engine.is_alive() and engine.process.pid != pid, 'the engine was not restarted')
+
+
+def check_idle(engine, book, folder):
+    engine.idle_timeout = 0.5
+    output, return_code = engine.check(book, os.path.join(folder, 'report'), 'en')
+    expect(return_code == 0, 'the check failed: %r' % (output,))
+    expect(engine.is_alive(), 'the engine stopped right after the check')
+    process = engine.process
+    expect(eventually(lambda: process.poll() is not None), 'the idle engine was not stopped')
+    expect(engine.process is None, 'the engine still has the stopped process')
+
+
+CHECKS = [('health', check_health), ('restart', check_restart), ('idle', check_idle)]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Check the warm ACE process with a stand-in engine')
+    parser.add_argument('--corpus', help='Folder of the generated books (default: a temporary folder)')
+    opts = parser.parse_args(argv[1:])
+
+    stubs.install()
+    from calibre_plugins.ACE.engine import AceEngine
+    td = tempfile.mkdtemp(prefix='ace_engine_')
+    os.environ['ACE_FAKE_ENGINE_CRASH'] = os.path.join(td, 'crash')
+    os.environ['ACE_FAKE_ENGINE_HANG'] = os.path.join(td, 'hang')
+    os.environ['ACE_FAKE_VERSION'] = '1.3.2'
+    failed = []
+    try:
+        book = corpus.fixture(opts.corpus or os.path.join(td, 'corpus'), 'tiny')
+        for name, check in CHECKS:
+            folder = os.path.join(td, name)
+            os.mkdir(folder)
+            engine = AceEngine([default_python(), FAKE_ENGINE, ''], idle_timeout=0, start_timeout=10,
+                               check_timeout=30)
+            start = time.time()
+            try:
+                check(engine, book, folder)
+            except Exception as err:
+                print('%-8s FAILED: %s' % (name, err))
+                failed.append(name)
+            else:
+                print('%-8s ok (%.2f s)' % (name, time.time() - start))
+            finally:
+                engine.stop()
+    finally:
+        shutil.rmtree(td, ignore_errors=True)
+    if failed:
+        print('\nFailed: %s' % ', '.join(failed))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# EPUB fixtures for the end-to-end benchmarks
+# The books are generated rather than stored in the repository: they are
+# valid EPUB 3 files with a nav document, epub:type semantics, images
+# without alt text and elements with ids the fake ACE reports point to.
+# They are built once in the given folder, and reused while their size
+# and format don't change.
+#
+# Run with: python benchmarks/corpus.py folder [size...]
+
+import io
+import os
+import sys
+import zipfile
+
+# Name: (chapters, paragraphs per chapter, images)
+SIZES = {
+    'tiny': (1, 10, 1),
+    'small': (10, 50, 10),
+    'medium': (100, 100, 100),
+    'large': (500, 100, 500),
+    'huge': (2000, 150, 2000),
+}
+ORDER = ('tiny', 'small', 'medium', 'large', 'huge')
+VERSION = 1
+
+# Smallest valid PNG (1x1 pixel)
+PNG = (b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f'
+       b'\x15\xc4\x89\x00\x00\x00\rIDATx\x9cc\xf8\x0f\x00\x00\x01\x01\x00\x05\x18\xd8N\x00\x00\x00\x00IEND'
+       b'\xaeB`\x82')
+
+CONTAINER = '''<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+'''
+
+OPF = '''<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="uid">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="uid">urn:uuid:00000000-0000-4000-8000-{size:0>12}</dc:identifier>
+    <dc:title>ACE benchmark: {name}</dc:title>
+    <dc:language>en</dc:language>
+    <meta property="dcterms:modified">2022-01-01T00:00:00Z</meta>
+  </metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    <item id="css" href="style.css" media-type="text/css"/>
+{items}
+  </manifest>
+  <spine>
+{itemrefs}
+  </spine>
+</package>
+'''
+
+NAV = '''<?xml version="1.0" encoding="UTF-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="en" xml:lang="en">
+<head><title>Contents</title></head>
+<body>
+<nav epub:type="toc" id="toc"><h1>Contents</h1><ol>
+{entries}
+</ol></nav>
+</body>
+</html>
+'''
+
+CHAPTER = '''<?xml version="1.0" encoding="UTF-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">
+<head><title>Chapter {number}</title><link rel="stylesheet" type="text/css" href="style.css"/></head>
+<body>
+<section epub:type="chapter" id="c{number}">
+<h1 id="c{number}-title">Chapter {number}</h1>
+{content}
+</section>
+</body>
+</html>
+'''
+
+PARAGRAPH = ('<p id="c{0}-p{1}">Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod '
+             'tempor incididunt ut labore et dolore magna aliqua.<a epub:type="noteref" href="#c{0}-n{1}" '
+             'id="c{0}-r{1}">{1}</a></p>')
+NOTE = '<aside epub:type="footnote" id="c{0}-n{1}"><p>Note {1}.</p></aside>'
+IMAGE = '<div class="figure" id="c{0}-f{1}"><img src="images/img{2:05d}.png"/></div>'
+
+
+def chapter_name(number):
+    return 'chapter%04d.xhtml' % number
+
+
+def build_book(path, name):
+    chapters, paragraphs, images = SIZES[name]
+    per_chapter = images // chapters
+    extra = images % chapters
+    image = 0
+    items, itemrefs, entries = [], [], []
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr(zipfile.ZipInfo('mimetype'), b'application/epub+zip')
+        zf.writestr('META-INF/container.xml', CONTAINER, zipfile.ZIP_DEFLATED)
+        zf.writestr('OEBPS/style.css', 'p { text-indent: 1em; }\n', zipfile.ZIP_DEFLATED)
+        for number in range(1, chapters + 1):
+            content = []
+            count = per_chapter + (1 if number <= extra else 0)
+            for p in range(1, paragraphs + 1):
+                content.append(PARAGRAPH.format(number, p))
+                if p % 10 == 0:
+                    content.append(NOTE.format(number, p))
+            for f in range(count):
+                content.insert(min(len(content), (f + 1) * 5), IMAGE.format(number, f, image))
+                zf.writestr('OEBPS/images/img%05d.png' % image, PNG)
+                items.append('    <item id="img%05d" href="images/img%05d.png" media-type="image/png"/>'
+                             % (image, image))
+                image += 1
+            zf.writestr('OEBPS/' + chapter_name(number),
+                        CHAPTER.format(number=number, content='\n'.join(content)), zipfile.ZIP_DEFLATED)
+            items.append('    <item id="c%d" href="%s" media-type="application/xhtml+xml"/>'
+                         % (number, chapter_name(number)))
+            itemrefs.append('    <itemref idref="c%d"/>' % number)
+            entries.append('<li><a href="%s">Chapter %d</a></li>' % (chapter_name(number), number))
+        zf.writestr('OEBPS/nav.xhtml', NAV.format(entries='\n'.join(entries)), zipfile.ZIP_DEFLATED)
+        zf.writestr('OEBPS/content.opf', OPF.format(name=name, size=chapters, items='\n'.join(items),
+                                                    itemrefs='\n'.join(itemrefs)), zipfile.ZIP_DEFLATED)
+
+
+# Get the path of a fixture, building it if needed
+def fixture(folder, name):
+    path = os.path.join(folder, '%s-v%d.epub' % (name, VERSION))
+    if not os.path.exists(path):
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        build_book(path + '.tmp', name)
+        os.rename(path + '.tmp', path)
+    return path
+
+
+if __name__ == '__main__':
+    folder = sys.argv[1]
+    for name in sys.argv[2:] or ORDER:
+        path = fixture(folder, name)
+        with io.open(path, 'rb') as f:
+            f.seek(0, 2)
+            print('%-7s %8.1f KB  %s' % (name, f.tell() / 1024, path))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Stand-in for ACE's command line, for the end-to-end benchmarks
+# Takes the same arguments as ace (-v, -f, -s, -o folder, -l lang, book) and
+# writes a report folder after a delay, without Node.js or Chromium. The
+# book can be an EPUB file or an unpacked folder; only the documents in its
+# spine are reported on, so incremental and parallel checks get partial
+# reports like they would from ACE.
+#
+# Environment variables:
+#  ACE_FAKE_DELAY: seconds to wait, like ACE starting and checking (default: 0)
+#  ACE_FAKE_PER_DOCUMENT: seconds to wait for each document (default: 0)
+#  ACE_FAKE_ASSERTIONS: assertions per document (default: 10)
+#  ACE_FAKE_REPORT: a recorded report folder to copy instead of generating one
+#  ACE_FAKE_VERSION: version printed by -v (default: 1.3.2)
+
+import io
+import os
+import sys
+import time
+import shutil
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import synthetic  # noqa
+
+OPF_NS = '{http://www.idpf.org/2007/opf}'
+CONTAINER_NS = '{urn:oasis:names:tc:opendocument:xmlns:container}'
+ID_ATTRIBUTE = ' id="'
+
+
+class Book(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = None if os.path.isdir(path) else zipfile.ZipFile(path)
+
+    def read(self, name):
+        if self.zip is not None:
+            return self.zip.read(name)
+        with open(os.path.join(self.path, *name.split('/')), 'rb') as f:
+            return f.read()
+
+    # Get the (url, ids) of the spine documents, with urls relative to the OPF
+    def spine(self):
+        container = ET.fromstring(self.read('META-INF/container.xml'))
+        opf_name = container.find('.//%srootfile' % CONTAINER_NS).get('full-path')
+        opf = ET.fromstring(self.read(opf_name))
+        manifest = dict((item.get('id'), item.get('href')) for item in opf.iter(OPF_NS + 'item'))
+        base = posixpath.dirname(opf_name)
+        files = []
+        for itemref in opf.iter(OPF_NS + 'itemref'):
+            href = manifest.get(itemref.get('idref'))
+            if href is None:
+                continue
+            text = self.read(posixpath.join(base, href)).decode('utf-8')
+            files.append((href, ids(text)))
+        return files
+
+
+# The ids of a document, in order (a rough scan, enough for generated books)
+def ids(text):
+    found = []
+    start = text.find(ID_ATTRIBUTE)
+    while start >= 0:
+        start += len(ID_ATTRIBUTE)
+        end = text.find('"', start)
+        found.append(text[start:end])
+        start = text.find(ID_ATTRIBUTE, end)
+    return found
+
+
+def write_report(book_path, report_folder):
+    recorded = os.environ.get('ACE_FAKE_REPORT')
+    if recorded:
+        if os.path.exists(report_folder):
+            shutil.rmtree(report_folder)
+        shutil.copytree(recorded, report_folder)
+        return
+    files = Book(book_path).spine()
+    time.sleep(float(os.environ.get('ACE_FAKE_PER_DOCUMENT', 0)) * len(files))
+    if not os.path.isdir(report_folder):
+        os.makedirs(report_folder)
+    synthetic.write_report(os.path.join(report_folder, 'report.json'), files=files, images=len(files),
+                           assertions=int(os.environ.get('ACE_FAKE_ASSERTIONS', 10)))
+    with io.open(os.path.join(report_folder, 'report.html'), 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE html><html><head><title>ACE report</title></head><body></body></html>')
+    data = os.path.join(report_folder, 'data')
+    if not os.path.isdir(data):
+        os.mkdir(data)
+
+
+def main(args):
+    if '-v' in args or '--version' in args:
+        print(os.environ.get('ACE_FAKE_VERSION', '1.3.2'))
+        return 0
+    report_folder = None
+    book_path = None
+    i = 0
+    while i < len(args):
+        if args[i] in ('-o', '--outdir', '-l', '--lang', '-t', '--tempdir'):
+            if args[i] in ('-o', '--outdir'):
+                report_folder = args[i + 1]
+            i += 2
+            continue
+        if not args[i].startswith('-'):
+            book_path = args[i]
+        i += 1
+    if book_path is None or report_folder is None:
+        print('Usage: fake_ace.py [-f] [-s] -o folder [-l lang] book', file=sys.stderr)
+        return 1
+    time.sleep(float(os.environ.get('ACE_FAKE_DELAY', 0)))
+    try:
+        write_report(book_path, report_folder)
+    except Exception as err:
+        # Like ACE, exit with 1 when the book can't be processed
+        print('error: %s' % err, file=sys.stderr)
+        return 1
+    print('info:    Done.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Stand-in for the ACE engine (engine.js), without Node.js or Chromium
+# Speaks the same JSON lines protocol on stdin/stdout: greets with its
+# version, answers ping, check and quit, and writes reports like fake_ace.py
+# (with the same environment variables). The first argument (the global
+# node_modules folder) is ignored.
+#
+# Failures, to test AceEngine (see check_engine.py):
+#  ACE_FAKE_ENGINE_CRASH: a file; if it exists when a check is requested,
+#   it is removed and the engine exits without answering
+#  ACE_FAKE_ENGINE_HANG: a file; while it exists, requests are not answered
+
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_ace  # noqa
+
+
+def send(message):
+    sys.stdout.write(json.dumps(message) + '\n')
+    sys.stdout.flush()
+
+
+def flag(name):
+    path = os.environ.get(name)
+    return path if path and os.path.exists(path) else None
+
+
+def check(request):
+    crash = flag('ACE_FAKE_ENGINE_CRASH')
+    if crash:
+        os.remove(crash)
+        print('fake engine: crashed', file=sys.stderr)
+        sys.exit(1)
+    time.sleep(float(os.environ.get('ACE_FAKE_DELAY', 0)))
+    try:
+        fake_ace.write_report(request['epub'], request['outdir'])
+    except Exception as err:
+        # Like engine.js, a book that can't be processed is not an engine error
+        return {'ok': True, 'return_code': 1, 'log': 'error: %s' % err}
+    return {'ok': True, 'return_code': 0, 'log': ''}
+
+
+def main():
+    version = os.environ.get('ACE_FAKE_VERSION', '1.3.2')
+    send({'id': 0, 'ok': True, 'version': version})
+    for line in iter(sys.stdin.readline, ''):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            continue
+        while flag('ACE_FAKE_ENGINE_HANG'):
+            time.sleep(0.05)
+        cmd = request.get('cmd')
+        if cmd == 'ping':
+            reply = {'ok': True, 'version': version}
+        elif cmd == 'check':
+            reply = check(request)
+        elif cmd == 'quit':
+            reply = {'ok': True}
+        else:
+            reply = {'ok': False, 'error': 'Unknown command'}
+        reply['id'] = request.get('id')
+        send(reply)
+        if cmd == 'quit':
+            break
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Lets the benchmarks import the plugin modules outside of calibre
+# install() registers the plugin as calibre_plugins.ACE, adds the builtins
+# calibre's plugin loader provides, and stubs the few calibre modules the
+# measured code imports. Inside calibre-debug the real modules are used.
+# If neither qt.core nor PyQt5 can be imported, a minimal Qt stub is used,
+# so the results model can still be measured (without a view).
+
+import os
+import sys
+import types
+import tempfile
+
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def module(name, **attrs):
+    m = types.ModuleType(str(name))
+    m.__dict__.update(attrs)
+    sys.modules[name] = m
+    return m
+
+
+def stub_calibre():
+    try:
+        import calibre.utils.config  # noqa
+        return False
+    except ImportError:
+        pass
+    config_dir = tempfile.mkdtemp(prefix='ace_bench_config_')
+    os.mkdir(os.path.join(config_dir, 'plugins'))
+
+    class JSONConfig(dict):
+        def __init__(self, name):
+            dict.__init__(self)
+            self.defaults = {}
+
+        def __missing__(self, key):
+            return self.defaults[key]
+
+    def plugin_class(name):
+        return type(str(name), (object,), {})
+
+    def error_dialog(*args, **kwargs):
+        pass
+
+    module('calibre', __path__=[])
+    module('calibre.constants', iswindows=sys.platform == 'win32', isosx=sys.platform == 'darwin',
+           islinux=sys.platform.startswith('linux'), numeric_version=(6, 0, 0), __version__='6.0.0')
+    module('calibre.utils', __path__=[])
+    module('calibre.utils.config', config_dir=config_dir, JSONConfig=JSONConfig)
+    module('calibre.utils.filenames', expanduser=os.path.expanduser)
+    # Enough to import the editor tool and the library action
+    module('calibre.customize', EditBookToolPlugin=plugin_class('EditBookToolPlugin'),
+           InterfaceActionBase=plugin_class('InterfaceActionBase'))
+    module('calibre.gui2', __path__=[], error_dialog=error_dialog, choose_dir=error_dialog)
+    module('calibre.gui2.actions', InterfaceAction=plugin_class('InterfaceAction'))
+    module('calibre.gui2.tweak_book', __path__=[])
+    module('calibre.gui2.tweak_book.plugin', Tool=plugin_class('Tool'))
+    return True
+
+
+def stub_qt():
+    try:
+        from qt.core import QAbstractTableModel  # noqa
+        return False
+    except ImportError:
+        pass
+    try:
+        from PyQt5.Qt import QAbstractTableModel  # noqa
+        return False
+    except ImportError:
+        pass
+
+    class Qt(object):
+        DisplayRole, ToolTipRole, BackgroundRole, ForegroundRole, FontRole = range(5)
+        Horizontal, Vertical = 1, 2
+        AscendingOrder, DescendingOrder = 0, 1
+
+    class Signal(object):
+        def emit(self, *args):
+            pass
+
+        def connect(self, slot):
+            pass
+
+    class QModelIndex(object):
+        def __init__(self, row=-1, column=-1):
+            self._row, self._column = row, column
+
+        def isValid(self):
+            return self._row >= 0
+
+        def row(self):
+            return self._row
+
+        def column(self):
+            return self._column
+
+    class QAbstractTableModel(object):
+        def __init__(self, parent=None):
+            self.dataChanged = Signal()
+            self.layoutAboutToBeChanged = Signal()
+            self.layoutChanged = Signal()
+
+        def index(self, row, column, parent=None):
+            return QModelIndex(row, column)
+
+        def beginInsertRows(self, parent, first, last):
+            pass
+
+        def endInsertRows(self):
+            pass
+
+        def beginResetModel(self):
+            pass
+
+        def endResetModel(self):
+            pass
+
+        def persistentIndexList(self):
+            return []
+
+        def changePersistentIndexList(self, old, new):
+            pass
+
+    class Dummy(object):
+        def __init__(self, *args):
+            pass
+
+        def setBold(self, bold):
+            pass
+
+    attrs = dict(Qt=Qt, QAbstractTableModel=QAbstractTableModel, QModelIndex=QModelIndex,
+                 QBrush=Dummy, QColor=Dummy, QFont=Dummy)
+    module('qt', __path__=[])
+    module('qt.core', **attrs)
+    return True
+
+
+# Returns the names of the stubbed packages
+def install():
+    builtins.__dict__.setdefault('_', lambda x: x)
+    builtins.__dict__.setdefault('ngettext', lambda singular, plural, n: singular if n == 1 else plural)
+    builtins.__dict__.setdefault('load_translations', lambda: None)
+    builtins.__dict__.setdefault('get_icons', lambda *args: None)
+    stubbed = []
+    if stub_calibre():
+        stubbed.append('calibre')
+    if stub_qt():
+        stubbed.append('Qt')
+    if 'calibre_plugins.ACE' not in sys.modules:
+        if 'calibre_plugins' not in sys.modules:
+            module('calibre_plugins', __path__=[])
+        sys.modules['calibre_plugins'].ACE = module('calibre_plugins.ACE', __path__=[ROOT])
+    return stubbed
+
+
+# A QApplication is needed to measure views, if the real Qt is available
+def application():
+    try:
+        from qt.core import QApplication
+    except ImportError:
+        try:
+            from PyQt5.Qt import QApplication
+        except ImportError:
+            return None
+    global _app
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    # Keep a reference, or the application is destroyed right away
+    _app = QApplication.instance() or QApplication([])
+    return _app
+
+
+_app = None
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Synthetic ACE reports
+# The reports have the shape of ACE's report.json: an 'assertions' array
+# with one EARL assertion per content document, plus the 'data' and
+# 'outlines' sections, which the plugin skips but still has to read.
+#
+# Run with: python benchmarks/synthetic.py report.json [documents] [assertions per document]
+
+import io
+import sys
+import json
+import random
+
+EPUB_TYPES = ['chapter', 'footnote', 'noteref', 'toc', 'bodymatter', 'frontmatter', 'list-item',
+              'table-cell', 'page-list', 'pagebreak', 'z3998:poem', 'glossdef']
+RULES = ['epub-type-has-matching-role', 'image-alt', 'color-contrast', 'link-name', 'heading-order',
+         'landmark-unique', 'pagebreak-label']
+IMPACTS = ['critical', 'serious', 'moderate', 'minor']
+
+
+# documents: content documents with assertions
+# assertions: assertions per document
+# snippet_size: characters of text in each html snippet
+# epub_type_ratio: share of snippets whose first tag has an epub:type
+# images: entries of the 'data' section
+# files: (url, ids) of real documents, to report on them instead of made up
+# ones. The CFIs then point to these ids (see fake_ace.py).
+def make_report(documents=50, assertions=40, snippet_size=200, epub_type_ratio=0.5, images=500,
+                outcome='fail', seed=0, files=None):
+    r = random.Random(seed)
+    if files is None:
+        files = [('xhtml/chapter%04d.xhtml' % d, ['e%d-%d' % (d, a) for a in range(assertions)])
+                 for d in range(documents)]
+    documents = len(files)
+    docs = []
+    for d, (url, ids) in enumerate(files):
+        items = []
+        for a in range(assertions):
+            node_id = ids[a % len(ids)] if ids else 'e%d-%d' % (d, a)
+            attrs = 'id="%s"' % node_id
+            if r.random() < epub_type_ratio:
+                attrs += ' epub:type="%s"' % ' '.join(r.sample(EPUB_TYPES, r.randint(1, 2)))
+            result = {
+                'earl:outcome': 'fail',
+                'dct:description': 'Fix any of the following:\n  Element "%d" has a problem\n  '
+                                   'Another "quoted" \\ detail' % a,
+                'html': '<section %s>%s</section>' % (attrs, ('Lorem ipsum &amp; dolor ' * snippet_size)[:snippet_size]),
+            }
+            if r.random() < 0.9:
+                result['earl:pointer'] = {'cfi': ['/4/2[%s]' % node_id],
+                                          'css': ['section:nth-child(%d)' % a]}
+            items.append({
+                '@type': 'earl:assertion',
+                'earl:assertedBy': 'aXe',
+                'earl:mode': 'automatic',
+                'earl:test': {'earl:impact': r.choice(IMPACTS), 'dct:title': r.choice(RULES),
+                              'dct:description': 'Rule description',
+                              'help': {'url': 'https://dequeuniversity.com/rules/axe/3.5/x'}},
+                'earl:result': result,
+            })
+        docs.append({
+            '@type': 'earl:assertion',
+            'earl:assertedBy': 'aXe',
+            'earl:testSubject': {'url': url, 'dct:title': 'Chapter %d' % d},
+            'earl:result': {'earl:outcome': 'fail'},
+            'assertions': items,
+        })
+    return {
+        '@context': 'http://daisy.github.io/ace/ace-context-v1.jsonld',
+        '@type': 'earl:report',
+        'dct:title': 'Synthetic book',
+        'earl:assertedBy': {'doap:name': 'DAISY Ace', 'doap:release': {'doap:revision': '1.3.2'}},
+        'outlines': {'toc': '<ol>' + '<li><a href="x.xhtml">"Entry"</a></li>' * (documents * 5) + '</ol>',
+                     'headings': '<ul>' + '<li>Heading</li>' * (documents * 10) + '</ul>'},
+        'data': {'images': [{'src': 'images/img%d.png' % i, 'alt': 'Image [%d] {"x"}' % i,
+                             'location': 'xhtml/chapter%04d.xhtml#img%d' % (i % max(documents, 1), i)}
+                            for i in range(images)]},
+        'earl:result': {'earl:outcome': outcome},
+        'assertions': docs,
+        'a11y-metadata': {'missing': ['schema:accessMode'], 'empty': [], 'present': []},
+    }
+
+
+def write_report(path, **kwargs):
+    data = json.dumps(make_report(**kwargs), indent=2, ensure_ascii=False)
+    with io.open(path, 'w', encoding='utf-8') as f:
+        f.write(data)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    write_report(args[0], **dict(zip(('documents', 'assertions'), [int(x) for x in args[1:3]])))
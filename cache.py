@@ -0,0 +1,118 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Standard libraries
+import os
+import os.path
+import json
+import shutil
+import hashlib
+import threading
+
+# Calibre libraries
+from calibre.utils.config import config_dir
+
+# Plugin libraries
+from calibre_plugins.ACE.store import ResultStore
+
+
+def default_cache_dir():
+    return os.path.join(config_dir, 'plugins', 'ACE_cache')
+
+
+def folder_size(path):
+    size = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for f in filenames:
+            try:
+                size += os.path.getsize(os.path.join(dirpath, f))
+            except EnvironmentError:
+                pass
+    return size
+
+
+# On-disk cache of parsed ACE results
+# Entries are keyed by the content of the book, the ACE version and the
+# message settings, and are evicted least recently used first once the
+# cache grows over max_size bytes. Each entry is a folder with the parsed
+# results (results.json) and a copy of ACE's report folder.
+class ReportCache(object):
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+    # fingerprints is the name -> content hash map of the book (see incremental.py)
+    @staticmethod
+    def key(fingerprints, ace_version, user_lang, split_lines):
+        h = hashlib.sha1()
+        for name in sorted(fingerprints):
+            h.update(('%s\0%s\n' % (name, fingerprints[name])).encode('utf-8'))
+        h.update(('%s\0%s\0%s' % (ace_version, user_lang, split_lines)).encode('utf-8'))
+        return h.hexdigest()
+
+    # Get the cached (earl_outcome, error_messages) and restore the report folder
+    def get(self, key, report_folder):
+        with self.lock:
+            entry = os.path.join(self.path, key)
+            try:
+                with open(os.path.join(entry, 'results.json'), 'rb') as f:
+                    results = json.loads(f.read().decode('utf-8'))
+            except (EnvironmentError, ValueError):
+                return None
+            if os.path.exists(report_folder):
+                shutil.rmtree(report_folder)
+            shutil.copytree(os.path.join(entry, 'report'), report_folder)
+            # Mark as recently used
+            os.utime(entry, None)
+        error_messages = ResultStore()
+        rules = results.get('rules') or [None] * len(results['error_messages'])
+        for error_msg, rule in zip(results['error_messages'], rules):
+            error_messages.append(error_msg, rule)
+        return results['earl_outcome'], error_messages
+
+    def put(self, key, report_folder, earl_outcome, error_messages):
+        with self.lock:
+            entry = os.path.join(self.path, key)
+            tmp = entry + '.tmp'
+            if os.path.exists(tmp):
+                shutil.rmtree(tmp)
+            shutil.copytree(report_folder, os.path.join(tmp, 'report'))
+            with open(os.path.join(tmp, 'results.json'), 'wb') as f:
+                rules = [error_messages.rule(i) for i in range(len(error_messages))] \
+                    if isinstance(error_messages, ResultStore) else None
+                f.write(json.dumps({'earl_outcome': earl_outcome, 'error_messages': list(error_messages),
+                                    'rules': rules}).encode('utf-8'))
+            if os.path.exists(entry):
+                shutil.rmtree(entry)
+            os.rename(tmp, entry)
+            self.evict()
+
+    # Remove least recently used entries until the cache fits in max_size
+    def evict(self):
+        entries = []
+        total = 0
+        for key in os.listdir(self.path):
+            entry = os.path.join(self.path, key)
+            if not os.path.isdir(entry):
+                continue
+            size = folder_size(entry)
+            entries.append((os.path.getmtime(entry), size, entry))
+            total += size
+        for mtime, size, entry in sorted(entries):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        with self.lock:
+            shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Standard libraries
+import io
+import os
+import os.path
+import sys
+import csv
+import json
+import argparse
+import threading
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+# Plugin libraries
+from calibre_plugins.ACE.report import SEVERITIES
+from calibre_plugins.ACE.prefs import ACE_LANGUAGES, plugin_prefs, user_language
+from calibre_plugins.ACE.runner import check_book, get_ace_version
+
+# Load translation files (.mo) on the folder 'translations'
+load_translations()
+
+# Exit codes
+EXIT_OK, EXIT_VIOLATIONS, EXIT_ACE_ERROR = 0, 1, 3
+
+CSV_FIELDS = ('path', 'status') + SEVERITIES + ('error',)
+
+
+def option_parser():
+    parser = argparse.ArgumentParser(
+        prog='calibre-debug -r ACE --',
+        description=_('Check the accessibility of EPUB files with ACE, without the GUI.'))
+    parser.add_argument('books', nargs='+', metavar='book.epub', help=_('EPUB files to check'))
+    parser.add_argument('-j', '--workers', type=int, default=2,
+                        help=_('Number of books checked at the same time (default: %(default)s)'))
+    parser.add_argument('-f', '--format', choices=('json', 'csv'), default='json',
+                        help=_('Format of the summary (default: %(default)s)'))
+    parser.add_argument('-o', '--output', help=_('File to write the summary to (default: standard output)'))
+    parser.add_argument('-l', '--lang', choices=ACE_LANGUAGES,
+                        help=_('Language of the messages (default: the language set in the plugin settings)'))
+    parser.add_argument('--fail-on', choices=SEVERITIES + ('none',), default='serious',
+                        help=_('Exit with code {} if a book has violations of this severity or worse '
+                               '(default: %(default)s)').format(EXIT_VIOLATIONS))
+    parser.add_argument('--details', action='store_true',
+                        help=_('Include the error messages of each book in the JSON summary'))
+    parser.add_argument('--report-dir', help=_('Keep the ACE report of each book in a sub folder of this folder'))
+    parser.add_argument('-q', '--quiet', action='store_true', help=_('Don\'t show progress'))
+    return parser
+
+
+# Check the books with a bounded number of ACE processes at a time
+# Returns the summaries in the order of paths.
+def check_books(paths, user_lang, split_lines, workers, report_dir=None, keep_messages=False, on_done=None):
+    queue = Queue()
+    for i, path in enumerate(paths):
+        queue.put((i, path))
+    summaries = [None] * len(paths)
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            try:
+                i, path = queue.get_nowait()
+            except Empty:
+                return
+            report_folder = None
+            if report_dir is not None:
+                report_folder = os.path.join(report_dir, '%d-%s' % (i + 1, os.path.splitext(os.path.basename(path))[0]))
+            summary = check_book(path, os.path.basename(path), path, user_lang, split_lines,
+                                 report_folder=report_folder, keep_messages=keep_messages)
+            summaries[i] = summary
+            if on_done is not None:
+                with lock:
+                    on_done(summary)
+
+    threads = [threading.Thread(target=work, name='ACE check') for i in range(max(1, min(workers, len(paths))))]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+    return summaries
+
+
+def summary_to_dict(summary):
+    d = {'path': summary.book_id, 'status': summary.status, 'counts': summary.counts, 'error': summary.error}
+    if summary.error_messages is not None:
+        d['messages'] = [{'file': file_name, 'severity': error_level, 'message': error_message, 'epubcfi': epubcfi}
+                         for msg_index, error_message, error_level, file_name, epubcfi in summary.error_messages]
+    return d
+
+
+def write_json(f, summaries, ace_version, user_lang):
+    totals = dict.fromkeys(SEVERITIES, 0)
+    for summary in summaries:
+        for severity in SEVERITIES:
+            totals[severity] += summary.counts[severity]
+    json.dump({'ace_version': ace_version, 'lang': user_lang, 'totals': totals,
+               'books': [summary_to_dict(summary) for summary in summaries]}, f, indent=2)
+    f.write('\n')
+
+
+def write_csv(f, summaries):
+    writer = csv.writer(f)
+    writer.writerow(CSV_FIELDS)
+    for summary in summaries:
+        writer.writerow([summary.book_id, summary.status] + [summary.counts[severity] for severity in SEVERITIES] +
+                        [summary.error or ''])
+
+
+# Exit code for the summaries: books ACE couldn't check take precedence
+# over violations at or above the fail_on severity
+def exit_code(summaries, fail_on):
+    if any(summary.status == 'error' for summary in summaries):
+        return EXIT_ACE_ERROR
+    if fail_on != 'none':
+        severities = SEVERITIES[:SEVERITIES.index(fail_on) + 1]
+        if any(summary.counts[severity] for summary in summaries for severity in severities):
+            return EXIT_VIOLATIONS
+    return EXIT_OK
+
+
+# Entry point of calibre-debug -r ACE -- [options] book.epub ...
+def main(argv):
+    opts = option_parser().parse_args(argv[1:])
+    user_lang = opts.lang or user_language()
+    split_lines = plugin_prefs['split_lines']
+
+    paths = [os.path.abspath(path) for path in opts.books]
+    missing = [path for path in paths if not os.path.isfile(path)]
+    if missing:
+        print(_('File not found: {}').format(', '.join(missing)), file=sys.stderr)
+        return EXIT_ACE_ERROR
+    if opts.report_dir is not None:
+        opts.report_dir = os.path.abspath(opts.report_dir)
+
+    done = []
+
+    def on_done(summary):
+        done.append(summary)
+        if not opts.quiet:
+            print('[%d/%d] %s: %s' % (len(done), len(paths), summary.book_id, summary.status), file=sys.stderr)
+
+    ace_version = get_ace_version()
+    if ace_version is None:
+        print(_('ACE is not installed, or can\'t be found.'), file=sys.stderr)
+        return EXIT_ACE_ERROR
+    summaries = check_books(paths, user_lang, split_lines, opts.workers, opts.report_dir,
+                            opts.details and opts.format == 'json', on_done)
+
+    if opts.output:
+        f = io.open(opts.output, 'w', encoding='utf-8', newline='')
+    else:
+        f = sys.stdout
+    try:
+        if opts.format == 'csv':
+            write_csv(f, summaries)
+        else:
+            write_json(f, summaries, ace_version, user_lang)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return exit_code(summaries, opts.fail_on)
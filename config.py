@@ -9,8 +9,6 @@ __docformat__ = 'restructuredtext en'
 
 # Standard libraries
 import os
-import locale
-from datetime import datetime, timedelta
 
 # PyQt libraries
 try:
@@ -25,31 +23,13 @@ except ImportError:
 Qt_version = int(QtCore.PYQT_VERSION_STR[0])
 
 # Calibre libraries
-from calibre.utils.config import JSONConfig
-from calibre.utils.filenames import expanduser
 from calibre.gui2 import choose_dir, error_dialog
 from calibre_plugins.ACE.__init__ import PLUGIN_NAME, PLUGIN_VERSION
+from calibre_plugins.ACE.prefs import ACE_LANGUAGES, plugin_prefs, user_language
 
 # Load translation files (.mo) on the folder 'translations'
 load_translations()
 
-# Get user language
-user_language = locale.getdefaultlocale()
-
-# This is where all preferences for this plugin will be stored.
-plugin_prefs = JSONConfig('plugins/ACE')
-
-# Set default preferences
-plugin_prefs.defaults['report_path'] = expanduser('~')
-plugin_prefs.defaults['open_report'] = True
-plugin_prefs.defaults['debug_mode'] = False
-plugin_prefs.defaults['close_docks'] = True
-plugin_prefs.defaults['user_lang'] = user_language[0]
-plugin_prefs.defaults['split_lines'] = True
-plugin_prefs.defaults['update'] = True
-plugin_prefs.defaults['check_interval'] = 7
-plugin_prefs.defaults['last_time_checked'] = str(datetime.now() - timedelta(days=7))
-
 
 # Set up Config Dialog
 class ConfigWidget(QWidget):
@@ -114,6 +94,80 @@ class ConfigWidget(QWidget):
         # Load the checkbox with the current preference setting
         self.split_lines_check.setChecked(plugin_prefs['split_lines'])
 
+        # Keep a warm ACE process between checks
+        self.engine_mode_check = QCheckBox(_('&Keep ACE running between checks'), self)
+        self.engine_mode_check.setToolTip(_('When checked, ACE is started once and reused for the next checks. '
+                                            'It is closed after {} minutes without checks.')
+                                          .format(plugin_prefs['engine_idle_timeout']))
+        misc_group_box_layout.addWidget(self.engine_mode_check)
+        # Load the checkbox with the current preference setting
+        self.engine_mode_check.setChecked(plugin_prefs['engine_mode'])
+
+        # Only check again the files changed since the last check
+        self.incremental_check_check = QCheckBox(_('Only check &changed files again'), self)
+        self.incremental_check_check.setToolTip(_('When checked, ACE only checks the files changed since the last check '
+                                                  'and reuses the previous results for the other files. '
+                                                  'The html report only lists the files checked again.'))
+        misc_group_box_layout.addWidget(self.incremental_check_check)
+        # Load the checkbox with the current preference setting
+        self.incremental_check_check.setChecked(plugin_prefs['incremental_check'])
+
+        # Reuse the report of books that didn't change
+        self.report_cache_check = QCheckBox(_('&Reuse reports of unchanged books'), self)
+        self.report_cache_check.setToolTip(_('When checked, the results of each check are saved, and books '
+                                             'that were already checked with the same ACE version and language '
+                                             'are not checked again. Up to {} MB are used.')
+                                           .format(plugin_prefs['cache_size']))
+        misc_group_box_layout.addWidget(self.report_cache_check)
+        # Load the checkbox with the current preference setting
+        self.report_cache_check.setChecked(plugin_prefs['report_cache'])
+
+        # Split large books between several ACE processes
+        self.parallel_check_check = QCheckBox(_('Check large books in para&llel'), self)
+        self.parallel_check_check.setToolTip(_('When checked, books with many content documents are split in parts '
+                                               'that are checked at the same time by several ACE processes. '
+                                               'The html report of each part is saved separately.'))
+        misc_group_box_layout.addWidget(self.parallel_check_check)
+        # Load the checkbox with the current preference setting
+        self.parallel_check_check.setChecked(plugin_prefs['parallel_check'])
+
+        # Give ACE the unpacked book instead of zipping it first
+        self.unpacked_check_check = QCheckBox(_('Check the book &without zipping it'), self)
+        self.unpacked_check_check.setToolTip(_('When checked, ACE checks the files of the book directly, '
+                                               'instead of a zipped copy of the book. Uncheck it if your ACE '
+                                               'version can\'t check unpacked books.'))
+        misc_group_box_layout.addWidget(self.unpacked_check_check)
+        # Load the checkbox with the current preference setting
+        self.unpacked_check_check.setChecked(plugin_prefs['unpacked_check'])
+
+        # Store the results of every check
+        self.run_history_check = QCheckBox(_('Keep a &history of checks'), self)
+        self.run_history_check.setToolTip(_('When checked, the results of the last {} checks of each book are saved, '
+                                            'and the dock shows the errors that are new or fixed since the last check.')
+                                          .format(plugin_prefs['history_runs']))
+        misc_group_box_layout.addWidget(self.run_history_check)
+        # Load the checkbox with the current preference setting
+        self.run_history_check.setChecked(plugin_prefs['run_history'])
+
+        # Check the edited file again after each change
+        self.live_check_check = QCheckBox(_('Check the edited file &live'), self)
+        self.live_check_check.setToolTip(_('When checked, once a book was checked, the file being edited is checked '
+                                           'again in the background {} seconds after you stop typing, and its '
+                                           'errors are updated in the dock.')
+                                         .format(plugin_prefs['live_check_delay']))
+        misc_group_box_layout.addWidget(self.live_check_check)
+        # Load the checkbox with the current preference setting
+        self.live_check_check.setChecked(plugin_prefs['live_check'])
+
+        # Time each phase of the checks
+        self.performance_log_check = QCheckBox(_('Log the &timings of checks'), self)
+        self.performance_log_check.setToolTip(_('When checked, the time taken by each phase of a check is shown '
+                                                'on the status bar and saved to ACE_performance.log, in the '
+                                                'plugins folder of calibre\'s configuration folder.'))
+        misc_group_box_layout.addWidget(self.performance_log_check)
+        # Load the checkbox with the current preference setting
+        self.performance_log_check.setChecked(plugin_prefs['performance_log'])
+
         # --- Update Options ---
         update_group_box = QGroupBox(_('Update:'), self)
         layout.addWidget(update_group_box)
@@ -121,8 +175,9 @@ class ConfigWidget(QWidget):
         update_group_box.setLayout(update_group_box_layout)
 
         # Update checkbox
-        self.update_check = QCheckBox(_('Auto &update'), self)
-        self.update_check.setToolTip(_('When checked, the plugin will attempt to update local ACE installation.'))
+        self.update_check = QCheckBox(_('Check for &updates'), self)
+        self.update_check.setToolTip(_('When checked, the plugin checks for ACE updates in the background '
+                                       'and tells you when one is available.'))
         update_group_box_layout.addWidget(self.update_check, 0, 0)
         # Load the checkbox with the current preference setting
         self.update_check.setChecked(plugin_prefs['update'])
@@ -140,6 +195,25 @@ class ConfigWidget(QWidget):
         update_group_box_layout.addWidget(self.check_interval_txtBox_label, 1, 0)
         update_group_box_layout.addWidget(self.check_interval_txtBox, 1, 1)
 
+        # --- Library Options ---
+        library_group_box = QGroupBox(_('Library:'), self)
+        layout.addWidget(library_group_box)
+        library_group_box_layout = QGridLayout()
+        library_group_box.setLayout(library_group_box_layout)
+
+        # Parallel checks line edit
+        self.batch_workers_txtBox_label = QLabel(_('&Parallel checks:'), self)
+        tooltip = _('Number of books checked at the same time when checking books from the library')
+        self.batch_workers_txtBox_label.setToolTip(tooltip)
+        # Load the textbox with the current preference setting
+        self.batch_workers_txtBox = QLineEdit(str(plugin_prefs['batch_workers']), self)
+        self.batch_workers_txtBox.setAlignment(QtCore.Qt.AlignRight)
+        self.batch_workers_txtBox.setMaximumWidth(110)
+        self.batch_workers_txtBox.setToolTip(tooltip)
+        self.batch_workers_txtBox_label.setBuddy(self.batch_workers_txtBox)
+        library_group_box_layout.addWidget(self.batch_workers_txtBox_label, 0, 0)
+        library_group_box_layout.addWidget(self.batch_workers_txtBox, 0, 1)
+
         # --- Lang Options ---
         lang_group_box = QGroupBox(_('Messages:'), self)
         layout.addWidget(lang_group_box)
@@ -153,18 +227,13 @@ class ConfigWidget(QWidget):
         self.language_box_label.setToolTip(tooltip)
         self.language_box = QComboBox()
         self.language_box.setToolTip(tooltip)
-        self.language_box.addItems({'da', 'de', 'en', 'es', 'fr', 'ja', 'nl', 'pt_BR'})
-        self.language_box.model().sort(0)
+        self.language_box.addItems(ACE_LANGUAGES)
         self.language_box_label.setBuddy(self.language_box)
         lang_group_box_layout.addWidget(self.language_box_label, 0, 0)
         lang_group_box_layout.addWidget(self.language_box, 0, 1)
         # Load the combobox with the current preference setting
-        default_index = self.language_box.findText(plugin_prefs['user_lang'])
         # Check if the user language is available. If not, fallbacks to English.
-        if default_index == -1:
-            self.language_box.setCurrentText('en')
-        else:
-            self.language_box.setCurrentIndex(default_index)
+        self.language_box.setCurrentIndex(self.language_box.findText(user_language()))
 
         # About button
         self.about_button = QPushButton(_('About'), self)
@@ -191,8 +260,17 @@ class ConfigWidget(QWidget):
         plugin_prefs['close_docks'] = self.close_docks_check.isChecked()
         plugin_prefs['user_lang'] = self.language_box.currentText()
         plugin_prefs['split_lines'] = self.split_lines_check.isChecked()
+        plugin_prefs['engine_mode'] = self.engine_mode_check.isChecked()
+        plugin_prefs['incremental_check'] = self.incremental_check_check.isChecked()
+        plugin_prefs['report_cache'] = self.report_cache_check.isChecked()
+        plugin_prefs['parallel_check'] = self.parallel_check_check.isChecked()
+        plugin_prefs['unpacked_check'] = self.unpacked_check_check.isChecked()
+        plugin_prefs['run_history'] = self.run_history_check.isChecked()
+        plugin_prefs['live_check'] = self.live_check_check.isChecked()
+        plugin_prefs['performance_log'] = self.performance_log_check.isChecked()
         plugin_prefs['update'] = self.update_check.isChecked()
         plugin_prefs['check_interval'] = int(self.check_interval_txtBox.text())
+        plugin_prefs['batch_workers'] = max(1, int(self.batch_workers_txtBox.text()))
 
     def get_directory(self):
         c = choose_dir(self, PLUGIN_NAME + 'dir_chooser',
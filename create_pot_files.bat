@@ -1,6 +1,6 @@
 @echo off
 :: Extract translatable strings from source files
-py %localappdata%\Programs\Python\Python310\Tools\i18n\pygettext.py __init__.py config.py main.py
+py %localappdata%\Programs\Python\Python310\Tools\i18n\pygettext.py __init__.py config.py main.py report.py runner.py worker.py engine.py incremental.py cache.py navigation.py results.py batch.py cli.py timing.py precheck.py
 
 :: Move the generated file to translations folder
 move messages.pot translations > nul
@@ -0,0 +1,109 @@
+// ACE engine host for the ACE plugin for calibre.
+//
+// Keeps Node.js, the @daisy/ace module graph and the headless browser
+// used by axe warm between checks. It talks to the plugin through JSON
+// lines on stdin/stdout, one request at a time:
+//
+//   -> {"id": 1, "cmd": "ping"}
+//   <- {"id": 1, "ok": true, "version": "1.3.2"}
+//   -> {"id": 2, "cmd": "check", "epub": "/tmp/temp.epub", "outdir": "/home/report", "lang": "en"}
+//   <- {"id": 2, "ok": true, "return_code": 0, "log": ""}
+//   -> {"id": 3, "cmd": "quit"}
+//
+// The first argument is the global node_modules folder (npm root -g).
+
+'use strict';
+
+const path = require('path');
+const util = require('util');
+const readline = require('readline');
+
+// Anything written by ACE to the console goes to stderr,
+// so stdout only carries protocol messages
+const send = (message) => process.stdout.write(JSON.stringify(message) + '\n');
+const log = [];
+const toStderr = function () {
+    const line = util.format.apply(util, arguments);
+    log.push(line);
+    process.stderr.write(line + '\n');
+};
+console.log = console.info = console.warn = console.error = toStderr;
+
+const searchPaths = [];
+if (process.argv[2]) {
+    searchPaths.push(path.join(process.argv[2], '@daisy', 'ace'));
+    searchPaths.push(process.argv[2]);
+}
+const load = (name) => require(require.resolve(name, { paths: searchPaths.concat(module.paths) }));
+
+let ace, runner, version;
+try {
+    ace = load('@daisy/ace-core');
+    version = load('@daisy/ace/package.json').version;
+} catch (err) {
+    send({ id: 0, ok: false, error: 'ACE is not installed: ' + err.message });
+    process.exit(1);
+}
+try {
+    load('@daisy/ace-logger').initLogger({ verbose: false, silent: true });
+} catch (err) {
+    // Older ACE versions don't have a separate logger module
+}
+try {
+    // Keep the browser open between checks, it is closed on quit
+    const axeRunner = load('@daisy/ace-axe-runner-puppeteer');
+    let launched = null;
+    runner = Object.assign({}, axeRunner, {
+        launch: () => launched || (launched = Promise.resolve(axeRunner.launch())),
+        close: () => Promise.resolve(),
+    });
+    runner.shutdown = () => (launched ? launched.then(() => axeRunner.close()) : Promise.resolve());
+} catch (err) {
+    // Older ACE versions launch the browser by themselves
+    runner = undefined;
+}
+
+const handlers = {
+    ping: () => Promise.resolve({ ok: true, version: version }),
+    check: (request) => {
+        log.length = 0;
+        return Promise.resolve(ace(request.epub, {
+            cwd: process.cwd(),
+            outdir: request.outdir,
+            verbose: false,
+            silent: true,
+            jobId: '',
+            lang: request.lang,
+        }, runner)).then(
+            () => ({ ok: true, return_code: 0, log: log.join('\n') }),
+            (err) => ({ ok: true, return_code: 1, log: log.concat([String(err && err.message || err)]).join('\n') })
+        );
+    },
+    quit: () => Promise.resolve(runner && runner.shutdown ? runner.shutdown() : null)
+        .then(() => ({ ok: true }), () => ({ ok: true })),
+};
+
+// Requests are handled one after the other
+let queue = Promise.resolve();
+readline.createInterface({ input: process.stdin }).on('line', (line) => {
+    let request;
+    try {
+        request = JSON.parse(line);
+    } catch (err) {
+        return;
+    }
+    const handler = handlers[request.cmd];
+    queue = queue.then(() => (handler ? handler(request) : { ok: false, error: 'Unknown command' }))
+        .catch((err) => ({ ok: false, error: String(err && err.message || err) }))
+        .then((reply) => {
+            reply.id = request.id;
+            send(reply);
+            if (request.cmd === 'quit') {
+                process.exit(0);
+            }
+        });
+}).on('close', () => {
+    queue.then(() => (runner && runner.shutdown ? runner.shutdown() : null)).then(() => process.exit(0), () => process.exit(0));
+});
+
+send({ id: 0, ok: true, version: version });
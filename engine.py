@@ -0,0 +1,254 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Standard libraries
+import os
+import os.path
+import json
+import time
+import atexit
+import threading
+import subprocess
+from collections import deque
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+# Calibre libraries
+from calibre.constants import iswindows
+from calibre.utils.config import config_dir
+
+
+class EngineError(Exception):
+    pass
+
+
+# Long-lived ACE process, reused between checks
+# The engine talks JSON lines over stdin/stdout (see engine.js), so any
+# program speaking the same protocol can stand in for it.
+class AceEngine(object):
+
+    def __init__(self, command, idle_timeout=600, start_timeout=60, check_timeout=3600):
+        self.command = list(command)
+        self.idle_timeout = idle_timeout
+        self.start_timeout = start_timeout
+        self.check_timeout = check_timeout
+        self.process = None
+        self.version = None
+        self.lines = None
+        self.stderr_tail = deque(maxlen=200)
+        self.request_id = 0
+        self.idle_timer = None
+        self.lock = threading.RLock()
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        with self.lock:
+            if self.is_alive():
+                return
+            kwargs = {}
+            if iswindows:
+                kwargs['creationflags'] = 0x08000000  # CREATE_NO_WINDOW
+            try:
+                self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                                stderr=subprocess.PIPE, **kwargs)
+            except EnvironmentError as err:
+                self.process = None
+                raise EngineError('Could not start the ACE engine: %s' % err)
+            self.lines = Queue()
+            self.stderr_tail.clear()
+            self._start_reader(self.process.stdout, self.lines.put, end_marker=True)
+            self._start_reader(self.process.stderr, self.stderr_tail.append)
+            # The engine greets with its version once ACE is loaded
+            reply = self._read_reply(0, self.start_timeout)
+            if not reply.get('ok'):
+                self.stop()
+                raise EngineError(reply.get('error', 'The ACE engine failed to start'))
+            self.version = reply.get('version')
+
+    # Pass each line of stream to callback, then None once it closes if end_marker
+    def _start_reader(self, stream, callback, end_marker=False):
+        def read():
+            for line in iter(stream.readline, b''):
+                callback(line.decode('utf-8', 'replace').rstrip('\r\n'))
+            if end_marker:
+                callback(None)
+        t = threading.Thread(target=read, name='ACE engine reader')
+        t.daemon = True
+        t.start()
+
+    def _read_reply(self, request_id, timeout):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.time())
+            try:
+                line = self.lines.get(timeout=remaining)
+            except Empty:
+                raise EngineError('The ACE engine did not answer in time')
+            if line is None:
+                raise EngineError('The ACE engine exited unexpectedly:\n' + '\n'.join(self.stderr_tail))
+            try:
+                reply = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(reply, dict) and reply.get('id') == request_id:
+                return reply
+
+    def request(self, cmd, timeout, **kwargs):
+        with self.lock:
+            self.request_id += 1
+            message = dict(kwargs, id=self.request_id, cmd=cmd)
+            try:
+                self.process.stdin.write((json.dumps(message) + '\n').encode('utf-8'))
+                self.process.stdin.flush()
+            except (EnvironmentError, ValueError, AttributeError):
+                raise EngineError('The ACE engine is not running')
+            return self._read_reply(self.request_id, timeout)
+
+    # Health check: the engine must be running and answering
+    def ping(self, timeout=10):
+        with self.lock:
+            if not self.is_alive():
+                return False
+            try:
+                return bool(self.request('ping', timeout).get('ok'))
+            except EngineError:
+                return False
+
+    def ensure_running(self):
+        with self.lock:
+            if not self.ping():
+                self.stop()
+                self.start()
+
+    # Same return value as ace_wrapper: ((stdout, stderr), return_code)
+    def check(self, epub_path, report_folder, user_lang):
+        with self.lock:
+            self._cancel_idle_timer()
+            try:
+                # Restart once if the engine crashed or hung
+                for attempt in (1, 2):
+                    try:
+                        self.ensure_running()
+                        reply = self.request('check', self.check_timeout, epub=epub_path,
+                                             outdir=report_folder, lang=user_lang)
+                        break
+                    except EngineError:
+                        self.stop()
+                        if attempt == 2:
+                            raise
+            finally:
+                self._schedule_idle_shutdown()
+        if not reply.get('ok'):
+            raise EngineError(reply.get('error', 'The ACE engine failed'))
+        return (b'', reply.get('log', '').encode('utf-8')), reply.get('return_code', 1)
+
+    def stop(self):
+        with self.lock:
+            self._cancel_idle_timer()
+            process, self.process = self.process, None
+            if process is None:
+                return
+            if process.poll() is None:
+                try:
+                    process.stdin.write(b'{"id": -1, "cmd": "quit"}\n')
+                    process.stdin.flush()
+                    process.stdin.close()
+                except (EnvironmentError, ValueError):
+                    pass
+                for i in range(50):
+                    if process.poll() is not None:
+                        break
+                    time.sleep(0.1)
+                else:
+                    process.kill()
+                    process.wait()
+
+    def _schedule_idle_shutdown(self):
+        if self.idle_timeout:
+            self.idle_timer = threading.Timer(self.idle_timeout, self._idle_shutdown)
+            self.idle_timer.daemon = True
+            self.idle_timer.start()
+
+    def _cancel_idle_timer(self):
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+
+    def _idle_shutdown(self):
+        # A check may have started since the timer fired
+        if self.lock.acquire(False):
+            try:
+                self.stop()
+            finally:
+                self.lock.release()
+
+
+# Write engine.js outside of the plugin zip, so Node can run it
+def engine_script():
+    path = os.path.join(config_dir, 'plugins', 'ACE_engine.js')
+    data = get_resources('engine.js')
+    try:
+        with open(path, 'rb') as f:
+            current = f.read()
+    except EnvironmentError:
+        current = None
+    if current != data:
+        with open(path, 'wb') as f:
+            f.write(data)
+    return path
+
+
+# Get the command line of the engine
+# Raises EngineError if npm can't be run, or EnvironmentError if the script
+# can't be written. Finding ACE runs node and npm, so call it off the GUI thread.
+def engine_command():
+    from calibre_plugins.ACE.runner import ace_executable, ace_wrapper
+    entry = ace_executable.get()
+    if entry is not None:
+        # The ACE script is in <npm root>/@daisy/ace
+        package = os.path.dirname(entry['script'])
+        while os.path.basename(package) != 'ace' and os.path.dirname(package) != package:
+            package = os.path.dirname(package)
+        return [entry['node'], engine_script(), os.path.dirname(os.path.dirname(package))]
+    try:
+        output, return_code = ace_wrapper('npm', 'root', '-g')
+    except EnvironmentError as err:
+        raise EngineError('Could not find the global node_modules folder: %s' % err)
+    npm_root = output[0].decode('utf-8').strip() if return_code == 0 else ''
+    return ['node', engine_script(), npm_root]
+
+
+# One engine per calibre session
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(idle_timeout=600):
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AceEngine(engine_command(), idle_timeout=idle_timeout)
+        else:
+            _engine.idle_timeout = idle_timeout
+        return _engine
+
+
+def shutdown_engine():
+    with _engine_lock:
+        if _engine is not None:
+            _engine.stop()
+
+
+atexit.register(shutdown_engine)
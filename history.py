@@ -0,0 +1,177 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Standard libraries
+import os
+import os.path
+import time
+import zlib
+import sqlite3
+import threading
+from collections import Counter
+
+# Calibre libraries
+from calibre.utils.config import config_dir
+
+# Plugin libraries
+from calibre_plugins.ACE.store import ResultStore
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    book TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    ace_version TEXT,
+    user_lang TEXT,
+    earl_outcome TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_book ON runs (book, timestamp);
+CREATE TABLE IF NOT EXISTS texts (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS assertions (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    file TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    rule TEXT,
+    message INTEGER NOT NULL REFERENCES texts (id),
+    epubcfi TEXT,
+    snippet BLOB
+);
+CREATE INDEX IF NOT EXISTS assertions_run ON assertions (run, position);
+CREATE INDEX IF NOT EXISTS assertions_rule ON assertions (rule, run);
+CREATE INDEX IF NOT EXISTS assertions_severity ON assertions (severity, run);
+CREATE INDEX IF NOT EXISTS assertions_file ON assertions (file, run);
+'''
+
+
+def default_history_path():
+    return os.path.join(config_dir, 'plugins', 'ACE_history.sqlite')
+
+
+# Changes of a run since the previous run of the same book
+class RunDiff(object):
+
+    def __init__(self, previous_timestamp, previous_ace_version, new, resolved):
+        self.previous_timestamp = previous_timestamp
+        self.previous_ace_version = previous_ace_version
+        # msg_index of the error messages that are new in this run
+        self.new = new
+        # (error_message, error_level, file_name, epubcfi) of the previous run not found anymore
+        self.resolved = resolved
+
+
+# SQLite store of the parsed results of every check
+# Message texts, repeated by many assertions and runs, are stored once;
+# snippets are compressed. Only the last max_runs runs of each book are kept.
+# Assertions are matched between runs by file, severity and message, not by
+# position, since editing a file moves the positions of its other errors.
+class RunHistory(object):
+
+    def __init__(self, path, max_runs=20):
+        self.path = path
+        self.max_runs = max_runs
+        self.lock = threading.Lock()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA foreign_keys = ON')
+        conn.executescript(SCHEMA)
+        return conn
+
+    def text_ids(self, conn, texts):
+        texts = set(texts)
+        conn.executemany('INSERT OR IGNORE INTO texts (text) VALUES (?)', ((text,) for text in texts))
+        ids = {}
+        texts = list(texts)
+        # Stay below SQLite's limit of variables per statement
+        for i in range(0, len(texts), 500):
+            chunk = texts[i:i + 500]
+            ids.update((text, text_id) for text_id, text in conn.execute(
+                'SELECT id, text FROM texts WHERE text IN (%s)' % ','.join('?' * len(chunk)), chunk))
+        return ids
+
+    # Store a run and get its id
+    # The rule of each assertion is read from the ResultStore. details is the
+    # (error_message, error_level, file_name, epubcfi) -> (rule_id, snippet) map of
+    # parse_report; assertions without details (from the report cache, or not
+    # checked again) are stored without snippet.
+    def record(self, book, earl_outcome, error_messages, ace_version=None, user_lang=None, details=None):
+        details = details or {}
+        with self.lock:
+            conn = self.connect()
+            try:
+                with conn:
+                    run = conn.execute('INSERT INTO runs (book, timestamp, ace_version, user_lang, earl_outcome) '
+                                       'VALUES (?, ?, ?, ?, ?)',
+                                       (book, time.time(), ace_version, user_lang, earl_outcome)).lastrowid
+                    ids = self.text_ids(conn, (error_msg[1] for error_msg in error_messages))
+                    rows = []
+                    is_store = isinstance(error_messages, ResultStore)
+                    for i, (msg_index, error_message, error_level, file_name, epubcfi) in enumerate(error_messages):
+                        rule, snippet = details.get((error_message, error_level, file_name, epubcfi), (None, None))
+                        if is_store:
+                            rule = error_messages.rule(i) or rule
+                        if snippet is not None:
+                            snippet = sqlite3.Binary(zlib.compress(snippet.encode('utf-8')))
+                        rows.append((run, msg_index, file_name, error_level, rule, ids[error_message], epubcfi,
+                                     snippet))
+                    conn.executemany('INSERT INTO assertions VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                    self.prune(conn, book)
+            finally:
+                conn.close()
+        return run
+
+    # Remove the oldest runs of a book, and the texts no run uses anymore
+    def prune(self, conn, book):
+        old = [run for run, in conn.execute('SELECT id FROM runs WHERE book = ? ORDER BY timestamp DESC, id DESC '
+                                            'LIMIT -1 OFFSET ?', (book, self.max_runs))]
+        if not old:
+            return
+        conn.executemany('DELETE FROM runs WHERE id = ?', ((run,) for run in old))
+        conn.execute('DELETE FROM texts WHERE id NOT IN (SELECT DISTINCT message FROM assertions)')
+
+    # Compare a run with the previous run of its book
+    # Returns None if it is the first run of the book.
+    def diff(self, run):
+        with self.lock:
+            conn = self.connect()
+            try:
+                book, = conn.execute('SELECT book FROM runs WHERE id = ?', (run,)).fetchone()
+                previous = conn.execute('SELECT id, timestamp, ace_version FROM runs WHERE book = ? AND id < ? '
+                                        'ORDER BY id DESC LIMIT 1', (book, run)).fetchone()
+                if previous is None:
+                    return None
+                previous_run, timestamp, ace_version = previous
+                query = ('SELECT position, text, severity, file, epubcfi FROM assertions '
+                         'JOIN texts ON texts.id = assertions.message WHERE run = ? ORDER BY position')
+                current = conn.execute(query, (run,)).fetchall()
+                before = conn.execute(query, (previous_run,)).fetchall()
+            finally:
+                conn.close()
+
+        key = lambda row: (row[3], row[2], row[1])
+        remaining = Counter(key(row) for row in before)
+        new = set()
+        for row in current:
+            k = key(row)
+            if remaining[k] > 0:
+                remaining[k] -= 1
+            else:
+                new.add(row[0])
+        resolved = []
+        for row in before:
+            k = key(row)
+            if remaining[k] > 0:
+                remaining[k] -= 1
+                resolved.append(tuple(row[1:]))
+        return RunDiff(timestamp, ace_version, new, resolved)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Standard libraries
+import hashlib
+
+# Plugin libraries
+from calibre_plugins.ACE.store import ResultStore
+
+
+# What we know about the last check of a book
+class CheckState(object):
+
+    def __init__(self, settings, fingerprints, assertions):
+        # (user_lang, split_lines) used for the check
+        self.settings = settings
+        # File name -> content hash
+        self.fingerprints = fingerprints
+        # File name -> list of (error_message, error_level, file_name, epubcfi, rule)
+        self.assertions = assertions
+
+
+# Hash the content of every file in the container
+def fingerprint(container):
+    fingerprints = {}
+    for name, path in container.name_path_map.items():
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                h.update(chunk)
+        fingerprints[name] = h.hexdigest()
+    return fingerprints
+
+
+def spine_names(container):
+    return [name for name, linear in container.spine_names]
+
+
+# Get the spine documents to re-check, or None if the whole book must be checked
+# Only content documents and the OPF may have changed: a change in any other
+# file (CSS, images, fonts...) can change the results of every document.
+def changed_documents(container, state, fingerprints, settings):
+    if state is None or state.settings != settings:
+        return None
+    spine = spine_names(container)
+    if set(spine) - set(state.fingerprints):
+        return None
+    changed = set()
+    for name in set(fingerprints) | set(state.fingerprints):
+        if fingerprints.get(name) == state.fingerprints.get(name):
+            continue
+        if name in spine:
+            changed.add(name)
+        elif name != container.opf_name:
+            return None
+    # ACE needs at least one document to check
+    if not changed:
+        changed.add(spine[0])
+    return changed
+
+
+# Remove unchanged documents from the spine of a (cloned) container
+def restrict_spine(container, names):
+    for itemref in container.opf_xpath('//opf:spine/opf:itemref[@idref]'):
+        if container.manifest_id_map.get(itemref.get('idref')) not in names:
+            container.remove_from_xml(itemref)
+    container.dirty(container.opf_name)
+
+
+# Group assertions by container name
+# The strings are shared with the ResultStore, so only the tuples take memory.
+def group_by_file(container, error_messages):
+    assertions = {}
+    names = {}
+    for i, (msg_index, error_message, error_level, file_name, epubcfi) in enumerate(error_messages):
+        name = names.get(file_name)
+        if name is None:
+            name = names[file_name] = container.href_to_name(file_name, container.opf_name)
+        rule = error_messages.rule(i) if isinstance(error_messages, ResultStore) else None
+        assertions.setdefault(name, []).append((error_message, error_level, file_name, epubcfi, rule))
+    return assertions
+
+
+# Merge the results of a partial check with the cached results of the unchanged documents
+def merge(container, state, rechecked, assertions):
+    spine = spine_names(container)
+    merged = {}
+    for name in spine:
+        if name not in rechecked and name in state.assertions:
+            merged[name] = state.assertions[name]
+    merged.update(assertions)
+    return merged, flatten(container, merged)
+
+
+# Number assertions grouped by file (see group_by_file) as error messages
+# Package level assertions come first, then the documents in spine order.
+def flatten(container, assertions):
+    spine = spine_names(container)
+    order = [name for name in assertions if name not in spine] + [name for name in spine if name in assertions]
+    error_messages = ResultStore()
+    for name in order:
+        for error_message, error_level, file_name, epubcfi, rule in assertions[name]:
+            error_messages.append((len(error_messages), error_message, error_level, file_name, epubcfi), rule)
+    return error_messages
@@ -9,21 +9,21 @@ __copyright__ = '2018-2022, Thiago Oliveira'
 __docformat__ = 'restructuredtext en'
 
 # Standard libraries
+# Only what the toolbar icon and the menu need: the modules used to check
+# a book are loaded when the first check runs.
 import os
 import os.path
-import webbrowser
-import shutil
-import json
-from datetime import datetime
-import time
+from functools import partial
 
 # PyQt libraries
 try:
     from qt.core import (QApplication, QAction, QMessageBox, Qt, QMenu, QIcon, QtCore, QtGui,
-                         QPixmap, QTreeWidget, QTreeWidgetItem, QVBoxLayout, QDockWidget, QEventLoop)
+                         QPixmap, QTreeView, QVBoxLayout, QDockWidget, QTimer, QWidget, QLabel,
+                         QDialog, QDialogButtonBox, QTreeWidget, QTreeWidgetItem, QTabWidget, QPushButton)
 except ImportError:
     from PyQt5.Qt import (QApplication, QAction, QMessageBox, Qt, QMenu, QIcon, QPixmap,
-                          QTreeWidget, QTreeWidgetItem, QVBoxLayout, QDockWidget, QEventLoop)
+                          QTreeView, QVBoxLayout, QDockWidget, QTimer, QWidget, QLabel,
+                          QDialog, QDialogButtonBox, QTreeWidget, QTreeWidgetItem, QTabWidget, QPushButton)
     from PyQt5 import QtCore, QtGui
 
 # Get PyQt version
@@ -32,29 +32,16 @@ Qt_version = int(QtCore.PYQT_VERSION_STR[0])
 # Calibre libraries
 from calibre.gui2 import error_dialog
 from calibre.gui2.tweak_book.plugin import Tool
-from calibre.utils.config import JSONConfig, config_dir
-from calibre.constants import iswindows, islinux, isosx, numeric_version
-from calibre.ebooks.BeautifulSoup import BeautifulSoup, BeautifulStoneSoup
+from calibre.utils.config import config_dir
+from calibre.constants import islinux, numeric_version
 
-# DiapDealer's temp folder code
-from contextlib import contextmanager
-
-# Get config
-import calibre_plugins.ACE.config as cfg
+# Get preferences (the settings dialog is in config.py)
+import calibre_plugins.ACE.prefs as cfg
 
 # Load translation files (.mo) on the folder 'translations'
 load_translations()
 
 
-# Create a temp directory
-@contextmanager
-def make_temp_directory():
-    import tempfile
-    temp_dir = tempfile.mkdtemp()
-    yield temp_dir
-    shutil.rmtree(temp_dir)
-
-
 # Set up icon
 def get_icon(icon_name):
     # Check to see whether the icon exists as a Calibre resource
@@ -70,112 +57,19 @@ def get_icon(icon_name):
     return get_icons(icon_name)
 
 
-# Get equivalent ARIA role
-def getrole(epub_type):
-    noequiv = {
-        'figure': 'figure', 'glossterm': 'term', 'glossdef': 'definition', 'landmarks': 'directory',
-        'list': 'list', 'list-item': 'listitem', 'page-list': 'doc-pagelist', 'referrer': 'doc-backlink',
-        'table': 'table', 'table-row': 'row', 'table-cell': 'cell',
-    }
-    if epub_type in [
-        'abstract', 'acknowledgments', 'afterword', 'appendix', 'bibliography', 'biblioref', 'chapter',
-        'colophon', 'conclusion', 'cover', 'credit', 'credits', 'dedication', 'endnotes', 'epigraph',
-        'epilogue', 'errata', 'footnote', 'foreword', 'glossary', 'glossref', 'index', 'introduction',
-        'noteref', 'notice', 'pagebreak', 'part', 'preface', 'prologue', 'pullquote', 'qna', 'backlink',
-        'subtitle', 'tip', 'toc'
-    ]:
-        role = 'doc-' + epub_type
-    elif epub_type in noequiv:
-        role = noequiv[epub_type]
-    else:
-        role = None
-    return role
-
-
-# Simple wrapper for ACE
-def ace_wrapper(*args):
-    import subprocess
-    startupinfo = None
-    if islinux:
-        process = subprocess.Popen(list(args), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                   startupinfo=startupinfo, shell=False)
-    else:
-        process = subprocess.Popen(list(args), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                   startupinfo=startupinfo, shell=True)
-        # Stop the windows console popping up every time the program is run
-        if iswindows:
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            startupinfo.wShowWindow = subprocess.SW_HIDE
-    ret = process.communicate()
-    return_code = process.returncode
-    return ret, return_code
-
-def update_ace(self):
-    # Make sure we have an Internet connection
-    if is_connected():
-        msg = _('Running update check...')
-        self.gui.show_status_message(msg)
-        QApplication.processEvents(QEventLoop.ProcessEventsFlag.ExcludeUserInputEvents)
-
-        # Check if an update is available
-        check_args = ['npm', 'outdated', '-g']
-        update_check = ace_wrapper(*check_args)[0]
-        stderr = update_check[1]
-
-        # Check if Node.js is installed
-        if b'\'npm\'' in stderr:
-            self.gui.show_status_message('')
-            error_title = _('Node.js is not installed.')
-            error_msg = _('Install Node.js 10 or higher, then run: \'npm install @daisy/ace -g\' on a cmd/terminal window.')
-            error_dialog(self.gui, error_title, error_msg, show=True)
-            return False
+# Save the ACE command line found by the background checks (see runner.AceExecutable)
+def save_ace_executable():
+    from calibre_plugins.ACE.runner import ace_executable
+    ace_executable.save()
+
+
+# Browsers tried in turn to open the report on Linux
+LINUX_BROWSERS = ('xdg-open', 'google-chrome', 'firefox', 'chromium', 'opera', 'midori')
+
+# Milliseconds to wait after the editor starts, or while ACE is checking a
+# book, before checking for updates
+UPDATE_CHECK_DELAY = 60 * 1000
 
-        if '@daisy/ace' in str(update_check):
-            msg = _('Updating ACE...')
-            self.gui.show_status_message(msg)
-            QApplication.processEvents(QEventLoop.ProcessEventsFlag.ExcludeUserInputEvents)
-
-            # Update ACE to the latest version
-            update_args = ['npm', 'install', '@daisy/ace', '-g']
-            update_return_code = ace_wrapper(*update_args)[1]
-
-            if update_return_code == 0:
-                version_args = ['ace', '-v']
-                result = ace_wrapper(*version_args)[0]
-                version_check = result[0].decode('utf-8').replace('\n', '')
-                msg = _('ACE was successfully updated to version %s.') % version_check
-                self.gui.show_status_message(msg, 5)
-                QApplication.processEvents(QEventLoop.ProcessEventsFlag.ExcludeUserInputEvents)
-            else:
-                msg = _('Update failed.')
-                self.gui.show_status_message(msg, 5)
-                QApplication.processEvents(QEventLoop.ProcessEventsFlag.ExcludeUserInputEvents)
-        else:
-            msg = _('No updates found.')
-            self.gui.show_status_message(msg, 5)
-            QApplication.processEvents(QEventLoop.ProcessEventsFlag.ExcludeUserInputEvents)
-
-        # Update time stamp in Check_Books.json
-        cfg.plugin_prefs.set('last_time_checked', str(datetime.now()))
-        cfg.plugin_prefs.commit()
-        time.sleep(1)
-    else:
-        msg = _('Update check skipped: no internet.')
-        self.gui.show_status_message(msg, 5)
-        QApplication.processEvents(QEventLoop.ProcessEventsFlag.ExcludeUserInputEvents)
-
-def is_connected():
-    import socket
-    try:
-        sock = socket.create_connection(('8.8.8.8', 53), 1)
-        sock.close()
-        return True
-    except:
-        pass
-
-def string_to_date(date_string):
-    return datetime.strptime(date_string, '%Y-%m-%d %H:%M:%S.%f')
 
 # Main Class
 class AceTool(Tool):
@@ -185,6 +79,41 @@ class AceTool(Tool):
     allowed_in_toolbar = True
     # If True the user can choose to place this tool in the plugins menu
     allowed_in_menu = True
+    # Background ACE check, if any
+    worker = None
+    # Book path -> CheckState of its last check (for incremental checks)
+    check_states = None
+    # True once the worker started posting rows to a new dock
+    streaming = False
+    # Errors of the last check not found anymore (see history_ready)
+    resolved = ()
+    # PhaseTimer of the running check, if enabled
+    timer = None
+    # Message about the last check, shown with its timings
+    status_note = None
+    # Worker whose results are in the dock
+    dock_worker = None
+    # ResultsModel of the dock
+    model = None
+    # True once the background update check is scheduled
+    update_scheduled = False
+    # Background update check or installation, if any
+    updater = None
+    # 'Update ACE' menu item, shown when an update is available
+    update_menu_item = None
+    # Delay of live checks, restarted on every change of the edited file
+    live_timer = None
+    # Editor watched for live checks
+    live_editor = None
+    # Background check of the edited file, and the model it updates
+    live_worker = None
+    live_model = None
+    # Row of the first error of the last live check in the dock
+    live_start = 0
+    # True if the dock has pre-check results (see precheck.py)
+    dock_precheck = False
+    # Html report of the last check, opened from the summary tab of the dock
+    last_report = None
 
     # Set up the config dialog inside the Editor
     def do_config(self):
@@ -215,6 +144,8 @@ class AceTool(Tool):
             def accept(self):
                 if self.widget.validate():
                     self.widget.save_settings()
+                    if tool.model is not None:
+                        tool.start_live_check()
                     Dialog.accept(self)
 
         d = ConfigDialog()
@@ -243,31 +174,111 @@ class AceTool(Tool):
                 config_menu_item.setIcon(QIcon(I('config.png')))
                 config_menu_item.setStatusTip(_('Configure ACE plugin'))
                 config_menu_item.triggered.connect(self.do_config)
+                precheck_menu_item = menu.addAction(_('Quick pre-check'))
+                precheck_menu_item.setStatusTip(_('Check the most common rules right away, without ACE'))
+                precheck_menu_item.triggered.connect(self.run_precheck)
+                self.update_menu_item = menu.addAction(_('Update ACE'))
+                self.update_menu_item.setStatusTip(_('Install the latest version of ACE'))
+                self.update_menu_item.triggered.connect(self.install_update)
+                self.show_update_menu_item()
 
         ac.triggered.connect(self.run)
+        self.schedule_update_check()
         return ac
 
+    # Check for ACE updates in the background, some time after the editor starts
+    def schedule_update_check(self):
+        if AceTool.update_scheduled or not cfg.plugin_prefs['update']:
+            return
+        if not cfg.update_due(cfg.plugin_prefs['last_time_checked'], cfg.plugin_prefs['check_interval']):
+            return
+        AceTool.update_scheduled = True
+        QTimer.singleShot(UPDATE_CHECK_DELAY, self.check_for_updates)
+
+    def check_for_updates(self):
+        # Wait for the editor to be idle
+        if (self.worker is not None and self.worker.isRunning()) or \
+                (self.updater is not None and self.updater.isRunning()):
+            QTimer.singleShot(UPDATE_CHECK_DELAY, self.check_for_updates)
+            return
+        from calibre_plugins.ACE.updates import UpdateChecker
+        self.updater = UpdateChecker(self.gui)
+        self.updater.checked.connect(self.update_checked)
+        self.updater.finished.connect(partial(self.updater_done, self.updater))
+        self.updater.start()
+
+    # Release the update thread once its result has been handled
+    def updater_done(self, updater):
+        if updater is self.updater:
+            self.updater = None
+        updater.deleteLater()
+
+    # Cache the versions found by the update check and tell about updates
+    def update_checked(self, installed, latest, error):
+        save_ace_executable()
+        if error == 'offline':
+            self.gui.show_status_message(_('Update check skipped: no internet.'), 5)
+            return
+        if error == 'npm':
+            self.gui.show_status_message(_('ACE update check failed: Node.js is not installed.'), 5)
+            return
+        if installed is not None:
+            cfg.plugin_prefs['ace_version'] = installed
+        if latest is not None:
+            cfg.plugin_prefs['latest_ace_version'] = latest
+        from datetime import datetime
+        cfg.plugin_prefs['last_time_checked'] = str(datetime.now())
+        if cfg.update_available(installed, latest):
+            self.gui.show_status_message(_('ACE {0} is available (installed: {1}). '
+                                           'Use \'Update ACE\' on the ACE menu to install it.')
+                                         .format(latest, installed), 10)
+        self.show_update_menu_item()
+
+    def show_update_menu_item(self):
+        if self.update_menu_item is None:
+            return
+        latest = cfg.plugin_prefs['latest_ace_version']
+        available = cfg.update_available(cfg.plugin_prefs['ace_version'], latest)
+        self.update_menu_item.setVisible(available)
+        if available:
+            self.update_menu_item.setText(_('Update ACE to version {}').format(latest))
+
+    # Install the latest ACE in the background
+    def install_update(self):
+        from calibre_plugins.ACE.updates import UpdateInstaller
+        if self.updater is not None and self.updater.isRunning():
+            return
+        self.updater = UpdateInstaller(self.gui)
+        self.updater.installed.connect(self.update_installed)
+        self.updater.finished.connect(partial(self.updater_done, self.updater))
+        self.updater.start()
+        self.gui.show_status_message(_('Updating ACE...'))
+
+    def update_installed(self, return_code, version):
+        if return_code == 0 and version is not None:
+            cfg.plugin_prefs['ace_version'] = version
+            # The warm ACE process still runs the old version
+            from calibre_plugins.ACE.engine import shutdown_engine
+            shutdown_engine()
+            self.gui.show_status_message(_('ACE was successfully updated to version %s.') % version, 5)
+        else:
+            self.gui.show_status_message(_('Update failed.'), 5)
+        self.show_update_menu_item()
+
     # Main routine
     def run(self):
         # Get preferences
-        open_report = cfg.plugin_prefs['open_report']
         report_path = cfg.plugin_prefs['report_path']
-        debug_mode = cfg.plugin_prefs['debug_mode']
-        close_docks = cfg.plugin_prefs['close_docks']
-        user_lang = cfg.plugin_prefs['user_lang']
+        user_lang = cfg.user_language()
         split_lines = cfg.plugin_prefs['split_lines']
-        update = cfg.plugin_prefs['update']
-        check_interval = cfg.plugin_prefs['check_interval']
-        last_time_checked = cfg.plugin_prefs['last_time_checked']
-
-        # Check for ACE updates
-        if update:
-            # Compare current date against last update check date
-            time_delta = (datetime.now() - string_to_date(last_time_checked)).days
-            if time_delta >= check_interval:
-                status = update_ace(self)
-                if status is False:
-                    return
+        engine_mode = cfg.plugin_prefs['engine_mode']
+        incremental_check = cfg.plugin_prefs['incremental_check']
+        report_cache = cfg.plugin_prefs['report_cache']
+
+        # Only one check at a time
+        if self.checking():
+            self.gui.show_status_message(_('ACE is still checking the book...'), 3)
+            return
 
         # Create a savepoint
         try:
@@ -284,414 +295,626 @@ class AceTool(Tool):
                                     _('You can\'t check {} files with ACE.').format(book_type))
             return
 
-        # Create temp directory and Run ACE
-        with make_temp_directory() as td:
-            # Write current container to temporary epub
-            epub_path = os.path.join(td, 'temp.epub')
-            report_folder = os.path.join(report_path, 'report')
-            report_data = os.path.join(report_folder, 'data')
-            report_file_name = os.path.join(report_folder, 'report.html')
-            json_file_name = report_file_name.replace('.html', '.json')
-            if os.path.exists(report_data):
-                shutil.rmtree(report_data)
+        import shutil
+        report_folder = os.path.join(report_path, 'report')
+        report_data = os.path.join(report_folder, 'data')
+        if os.path.exists(report_data):
+            shutil.rmtree(report_data)
+
+        # Clone the current container, so the book can be written and
+        # checked in the background while the user keeps editing
+        import tempfile
+        from calibre.ebooks.oeb.polish.container import clone_container
+        from calibre_plugins.ACE.worker import AceWorker
+        from calibre_plugins.ACE.timing import PhaseTimer, timed
+        timer = PhaseTimer() if cfg.plugin_prefs['performance_log'] else None
+        with timed(timer, 'save'):
             self.boss.commit_all_editors_to_container()
-            self.current_container.commit(epub_path)
-
-            # Define ACE command line parameters
-            # args = ['yarn', '--cwd', 'F:\\GitHub\\ace-tool\\ace', 'ace', '-f', '-o', report_folder, '-l', user_lang, epub_path]
-            args = ['ace', '-f', '-o', report_folder, '-l', user_lang, epub_path]
+        td = tempfile.mkdtemp()
+        container_dir = os.path.join(td, 'container')
+        os.mkdir(container_dir)
+        try:
+            with timed(timer, 'clone'):
+                container = clone_container(self.current_container, container_dir)
+        except:
+            shutil.rmtree(td, ignore_errors=True)
+            import traceback
+            error_dialog(self.gui, _('Unhandled exception'),
+                         _('An unexpected error occurred. Click \'Show details\' for more info.'),
+                         det_msg=traceback.format_exc(), show=True)
+            return
 
+        # Anything failing from here on must still remove td
+        try:
             # Create a dictionary that maps names to relative hrefs
             epub_mime_map = self.current_container.mime_map
-            epub_name_to_href = {}
+            self.epub_name_to_href = {}
             for href in epub_mime_map:
-                epub_name_to_href[os.path.basename(href)] = href
+                self.epub_name_to_href[os.path.basename(href)] = href
+            self.checked_book = self.current_container.path_to_ebook
+            self.last_report = None
+
+            # Reuse a warm ACE process, if enabled (it is started by the worker)
+            engine_timeout = cfg.plugin_prefs['engine_idle_timeout'] * 60 if engine_mode else None
+
+            # Results of the last check, to only check the files changed since then
+            if self.check_states is None:
+                self.check_states = {}
+            state = self.check_states.get(self.checked_book)
+
+            # Reports of books checked before
+            cache = None
+            if report_cache:
+                from calibre_plugins.ACE.cache import ReportCache, default_cache_dir
+                cache = ReportCache(default_cache_dir(), cfg.plugin_prefs['cache_size'] * 1024 * 1024)
+
+            # Results of the previous checks of the book
+            history = None
+            if cfg.plugin_prefs['run_history']:
+                from calibre_plugins.ACE.history import RunHistory, default_history_path
+                history = RunHistory(default_history_path(), cfg.plugin_prefs['history_runs'])
+
+            # Split large books between several ACE processes
+            parallel_parts = cfg.plugin_prefs['parallel_parts'] if cfg.plugin_prefs['parallel_check'] else None
+
+            # Facts to compare the timings of different checks
+            self.timer = timer
+            self.status_note = None
+            if timer is not None:
+                from calibre_plugins.ACE.__init__ import PLUGIN_VERSION
+                from calibre.constants import __version__
+                timer.stats.update([
+                    ('plugin_version', PLUGIN_VERSION), ('calibre_version', __version__),
+                    ('ace_version', cfg.plugin_prefs['ace_version']), ('engine', engine_mode),
+                    ('incremental', incremental_check), ('cache', cache is not None),
+                    ('parallel', parallel_parts is not None), ('unpacked', cfg.plugin_prefs['unpacked_check']),
+                ])
+
+            # Run ACE in a background thread
+            self.worker = AceWorker(container, td, report_folder, user_lang, split_lines, engine_timeout,
+                                    incremental_check, state, cache, cfg.plugin_prefs['ace_version'],
+                                    parallel_parts, cfg.plugin_prefs['unpacked_check'], history, self.checked_book,
+                                    timer, parent=self.gui)
+            self.worker.result_ready.connect(self.check_finished)
+            self.worker.rows_ready.connect(self.rows_ready)
+            self.worker.lines_ready.connect(self.lines_ready)
+            self.worker.history_ready.connect(self.history_ready)
+            self.worker.finished.connect(partial(self.check_done, self.worker))
+            self.streaming = False
+            self.worker.start()
+        except:
+            shutil.rmtree(td, ignore_errors=True)
+            import traceback
+            error_dialog(self.gui, _('Unhandled exception'),
+                         _('An unexpected error occurred. Click \'Show details\' for more info.'),
+                         det_msg=traceback.format_exc(), show=True)
+            return
+        self.gui.show_status_message(_("Checking book..."), 3)
 
-            # Run ACE and handle errors
-            try:
-                # Display busy cursor
-                QApplication.setOverrideCursor(Qt.WaitCursor)
+    # Check the most common rules in the editor, without ACE (see precheck.py)
+    def run_precheck(self):
+        if self.checking():
+            self.gui.show_status_message(_('ACE is still checking the book...'), 3)
+            return
+        try:
+            self.boss.commit_all_editors_to_container()
+        except AttributeError:
+            QMessageBox.information(self.gui, _('Empty Editor'),
+                                    _('You must first open a book!'))
+            return
+        book_type = self.current_container.book_type
+        if book_type != 'epub':
+            QMessageBox.information(self.gui, _('Unsupported file format'),
+                                    _('You can\'t check {} files with ACE.').format(book_type))
+            return
 
-                self.gui.show_status_message(_("Checking book..."), 3)
-                if Qt_version >= 6:
-                    QApplication.processEvents(QtCore.QEventLoop.ProcessEventsFlag.ExcludeUserInputEvents)
-                else:
-                    QApplication.processEvents(QtCore.QEventLoop.ExcludeUserInputEvents)
-
-                # Run ACE
-                result, return_code = ace_wrapper(*args)
-                stdout = result[0].decode('utf-8')
-                stderr = result[1].decode('utf-8')
-
-                # Debug mode (ACE log)
-                if debug_mode:
-                    stdout += stderr
-                    QApplication.clipboard().setText(stdout)
-
-                if return_code == 1:
-                    # Hide busy cursor
-                    QApplication.restoreOverrideCursor()
-                    self.gui.show_status_message('')
-
-                    # Get ACE errors
-                    # ACE only gives 1 as return code when the file can't be processed.
-                    # Otherwise, it returns 0, even if the book has errors.
-                    if '\'ace\'' in stderr:
-                        error_title = _('ACE is not installed.')
-                        msg = _('Install Node.js 10 or higher, then run: \'npm install @daisy/ace -g\' on a cmd/terminal window.')
-                    else:
-                        error_title = _('Invalid EPUB or DRMed')
-                        msg = _('This file is either corrupted/invalid or DRMed')
-                    error_dialog(self.gui, error_title, msg, show=True)
-                    return
+        from calibre_plugins.ACE.precheck import precheck
+        try:
+            error_messages = precheck(self.current_container)
+        except Exception:
+            import traceback
+            error_dialog(self.gui, _('Unhandled exception'),
+                         _('An unexpected error occurred. Click \'Show details\' for more info.'),
+                         det_msg=traceback.format_exc(), show=True)
+            return
+        if not error_messages:
+            self.gui.show_status_message(_('Pre-check: no errors found. Run ACE for the full check.'), 5)
+            return
+        self.epub_name_to_href = {}
+        for href in self.current_container.mime_map:
+            self.epub_name_to_href[os.path.basename(href)] = href
+        self.checked_book = self.current_container.path_to_ebook
+        self.create_dock(self.epub_name_to_href, cfg.plugin_prefs['close_docks'], precheck=True)
+        self.add_results(error_messages)
+        self.finish_dock()
+
+    # True while ACE is checking the book or the edited file
+    def checking(self):
+        return any(worker is not None and worker.isRunning() for worker in (self.worker, self.live_worker))
+
+    # Handle the results posted back by the worker
+    def check_finished(self, result):
+        # Get preferences
+        open_report = cfg.plugin_prefs['open_report']
+        debug_mode = cfg.plugin_prefs['debug_mode']
+        close_docks = cfg.plugin_prefs['close_docks']
+        report_file_name = result.report_file_name
+        self.gui.show_status_message('')
+
+        # Exit if an unexpected error occurs, and report the error to the user
+        if result.traceback is not None:
+            error_dialog(self.gui, _('Unhandled exception'),
+                         _('An unexpected error occurred. Click \'Show details\' for more info.'),
+                         det_msg=result.traceback, show=True)
+            return
 
-                # If ACE succeeded, there should be a report file in the home folder
-                if os.path.isfile(report_file_name):
-                    with open(json_file_name, 'r') as file:
-                        json_string = file.read()
-                    parsed_json = json.loads(json_string)
-                    earl_outcome = parsed_json['earl:result']['earl:outcome']
-
-                    # Parse JSON report file
-                    error_messages = []
-                    msg_index = 0
-
-                    if earl_outcome == 'fail':
-                        for assertion in parsed_json['assertions']:
-
-                            # Get file name
-                            file_name = assertion['earl:testSubject']['url']
-
-                            # Process all ACE assertions
-                            for earl_assertion in assertion['assertions']:
-
-                                # Get error message
-                                if split_lines:
-                                    error_message = (earl_assertion['earl:result']['dct:description'])
-                                else:
-                                    error_message = (earl_assertion['earl:result']['dct:description'] + '.') \
-                                        .replace('\n', '. ').strip()
-
-                                # Get error level (critical, serious, moderate, minor) and id
-                                error_level = earl_assertion['earl:test']['earl:impact']
-                                error_id = earl_assertion['earl:test']['dct:title']
-
-                                # Get epubcfi
-                                if 'earl:pointer' in earl_assertion['earl:result']:
-                                    epubcfi = earl_assertion['earl:result']['earl:pointer']['cfi'][0]
-                                else:
-                                    # ACE doesn't report line numbers for non-HTML files
-                                    epubcfi = '/2'
-
-                                # Get html (snippet) and recommended ARIA role
-                                roles = []
-                                if 'html' in earl_assertion['earl:result']:
-                                    snippet = earl_assertion['earl:result']['html']
-                                    if numeric_version < (3, 41, 0):
-                                        soup = BeautifulSoup(snippet)
-                                        tag = soup.contents[0]
-                                        if 'epub:type' in str(tag):
-                                            epub_type = tag['epub:type']
-                                            epub_type_list = epub_type.split()
-                                            for epub_type_item in epub_type_list:
-                                                roles.append(getrole(epub_type_item))
-                                    else:
-                                        soup = BeautifulStoneSoup(snippet)
-                                        tag = soup.contents[0]
-                                        if 'epub:type' in tag.attrs:
-                                            epub_type = tag['epub:type']
-                                            epub_type_list = epub_type.split()
-                                            for epub_type_item in epub_type_list:
-                                                roles.append(getrole(epub_type_item))
-
-                                # Add suggested role:
-                                if error_id == 'epub-type-has-matching-role' and roles is not []:
-                                    role_string = None
-                                    multiple_roles_msg = ''
-                                    for role in roles:
-                                        if role is not None:
-                                            if role_string is None:
-                                                role_string = role
-                                            else:
-                                                role_string = role_string + ', ' + role
-                                                multiple_roles_msg = _(' (you must use only one role)')
-                                    error_message += '.' + _(' Matching ARIA role: ') + role_string + multiple_roles_msg + '.'
-
-                                # Save error information in a list
-                                error_messages.append((msg_index, error_message, error_level, file_name, epubcfi))
-
-                                # Message index to help sorting
-                                msg_index = msg_index + 1
-
-                    else:
-                        # Hide busy cursor
-                        QApplication.restoreOverrideCursor()
-
-                        no_error_msg = _('ACE check is finished!'
-                                         '\nCongratulations: no errors were found!')
-                        QMessageBox.information(self.gui, 'ACE, by Daisy', no_error_msg)
-
-                        # Show report on default browser
-                        if open_report:
-                            url = os.path.abspath(report_file_name)
-                            if islinux:
-                                browsers = ['google-chrome', 'firefox', 'chromium', 'opera', 'lynx', 'midori']
-                                import subprocess
-                                sucess = False
-                                try:
-                                    for br in browsers:
-                                        try:
-                                            subprocess.check_call([br, url])
-                                            sucess = True
-                                            break
-                                        except:
-                                            pass
-                                except:
-                                    import traceback
-                                    error_dialog(self.gui, _('No browser found'),
-                                                 _('Could not find a browser to open the report. '
-                                                   'Click \'Show details\' for more info.'),
-                                                 det_msg=traceback.format_exc(), show=True)
-                                if sucess:
-                                    pass
-                                else:
-                                    import traceback
-                                    error_dialog(self.gui, _('No browser found'),
-                                                       _('Could not find a browser to open the report. '
-                                                         'Click \'Show details\' for more info.'),
-                                                       det_msg=traceback.format_exc(), show=True)
-                            else:
-                                url = 'file://' + url
-                                webbrowser.open(url)
-
-                        return
+        self.last_report = report_file_name
 
-                else:
+        # Debug mode (ACE log)
+        if debug_mode:
+            QApplication.clipboard().setText(result.stdout + result.stderr)
 
-                    # Hide busy cursor
-                    QApplication.restoreOverrideCursor()
+        if result.return_code == 1:
+            # Get ACE errors
+            # ACE only gives 1 as return code when the file can't be processed.
+            # Otherwise, it returns 0, even if the book has errors.
+            if result.not_installed:
+                error_title = _('ACE is not installed.')
+                msg = _('Install Node.js 10 or higher, then run: \'npm install @daisy/ace -g\' on a cmd/terminal window.')
+            else:
+                error_title = _('Invalid EPUB or DRMed')
+                msg = _('This file is either corrupted/invalid or DRMed')
+            error_dialog(self.gui, error_title, msg, show=True)
+            return
 
-                    # If, for some reason, the report can't be found
-                    import traceback
-                    error_dialog(self.gui, _('Error opening the report'),
-                                 _('Ace could not open the report. Click \'Show details\' for more info.'),
-                                 det_msg=traceback.format_exc(), show=True)
-                    return
+        if not result.has_report:
+            # If, for some reason, the report can't be found
+            error_dialog(self.gui, _('Error opening the report'),
+                         _('Ace could not open the report. Click \'Show details\' for more info.'),
+                         det_msg=result.stderr, show=True)
+            return
 
-                # Go to the error line
-                def go_to_line():
-
-                    # Parse the CFI reference
-                    def decode_cfi(root, cfi):
-                        from lxml.etree import XPathEvalError
-                        from calibre.ebooks.epub.cfi.parse import parser, get_steps
-                        p = parser()
-                        try:
-                            pcfi = p.parse_path(cfi)[0]
-                        except Exception:
-                            import traceback
-                            traceback.print_exc()
-                            return
-                        if not pcfi:
-                            import sys
-                            try:
-                                print('Failed to parse CFI: %r' % pcfi, file=sys.stderr)
-                            except:
-                                print('Failed to parse CFI')
-                            return
-                        steps = get_steps(pcfi)
-                        ans = root
-                        for step in steps:
-                            num = step.get('num', 0)
-                            node_id = step.get('id')
-                            try:
-                                match = ans.xpath('descendant::*[@id="%s"]' % node_id)
-                            except XPathEvalError:
-                                match = ()
-                            if match:
-                                ans = match[0]
-                                continue
-                            index = 0
-                            for child in ans.iterchildren('*'):
-                                index |= 1  # increment index by 1 if it is even
-                                index += 1
-                                if index == num:
-                                    ans = child
-                                    break
-                            else:
-                                return
-                        return ans
-
-                    # Jump to the line corresponding to a partial CFI ref
-                    def show_partial_cfi_in_editor(name, cfi):
-                        editor = self.boss.edit_file(name)
-                        if not editor or not editor.has_line_numbers:
-                            return False
-                        from calibre.ebooks.oeb.polish.parsing import parse
-                        root = parse(
-                            editor.get_raw_data(), decoder=lambda x: x.decode('utf-8'),
-                            line_numbers=True, linenumber_attribute='data-lnum')
-                        node = decode_cfi(root, cfi)
-                        if node is not None:
-                            lnum = node.get('data-lnum')
-                            if lnum:
-                                lnum = int(lnum)
-                                editor.current_line = lnum
-                                return True
-                        return False
-
-                    # Get the current line for the widget
-                    selected_item = tree.currentItem()
-                    # Read the msg_index (hidden column)
-                    row_index = int(selected_item.text(0)) - 1
-
-                    # Get error information
-                    m_index, msg, sev, f_name, epub_cfi = error_messages[row_index]
-
-                    # Jump to line
-                    f_name = os.path.basename(f_name)
-                    filepath = epub_name_to_href[f_name]
-                    if os.path.splitext(filepath)[1] == '.opf':
-                        self.boss.edit_file(filepath)  # .opf files does not support epubcfi
-                    else:
-                        if numeric_version < (3, 38, 0):
-                            show_partial_cfi_in_editor(filepath, epub_cfi)
-                        else:
-                            self.boss.show_partial_cfi_in_editor(filepath, epub_cfi)
-
-                # Remove existing Ace/EpubCheck docks and close Check Ebook dock
-                for widget in self.gui.children():
-                    if isinstance(widget, QDockWidget) and widget.objectName() == 'ace-dock':
-                        widget.setParent(None)
-                    if close_docks:
-                        if isinstance(widget, QDockWidget) and widget.objectName() \
-                                in ('check-book-dock', 'epubcheck-dock'):
-                            widget.close()
-
-                # Define dock widget layout
-                try:
-                    is_dark_theme = QApplication.instance().is_dark_theme
-                except:
-                    is_dark_theme = False
-                tree = QTreeWidget()
-                tree.setRootIsDecorated(False)
-                layout = QVBoxLayout()
-                layout.addWidget(tree)
-                dock_widget = QDockWidget(self.gui)
-                dock_widget.setAllowedAreas(Qt.LeftDockWidgetArea | Qt.RightDockWidgetArea |
-                                            Qt.BottomDockWidgetArea | Qt.TopDockWidgetArea)
-                dock_widget.setObjectName('ace-dock')
-                dock_widget.setWindowTitle('ACE, by Daisy')
-                dock_widget.setWidget(tree)
-                tree.setHeaderLabels(['Index', _('File'), _('Severity'), _('Error message')])
-                header = tree.headerItem()
-                header.setToolTip(1, _('Sort by Filename'))
-                header.setToolTip(2, _('Sort by Severity'))
-                header.setToolTip(3, _('Sort by Error Message'))
-
-                # Add error messages to list widget
-                for error_msg in error_messages:
-                    msg_index, message, error_level, file_name, epubcfi = error_msg
-
-                    # Set translatable severity type
-                    if error_level == 'critical':
-                        severity_type = _('Critical')
-                    elif error_level == 'serious':
-                        severity_type = _('Serious')
-                    elif error_level == 'moderate':
-                        severity_type = _('Moderate')
-                    else:
-                        severity_type = _('Minor')
-
-                    msg_index = msg_index + 1
-                    msg_index = "{0:0=3d}".format(msg_index)
-                    item = QTreeWidgetItem(tree, [str(msg_index), os.path.split(file_name)[1], severity_type, message])
-                    # Select background color based on severity
-                    if error_level == 'critical':
-                        bg_color = QtGui.QBrush(QtGui.QColor(255, 190, 190))
-                    elif error_level == 'serious':
-                        bg_color = QtGui.QBrush(QtGui.QColor(255, 220, 224))
-                    elif error_level == 'moderate':
-                        bg_color = QtGui.QBrush(QtGui.QColor(255, 255, 230))
-                    else:
-                        bg_color = QtGui.QBrush(QtGui.QColor(200, 255, 240))
-                    item.setBackground(0, QtGui.QColor(bg_color))
-                    item.setBackground(1, QtGui.QColor(bg_color))
-                    item.setBackground(2, QtGui.QColor(bg_color))
-                    item.setBackground(3, QtGui.QColor(bg_color))
-                    if is_dark_theme:
-                        item.setForeground(0, QtGui.QBrush(QtGui.QColor("black")))
-                        item.setForeground(1, QtGui.QBrush(QtGui.QColor("black")))
-                        item.setForeground(2, QtGui.QBrush(QtGui.QColor("black")))
-                        item.setForeground(3, QtGui.QBrush(QtGui.QColor("black")))
-                    tree.addTopLevelItem(item)
-
-                tree.itemClicked.connect(go_to_line)
-
-                # Double-click copies to clipboard
-                def msg_to_clipboard():
-                    item_content = _('File') + ': ' + tree.currentItem().text(1) + '\n' + \
-                                   _('Severity') + ': ' + tree.currentItem().text(2) + '\n' + \
-                                   _('Error message') + ': ' + tree.currentItem().text(3)
-                    QApplication.clipboard().setText(item_content)
-
-                tree.itemDoubleClicked.connect(msg_to_clipboard)
-
-                # Add dock widget to the dock
-                self.gui.addDockWidget(Qt.TopDockWidgetArea, dock_widget)
-
-                # Auto adjust column sizes
-                tree.resizeColumnToContents(0)
-                tree.resizeColumnToContents(1)
-
-                # Enable sorting
-                tree.setSortingEnabled(True)
-                tree.sortItems(0, Qt.AscendingOrder)
-                tree.setColumnHidden(0, True)
-
-            except:
-
-                # Hide busy cursor
-                QApplication.restoreOverrideCursor()
-
-                # Exit if an unexpected error occurs, and report the error to the user
-                import traceback
-                error_dialog(self.gui, _('Unhandled exception'),
-                             _('An unexpected error occurred. Click \'Show details\' for more info.'),
-                             det_msg=traceback.format_exc(), show=True)
-                return
-
-        # Hide busy cursor
-        QApplication.restoreOverrideCursor()
+        # The book was closed or replaced while ACE was running
+        book = getattr(self.current_container, 'path_to_ebook', None)
+        if book != self.checked_book:
+            return
+
+        if result.ace_version is not None and result.ace_version != cfg.plugin_prefs['ace_version']:
+            cfg.plugin_prefs['ace_version'] = result.ace_version
+        if result.state is not None:
+            self.check_states[book] = result.state
+        if result.cached:
+            self.status_note = _('This book was not changed since it was last checked.')
+        elif result.rechecked is not None:
+            self.status_note = _('Only the changed files were checked again ({}).').format(result.rechecked)
+        if self.status_note is not None:
+            self.gui.show_status_message(self.status_note, 5)
+        if self.timer is not None:
+            self.timer.stats.update([('outcome', result.earl_outcome), ('assertions', len(result.error_messages)),
+                                     ('cached', result.cached), ('rechecked', result.rechecked)])
+
+        if result.earl_outcome != 'fail':
+            no_error_msg = _('ACE check is finished!'
+                             '\nCongratulations: no errors were found!')
+            QMessageBox.information(self.gui, 'ACE, by Daisy', no_error_msg)
+
+            # Show report on default browser
+            if open_report:
+                self.open_report(report_file_name)
+            return
+
+        try:
+            from calibre_plugins.ACE.timing import timed
+            with timed(self.timer, 'dock'):
+                if self.streaming:
+                    # The rows are already in the dock
+                    self.finish_dock()
+                else:
+                    self.show_results(result.error_messages, self.epub_name_to_href, close_docks)
+        except:
+            # Exit if an unexpected error occurs, and report the error to the user
+            import traceback
+            error_dialog(self.gui, _('Unhandled exception'),
+                         _('An unexpected error occurred. Click \'Show details\' for more info.'),
+                         det_msg=traceback.format_exc(), show=True)
+            return
 
         # Show report on default browser
         if open_report:
-            url = os.path.abspath(report_file_name)
-            if islinux:
-                browsers = ['google-chrome', 'firefox', 'chromium', 'opera', 'lynx', 'midori']
-                import subprocess
-                sucess = False
+            self.open_report(report_file_name)
+
+    # Show the html report in a browser, without waiting for it to be closed
+    def open_report(self, report_file_name):
+        url = os.path.abspath(report_file_name)
+        if not islinux:
+            import webbrowser
+            webbrowser.open('file://' + url)
+            return
+        import sys
+        import subprocess
+        # In a session of its own, so it isn't closed with the editor. Python 2
+        # can only do it with preexec_fn, which isn't safe in calibre's threads.
+        kwargs = {'start_new_session': True} if sys.version_info[0] > 2 else {}
+        errors = []
+        with open(os.devnull, 'r+b') as devnull:
+            for br in LINUX_BROWSERS:
                 try:
-                    for br in browsers:
-                        try:
-                            subprocess.check_call([br, url])
-                            sucess = True
-                            break
-                        except:
-                            pass
-                except:
-                    import traceback
-                    error_dialog(self.gui, _('No browser found'),
-                                 _('Could not find a browser to open the report. '
-                                   'Click \'Show details\' for more info.'), det_msg=traceback.format_exc(), show=True)
-                if sucess:
-                    pass
-                else:
-                    import traceback
-                    error_dialog(self.gui, _('No browser found'),
-                                       _('Could not find a browser to open the report. '
-                                         'Click \'Show details\' for more info.'),
-                                       det_msg=traceback.format_exc(), show=True)
+                    subprocess.Popen([br, url], stdin=devnull, stdout=devnull, stderr=devnull,
+                                     close_fds=True, **kwargs)
+                    return
+                except EnvironmentError as err:
+                    errors.append('%s: %s' % (br, err))
+        error_dialog(self.gui, _('No browser found'),
+                     _('Could not find a browser to open the report. '
+                       'Click \'Show details\' for more info.'),
+                     det_msg='\n'.join(errors), show=True)
+
+    # Fill the ACE dock with the parsed error messages
+    def show_results(self, error_messages, epub_name_to_href, close_docks):
+        self.create_dock(epub_name_to_href, close_docks)
+        self.add_results(error_messages)
+        self.finish_dock()
+
+    # Rows posted by the worker while the report is still being parsed
+    def rows_ready(self, rows):
+        book = getattr(self.current_container, 'path_to_ebook', None)
+        if book != self.checked_book:
+            return
+        from calibre_plugins.ACE.timing import timed
+        with timed(self.timer, 'dock'):
+            if not self.streaming:
+                self.create_dock(self.epub_name_to_href, cfg.plugin_prefs['close_docks'])
+                self.streaming = True
+            self.add_results(rows)
+
+    # Go to the error line
+    def go_to_line(self, index):
+
+        # Jump to the line corresponding to a partial CFI ref
+        def show_partial_cfi_in_editor(name, cfi):
+            editor = self.boss.edit_file(name)
+            if not editor or not editor.has_line_numbers:
+                return False
+            from calibre_plugins.ACE.navigation import decode_cfi
+            root = self.tree_cache.get(name, editor.get_raw_data())
+            node = decode_cfi(root, cfi)
+            if node is not None:
+                lnum = node.get('data-lnum')
+                if lnum:
+                    lnum = int(lnum)
+                    editor.current_line = lnum
+                    return True
+            return False
+
+        # Get error information
+        m_index, msg, sev, f_name, epub_cfi = self.model.error_at(index.row())
+
+        # Jump to line
+        f_name = os.path.basename(f_name)
+        filepath = self.dock_name_to_href[f_name]
+        if os.path.splitext(filepath)[1] == '.opf':
+            self.boss.edit_file(filepath)  # .opf files does not support epubcfi
+        else:
+            # Use the line found in the background, unless the file was edited since
+            lnum = self.model.lines.get(m_index)
+            if lnum is not None and filepath in self.line_digests:
+                from calibre_plugins.ACE.navigation import text_digest
+                editor = self.boss.edit_file(filepath)
+                if editor and editor.has_line_numbers and \
+                        text_digest(editor.get_raw_data()) == self.line_digests[filepath]:
+                    editor.current_line = lnum
+                    return
+            if numeric_version < (3, 38, 0):
+                show_partial_cfi_in_editor(filepath, epub_cfi)
             else:
-                url = 'file://' + url
-                webbrowser.open(url)
\ No newline at end of file
+                self.boss.show_partial_cfi_in_editor(filepath, epub_cfi)
+
+    # Line numbers posted by the worker once the results are shown
+    def lines_ready(self, lines, digests):
+        if self.dock_worker is not self.worker:
+            return
+        self.line_digests = digests
+        self.model.set_lines(lines)
+        self.tree.resizeColumnToContents(self.model.LINE)
+
+    # The worker is done: show and log how long each phase took
+    def check_done(self, worker):
+        save_ace_executable()
+        # Release the worker: the results were already posted to the GUI thread
+        worker.deleteLater()
+        timer = worker.timer
+        if worker is not self.worker:
+            return
+        self.worker = None
+        if timer is None:
+            return
+        self.gui.show_status_message(' '.join(filter(None, [self.status_note, timer.summary()])), 10)
+        try:
+            from calibre_plugins.ACE.timing import log_timings
+            log_timings(timer)
+        except Exception:
+            import traceback
+            traceback.print_exc()
+
+    # Watch the edited file, once a book has results in the dock
+    def start_live_check(self):
+        if not cfg.plugin_prefs['live_check'] or self.live_timer is not None:
+            return
+        self.live_timer = QTimer(self.gui)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.timeout.connect(self.live_check)
+        self.gui.central.current_editor_changed.connect(self.watch_editor)
+        self.watch_editor()
+
+    # Follow the changes of the current editor
+    def watch_editor(self):
+        if self.live_editor is not None:
+            try:
+                self.live_editor.data_changed.disconnect(self.editor_changed)
+            except (TypeError, RuntimeError):
+                # Already closed
+                pass
+        editor = self.gui.central.current_editor
+        self.live_editor = editor if hasattr(editor, 'data_changed') else None
+        if self.live_editor is not None:
+            self.live_editor.data_changed.connect(self.editor_changed)
+
+    # Check the file once the user stops typing
+    def editor_changed(self, *args):
+        if cfg.plugin_prefs['live_check']:
+            self.live_timer.start(cfg.plugin_prefs['live_check_delay'] * 1000)
+
+    # Check the edited file again in the background
+    def live_check(self):
+        if self.model is None or getattr(self.current_container, 'path_to_ebook', None) != self.checked_book:
+            return
+        from calibre_plugins.ACE.incremental import spine_names
+        name = self.boss.currently_editing
+        if name not in spine_names(self.current_container):
+            return
+        # Pre-check results are updated right away
+        if self.dock_precheck:
+            from calibre_plugins.ACE.precheck import precheck
+            self.boss.commit_editor_to_container(name)
+            self.live_start = self.model.replace_files(self.file_names_of(name),
+                                                       precheck(self.current_container, {name}))
+            self.error_messages = self.model.error_messages
+            self.refresh_dock()
+            return
+        # Wait for the running check
+        if self.checking():
+            self.live_timer.start(cfg.plugin_prefs['live_check_delay'] * 1000)
+            return
+
+        import shutil
+        import tempfile
+        from calibre.ebooks.oeb.polish.container import clone_container
+        from calibre_plugins.ACE.worker import AceWorker
+        self.boss.commit_editor_to_container(name)
+        td = tempfile.mkdtemp()
+        container_dir = os.path.join(td, 'container')
+        os.mkdir(container_dir)
+        try:
+            container = clone_container(self.current_container, container_dir)
+        except Exception:
+            shutil.rmtree(td, ignore_errors=True)
+            import traceback
+            traceback.print_exc()
+            return
+        engine_timeout = cfg.plugin_prefs['engine_idle_timeout'] * 60 if cfg.plugin_prefs['engine_mode'] else None
+
+        # The report is only needed for its results, and is removed with td
+        try:
+            worker = AceWorker(container, td, os.path.join(td, 'report'), cfg.user_language(),
+                               cfg.plugin_prefs['split_lines'], engine_timeout,
+                               unpacked=cfg.plugin_prefs['unpacked_check'], only={name}, parent=self.gui)
+            worker.result_ready.connect(partial(self.live_check_finished, worker, name))
+            worker.lines_ready.connect(partial(self.live_lines_ready, worker))
+            worker.finished.connect(partial(self.live_check_done, worker))
+            worker.start()
+        except Exception:
+            shutil.rmtree(td, ignore_errors=True)
+            import traceback
+            traceback.print_exc()
+            return
+        self.live_model = self.model
+        self.live_worker = worker
+        self.gui.show_status_message(_('Checking {}...').format(name), 3)
+
+    # Replace the errors of the edited file in the dock
+    def live_check_finished(self, worker, name, result):
+        save_ace_executable()
+        if worker is not self.live_worker or self.model is not self.live_model:
+            return
+        if result.traceback is not None:
+            error_dialog(self.gui, _('Unhandled exception'),
+                         _('An unexpected error occurred. Click \'Show details\' for more info.'),
+                         det_msg=result.traceback, show=True)
+            return
+        if result.earl_outcome is None:
+            self.gui.show_status_message(_('ACE could not check {}.').format(name), 5)
+            return
+        self.live_start = self.model.replace_files(self.file_names_of(name), result.error_messages)
+        self.error_messages = self.model.error_messages
+        self.refresh_dock()
+        self.gui.show_status_message(_('{0}: {1} errors.').format(name, len(result.error_messages)), 5)
+
+    # Release the worker, once its results have been shown
+    def live_check_done(self, worker):
+        if worker is self.live_worker:
+            self.live_worker = None
+        worker.deleteLater()
+
+    # File names of the dock's errors for a container name
+    def file_names_of(self, name):
+        container = self.current_container
+        return [file_name for file_name in self.model.error_messages.files.strings
+                if container.href_to_name(file_name, container.opf_name) == name]
+
+    # Line numbers of the errors of the edited file
+    def live_lines_ready(self, worker, lines, digests):
+        if worker is not self.live_worker or self.model is not self.live_model:
+            return
+        self.line_digests.update(digests)
+        all_lines = dict(self.model.lines)
+        all_lines.update((self.live_start + row, line) for row, line in lines.items())
+        self.model.set_lines(all_lines)
+
+    # Changes since the last check, posted by the worker once the results are shown
+    def history_ready(self, diff):
+        from datetime import datetime
+        when = datetime.fromtimestamp(diff.previous_timestamp).strftime('%Y-%m-%d %H:%M')
+        self.resolved = diff.resolved
+        if self.dock_worker is not self.worker:
+            # No errors now, so there is no dock
+            if diff.resolved:
+                self.status_note = _('{0} errors fixed since the last check ({1}).').format(len(diff.resolved), when)
+                self.gui.show_status_message(self.status_note, 10)
+            return
+        self.model.set_new(diff.new)
+        self.history_label.setText(_('Since the last check ({0}): {1} new errors, '
+                                     '<a href="resolved">{2} fixed</a>.').format(when, len(diff.new),
+                                                                             len(diff.resolved)))
+        self.history_label.setVisible(True)
+
+    # List the errors of the last check that were fixed
+    def show_resolved(self):
+        from calibre_plugins.ACE.results import SEVERITY_RANK
+        d = QDialog(self.gui)
+        d.setWindowTitle(_('ACE: fixed errors'))
+        d.resize(700, 400)
+        layout = QVBoxLayout(d)
+        tree = QTreeWidget(d)
+        tree.setRootIsDecorated(False)
+        tree.setHeaderLabels([_('File'), _('Severity'), _('Error message')])
+        for error_message, error_level, file_name, epubcfi in self.resolved:
+            item = QTreeWidgetItem([os.path.split(file_name)[1], self.model.severity_labels.get(
+                error_level, self.model.severity_labels['minor']), error_message])
+            item.setToolTip(2, error_message)
+            tree.addTopLevelItem(item)
+        tree.resizeColumnToContents(0)
+        tree.resizeColumnToContents(1)
+        layout.addWidget(tree)
+        buttons = QDialogButtonBox(QDialogButtonBox.Close)
+        buttons.rejected.connect(d.reject)
+        layout.addWidget(buttons)
+        d.exec_()
+
+    # Double-click copies to clipboard
+    def msg_to_clipboard(self, index):
+        m_index, msg, sev, f_name, epub_cfi = self.model.error_at(index.row())
+        model = self.model
+        item_content = _('File') + ': ' + os.path.split(f_name)[1] + '\n' + \
+                       _('Severity') + ': ' + model.data(model.index(index.row(), model.SEVERITY)) + '\n' + \
+                       _('Error message') + ': ' + msg
+        QApplication.clipboard().setText(item_content)
+
+    # Create an empty ACE dock
+    # A pre-check dock says that its results are not ACE's (see run_precheck).
+    def create_dock(self, epub_name_to_href, close_docks, precheck=False):
+        # Remove existing Ace/EpubCheck docks and close Check Ebook dock
+        for widget in self.gui.children():
+            if isinstance(widget, QDockWidget) and widget.objectName() == 'ace-dock':
+                widget.setParent(None)
+            if close_docks:
+                if isinstance(widget, QDockWidget) and widget.objectName() \
+                        in ('check-book-dock', 'epubcheck-dock'):
+                    widget.close()
+
+        self.dock_name_to_href = epub_name_to_href
+        self.dock_worker = None if precheck else self.worker
+        self.dock_precheck = precheck
+        self.line_digests = {}
+        from calibre_plugins.ACE.navigation import TreeCache
+        self.tree_cache = TreeCache()
+
+        # Define dock widget layout
+        try:
+            is_dark_theme = QApplication.instance().is_dark_theme
+        except:
+            is_dark_theme = False
+        from calibre_plugins.ACE.results import ResultsModel, FilterBar, SummaryView
+        model = self.model = ResultsModel(is_dark_theme)
+        self.error_messages = model.error_messages
+        tree = self.tree = QTreeView()
+        tree.setRootIsDecorated(False)
+        tree.setUniformRowHeights(True)
+        tree.setModel(model)
+        # Changes since the last check (see history_ready)
+        label = self.history_label = QLabel()
+        label.setVisible(precheck)
+        if precheck:
+            label.setText(_('Pre-check of the most common rules only. Run ACE for the full report.'))
+        label.linkActivated.connect(self.show_resolved)
+        container = QWidget()
+        self.filter_bar = FilterBar(model, container)
+        layout = QVBoxLayout(container)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(label)
+        layout.addWidget(self.filter_bar)
+        layout.addWidget(tree)
+        # Counts of the errors, so the html report is rarely needed
+        summary = QWidget()
+        self.summary_view = SummaryView(model, summary)
+        self.summary_view.itemActivated.connect(self.show_summary_item)
+        summary_layout = QVBoxLayout(summary)
+        summary_layout.setContentsMargins(0, 0, 0, 0)
+        summary_layout.addWidget(self.summary_view)
+        if not precheck:
+            report_button = QPushButton(_('Open the html report'), summary)
+            report_button.setToolTip(_('Show the full ACE report on your default browser'))
+            report_button.clicked.connect(self.open_last_report)
+            summary_layout.addWidget(report_button)
+        tabs = self.dock_tabs = QTabWidget()
+        tabs.addTab(container, _('Errors'))
+        tabs.addTab(summary, _('Summary'))
+        dock_widget = QDockWidget(self.gui)
+        dock_widget.setAllowedAreas(Qt.LeftDockWidgetArea | Qt.RightDockWidgetArea |
+                                    Qt.BottomDockWidgetArea | Qt.TopDockWidgetArea)
+        dock_widget.setObjectName('ace-dock')
+        dock_widget.setWindowTitle(_('ACE pre-check') if precheck else 'ACE, by Daisy')
+        dock_widget.setWidget(tabs)
+
+        tree.clicked.connect(self.go_to_line)
+        tree.doubleClicked.connect(self.msg_to_clipboard)
+
+        # Add dock widget to the dock
+        self.gui.addDockWidget(Qt.TopDockWidgetArea, dock_widget)
+
+    # Update the filters and the summary after the results changed
+    def refresh_dock(self):
+        self.filter_bar.refresh()
+        self.summary_view.refresh()
+
+    # Show the errors of a line of the summary
+    def show_summary_item(self, item):
+        filters = self.summary_view.filters_of(item)
+        if filters is not None:
+            self.filter_bar.show_only(*filters)
+            self.dock_tabs.setCurrentIndex(0)
+
+    def open_last_report(self):
+        if self.last_report is None or not os.path.exists(self.last_report):
+            self.gui.show_status_message(_('The html report is not ready yet.'), 3)
+            return
+        self.open_report(self.last_report)
+
+    # Add error messages to the dock
+    def add_results(self, error_messages):
+        self.model.append(error_messages)
+
+    # Sort the results once they are all in the dock
+    def finish_dock(self):
+        tree = self.tree
+        self.refresh_dock()
+
+        # Auto adjust column sizes
+        tree.resizeColumnToContents(self.model.FILE)
+        tree.resizeColumnToContents(self.model.LINE)
+
+        # Enable sorting, starting in report order
+        tree.header().setSortIndicator(-1, Qt.AscendingOrder)
+        tree.setSortingEnabled(True)
+
+        # Check the edited file again when it changes, if enabled
+        self.start_live_check()
@@ -18,5 +18,6 @@ if __name__ == "__main__":
     # from calibre-plugin dir. 'a' for append
     files = ['images', 'translations']
     files.extend(glob('*.py'))
+    files.extend(glob('*.js'))
     files.extend(glob('plugin-import-name-*.txt'))
     createZipFile(filename, "w", files, exclude=exclude)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Standard libraries
+import hashlib
+from collections import OrderedDict
+
+
+# Parse the CFI reference
+# ids is an optional id -> element index of root (see id_index),
+# used instead of searching the tree for each id step.
+def decode_cfi(root, cfi, ids=None):
+    from lxml.etree import XPathEvalError
+    from calibre.ebooks.epub.cfi.parse import parser, get_steps
+    p = parser()
+    try:
+        pcfi = p.parse_path(cfi)[0]
+    except Exception:
+        import traceback
+        traceback.print_exc()
+        return
+    if not pcfi:
+        import sys
+        try:
+            print('Failed to parse CFI: %r' % pcfi, file=sys.stderr)
+        except:
+            print('Failed to parse CFI')
+        return
+    steps = get_steps(pcfi)
+    ans = root
+    for step in steps:
+        num = step.get('num', 0)
+        node_id = step.get('id')
+        if ids is not None:
+            match = ids.get(node_id)
+            match = (match,) if match is not None and is_descendant(match, ans) else ()
+        else:
+            try:
+                match = ans.xpath('descendant::*[@id="%s"]' % node_id)
+            except XPathEvalError:
+                match = ()
+        if match:
+            ans = match[0]
+            continue
+        index = 0
+        for child in ans.iterchildren('*'):
+            index |= 1  # increment index by 1 if it is even
+            index += 1
+            if index == num:
+                ans = child
+                break
+        else:
+            return
+    return ans
+
+
+def is_descendant(node, ancestor):
+    node = node.getparent()
+    while node is not None:
+        if node is ancestor:
+            return True
+        node = node.getparent()
+    return False
+
+
+# Map ids to elements, the first one in document order wins
+def id_index(root):
+    ids = {}
+    for node in root.xpath('//*[@id]'):
+        ids.setdefault(node.get('id'), node)
+    return ids
+
+
+# Used to know if a file was edited since its line numbers were resolved
+def text_digest(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+# Resolve the CFI of every error to a line number, one file at a time
+# Returns a msg_index -> line number map, and a name -> text_digest map of the
+# files it was resolved on.
+def resolve_lines(container, error_messages):
+    from calibre.ebooks.oeb.base import OEB_DOCS
+    by_file = OrderedDict()
+    for msg_index, message, error_level, file_name, epubcfi in error_messages:
+        by_file.setdefault(file_name, []).append((msg_index, epubcfi))
+    lines = {}
+    digests = {}
+    for file_name, rows in by_file.items():
+        name = container.href_to_name(file_name, container.opf_name)
+        if container.mime_map.get(name) not in OEB_DOCS:
+            continue
+        raw_data = container.raw_data(name)
+        digests[name] = text_digest(raw_data)
+        root = parse_with_line_numbers(raw_data)
+        ids = id_index(root)
+        for msg_index, epubcfi in rows:
+            node = decode_cfi(root, epubcfi, ids)
+            if node is not None and node.get('data-lnum'):
+                lines[msg_index] = int(node.get('data-lnum'))
+    return lines, digests
+
+
+# Parse html with line numbers (as data-lnum attributes)
+def parse_with_line_numbers(raw_data):
+    from calibre.ebooks.oeb.polish.parsing import parse
+    return parse(raw_data, decoder=lambda x: x.decode('utf-8'),
+                 line_numbers=True, linenumber_attribute='data-lnum')
+
+
+# Line numbered trees of the files open in the editor
+# A tree is reused for as long as the text it was parsed from doesn't change,
+# so jumping between errors of the same file doesn't parse it again.
+class TreeCache(object):
+
+    def __init__(self, max_size=8):
+        self.max_size = max_size
+        self.trees = OrderedDict()
+
+    def get(self, name, raw_data):
+        entry = self.trees.pop(name, None)
+        if entry is None or entry[0] != raw_data:
+            entry = (raw_data, parse_with_line_numbers(raw_data))
+        self.trees[name] = entry
+        while len(self.trees) > self.max_size:
+            self.trees.popitem(last=False)
+        return entry[1]
+
+    def clear(self):
+        self.trees.clear()
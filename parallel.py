@@ -0,0 +1,133 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Standard libraries
+import os
+import os.path
+import shutil
+import threading
+import multiprocessing
+
+# Plugin libraries
+from calibre_plugins.ACE.runner import AceResult, check_epub, write_book
+from calibre_plugins.ACE.store import ResultStore
+from calibre_plugins.ACE import incremental
+from calibre_plugins.ACE.timing import timed
+
+# Each ACE process starts a browser: smaller parts don't pay it back
+MIN_DOCUMENTS_PER_PART = 50
+MAX_AUTO_PARTS = 4
+
+
+# Get the number of parts to check a book in, 1 if it is not worth splitting
+# parts is the user setting: 0 means one part per CPU, up to MAX_AUTO_PARTS.
+def part_count(container, parts=0):
+    if parts <= 0:
+        try:
+            parts = min(multiprocessing.cpu_count(), MAX_AUTO_PARTS)
+        except NotImplementedError:
+            parts = 1
+    return max(1, min(parts, len(incremental.spine_names(container)) // MIN_DOCUMENTS_PER_PART))
+
+
+# Split the spine in count consecutive runs of documents of similar size
+def split_spine(names, count):
+    size, extra = divmod(len(names), count)
+    chunks = []
+    start = 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(names[start:end])
+        start = end
+    return chunks
+
+
+# Check a book as count partial books, each with a part of the spine, at the same time
+# Every part has the OPF metadata and all the resources of the book, so
+# package level assertions are reported by every part: they are kept once.
+# The report of the first part is written to report_folder and the reports
+# of the others to its 'part-N' sub folders.
+def check_parallel(container, temp_dir, report_folder, user_lang, split_lines, count, unpacked=False,
+                   on_start=None, details=None, timer=None):
+    from calibre.ebooks.oeb.polish.container import clone_container
+    spine = incremental.spine_names(container)
+    chunks = split_spine(spine, count)
+
+    # Write the partial books
+    epubs = []
+    with timed(timer, 'write'):
+        for i, chunk in enumerate(chunks):
+            part_dir = os.path.join(temp_dir, 'part-%d' % (i + 1))
+            os.mkdir(part_dir)
+            part = clone_container(container, os.path.join(part_dir, 'container'))
+            # Only the OPF of the clone changes: write_book writes it to part_dir, never to the book
+            incremental.restrict_spine(part, set(chunk))
+            epubs.append((write_book(part, part_dir, unpacked), os.path.join(part_dir, 'report')))
+
+    results = [None] * len(epubs)
+
+    def check(i):
+        epub_path, part_report = epubs[i]
+        result = AceResult(part_report)
+        try:
+            result = check_epub(epub_path, part_report, user_lang, split_lines, on_start=on_start,
+                                details=details)
+        except Exception:
+            import traceback
+            result.traceback = traceback.format_exc()
+        results[i] = result
+
+    threads = [threading.Thread(target=check, args=(i,), name='ACE part check') for i in range(len(epubs))]
+    # Parsing is done by the threads too, so it is timed with ACE
+    with timed(timer, 'ace'):
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    result = AceResult(report_folder)
+    result.return_code = max(part.return_code or 0 for part in results)
+    for i, part in enumerate(results):
+        header = '--- %d/%d ---\n' % (i + 1, len(results))
+        result.stdout += header + part.stdout
+        result.stderr += header + part.stderr + (part.traceback or '')
+    failed = [part for part in results if part.traceback is not None or part.return_code == 1 or
+              not part.has_report]
+    if failed:
+        result.traceback = failed[0].traceback
+        result.return_code = 1
+        return result
+
+    # Move the reports next to each other
+    if os.path.exists(report_folder):
+        shutil.rmtree(report_folder)
+    shutil.move(results[0].report_folder, report_folder)
+    for i, part in enumerate(results[1:], 2):
+        shutil.move(part.report_folder, os.path.join(report_folder, 'part-%d' % i))
+
+    # Merge the assertions: documents come from the part that checked them
+    assertions = {}
+    spine_set = set(spine)
+    for chunk, part in zip(chunks, results):
+        chunk = set(chunk)
+        for name, items in incremental.group_by_file(container, part.error_messages).items():
+            if name in chunk:
+                assertions[name] = items
+            elif name not in spine_set:
+                if name in assertions:
+                    reported = set(assertions[name])
+                    assertions[name].extend(item for item in items if item not in reported)
+                else:
+                    assertions[name] = items
+    result.error_messages = incremental.flatten(container, assertions)
+    result.earl_outcome = 'fail' if any(part.earl_outcome == 'fail' for part in results) else 'pass'
+    if result.earl_outcome != 'fail':
+        result.error_messages = ResultStore()
+    return result
@@ -0,0 +1,102 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Quick check of the rules that fail most often, without ACE
+# ACE needs Node.js and a browser, so even a small book takes a while. These
+# rules only need the parsed files of the container, so they are checked in
+# a fraction of a second. The rule ids and severities are ACE's, but ACE's
+# report is the reference: it checks many more rules, on the rendered pages.
+
+# Calibre libraries
+from calibre.ebooks.oeb.base import EPUB_NS, OEB_DOCS, XHTML_NS, XML_NS
+
+# Plugin libraries
+from calibre_plugins.ACE.incremental import spine_names
+from calibre_plugins.ACE.report import getrole, role_message
+from calibre_plugins.ACE.store import ResultStore
+
+# Load translation files (.mo) on the folder 'translations'
+load_translations()
+
+IMG = '{%s}img' % XHTML_NS
+EPUB_TYPE = '{%s}type' % EPUB_NS
+XML_LANG = '{%s}lang' % XML_NS
+# Other ways of giving an image its text, accepted by axe instead of alt
+LABEL_ATTRIBUTES = ('aria-label', 'aria-labelledby', 'title')
+
+# Accessibility metadata of the OPF, and the severity ACE gives when it is missing
+ACCESSIBILITY_METADATA = (
+    ('schema:accessMode', 'serious'), ('schema:accessibilityFeature', 'serious'),
+    ('schema:accessibilityHazard', 'serious'), ('schema:accessibilitySummary', 'serious'),
+    ('schema:accessModeSufficient', 'moderate'),
+)
+
+
+# Partial CFI of an element, like the ones in ACE's report
+# The root element has no steps: like for the OPF, the first child is used.
+def element_cfi(root, node):
+    steps = []
+    while node is not root:
+        parent = node.getparent()
+        for index, child in enumerate(parent.iterchildren('*'), 1):
+            if child is node:
+                break
+        node_id = node.get('id')
+        steps.append('/%d[%s]' % (index * 2, node_id) if node_id else '/%d' % (index * 2))
+        node = parent
+    return ''.join(reversed(steps)) or '/2'
+
+
+# Get the (error_message, error_level, epubcfi, rule) assertions of a content document
+def check_document(root):
+    assertions = []
+    if not root.get('lang') and not root.get(XML_LANG):
+        assertions.append((_('<html> element must have a lang attribute'), 'serious', '/2', 'html-has-lang'))
+    for node in root.iter('*'):
+        if node.tag == IMG and node.get('alt') is None and node.get('role') not in ('presentation', 'none') \
+                and not any(node.get(name) for name in LABEL_ATTRIBUTES):
+            assertions.append((_('Images must have alternate text'), 'critical', element_cfi(root, node),
+                               'image-alt'))
+        epub_type = node.get(EPUB_TYPE)
+        if epub_type:
+            roles = [getrole(epub_type_item) for epub_type_item in epub_type.split()]
+            if any(roles) and not set(roles) & set((node.get('role') or '').split()):
+                error_message = _('Element has no ARIA role matching its epub:type') + role_message(roles)
+                assertions.append((error_message, 'minor', element_cfi(root, node), 'epub-type-has-matching-role'))
+    return assertions
+
+
+# Get the assertions of the OPF (see check_document)
+def check_package(container):
+    declared = set(container.opf_xpath('//opf:metadata/opf:meta/@property'))
+    declared.update(container.opf_xpath('//opf:metadata/opf:meta/@name'))
+    return [(_('Publication must declare the \'{}\' metadata').format(name), error_level, '/2',
+             'metadata-' + name.split(':')[1].lower())
+            for name, error_level in ACCESSIBILITY_METADATA if name not in declared]
+
+
+# Check the content documents named (all of them by default) and, if all
+# are checked, the OPF. The editors must be saved to the container first.
+# Returns a ResultStore of (msg_index, error_message, error_level, file_name, epubcfi)
+# rows, with their rules, like parse_report: the OPF first, then the documents in spine order.
+def precheck(container, names=None):
+    error_messages = ResultStore()
+
+    def add(name, assertions):
+        file_name = container.name_to_href(name, container.opf_name)
+        for error_message, error_level, epubcfi, rule in assertions:
+            error_messages.append((len(error_messages), error_message, error_level, file_name, epubcfi), rule)
+
+    if names is None:
+        add(container.opf_name, check_package(container))
+    for name in spine_names(container):
+        if (names is None or name in names) and container.mime_map.get(name) in OEB_DOCS:
+            add(name, check_document(container.parsed(name)))
+    return error_messages
@@ -0,0 +1,100 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Preferences of the plugin
+# This module is imported when calibre starts, to set up the toolbar and
+# menus, so it only loads the preferences: the settings dialog is in
+# config.py, and the rest of the plugin is loaded on first use.
+
+# Standard libraries
+from datetime import datetime, timedelta
+
+# Calibre libraries
+from calibre.utils.config import JSONConfig
+from calibre.utils.filenames import expanduser
+
+# Languages of ACE and AXE messages
+ACE_LANGUAGES = ('da', 'de', 'en', 'es', 'fr', 'ja', 'nl', 'pt_BR')
+
+# This is where all preferences for this plugin will be stored.
+plugin_prefs = JSONConfig('plugins/ACE')
+
+# Set default preferences
+plugin_prefs.defaults['report_path'] = expanduser('~')
+plugin_prefs.defaults['open_report'] = True
+plugin_prefs.defaults['debug_mode'] = False
+plugin_prefs.defaults['close_docks'] = True
+# None: the language of the system (see user_language)
+plugin_prefs.defaults['user_lang'] = None
+plugin_prefs.defaults['split_lines'] = True
+plugin_prefs.defaults['engine_mode'] = False
+plugin_prefs.defaults['engine_idle_timeout'] = 10
+plugin_prefs.defaults['incremental_check'] = False
+plugin_prefs.defaults['report_cache'] = True
+plugin_prefs.defaults['cache_size'] = 200
+plugin_prefs.defaults['ace_version'] = None
+plugin_prefs.defaults['latest_ace_version'] = None
+plugin_prefs.defaults['ace_executable'] = None
+plugin_prefs.defaults['performance_log'] = True
+plugin_prefs.defaults['batch_workers'] = 2
+plugin_prefs.defaults['parallel_check'] = False
+plugin_prefs.defaults['parallel_parts'] = 0
+plugin_prefs.defaults['unpacked_check'] = False
+plugin_prefs.defaults['run_history'] = True
+plugin_prefs.defaults['history_runs'] = 20
+plugin_prefs.defaults['live_check'] = False
+plugin_prefs.defaults['live_check_delay'] = 2
+plugin_prefs.defaults['update'] = True
+plugin_prefs.defaults['check_interval'] = 7
+plugin_prefs.defaults['last_time_checked'] = str(datetime.now() - timedelta(days=7))
+
+
+# Get the ACE language for a language or locale name (like 'pt_BR' or 'de_DE')
+# Fallbacks to English if the language is not available.
+def ace_language(lang):
+    if lang in ACE_LANGUAGES:
+        return lang
+    base = (lang or '').replace('-', '_').split('_')[0].lower()
+    for ace_lang in ACE_LANGUAGES:
+        if ace_lang.split('_')[0] == base:
+            return ace_lang
+    return 'en'
+
+
+# Get the ACE language chosen by the user, or the one of the system
+def user_language():
+    lang = plugin_prefs['user_lang']
+    if lang is None:
+        import locale
+        lang = locale.getdefaultlocale()[0]
+    return ace_language(lang)
+
+
+# The toolbar action schedules the update check and shows the update menu
+# item, so these helpers are here and updates.py is only loaded by the check
+def string_to_date(date_string):
+    return datetime.strptime(date_string, '%Y-%m-%d %H:%M:%S.%f')
+
+
+# Check if the update check interval (in days) has elapsed
+def update_due(last_time_checked, check_interval):
+    return (datetime.now() - string_to_date(last_time_checked)).days >= check_interval
+
+
+def version_tuple(version):
+    try:
+        return tuple(int(x) for x in version.split('-')[0].split('.'))
+    except (AttributeError, ValueError):
+        return ()
+
+
+# Tell if an update is available
+def update_available(installed, latest):
+    return installed is not None and latest is not None and version_tuple(latest) > version_tuple(installed)
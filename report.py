@@ -0,0 +1,272 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Standard libraries
+import io
+import re
+import json
+
+try:
+    from html import unescape
+except ImportError:
+    from HTMLParser import HTMLParser
+    unescape = HTMLParser().unescape
+
+# Plugin libraries
+from calibre_plugins.ACE.store import SEVERITIES, ResultStore
+
+# Load translation files (.mo) on the folder 'translations'
+load_translations()
+
+
+# Count the error messages of each severity
+def severity_counts(error_messages):
+    counts = dict.fromkeys(SEVERITIES, 0)
+    for error_msg in error_messages:
+        error_level = error_msg[2]
+        counts[error_level if error_level in counts else 'minor'] += 1
+    return counts
+
+
+# Get equivalent ARIA role
+EPUB_TYPE_ROLES = {
+    'figure': 'figure', 'glossterm': 'term', 'glossdef': 'definition', 'landmarks': 'directory',
+    'list': 'list', 'list-item': 'listitem', 'page-list': 'doc-pagelist', 'referrer': 'doc-backlink',
+    'table': 'table', 'table-row': 'row', 'table-cell': 'cell',
+}
+EPUB_TYPE_ROLES.update((epub_type, 'doc-' + epub_type) for epub_type in [
+    'abstract', 'acknowledgments', 'afterword', 'appendix', 'bibliography', 'biblioref', 'chapter',
+    'colophon', 'conclusion', 'cover', 'credit', 'credits', 'dedication', 'endnotes', 'epigraph',
+    'epilogue', 'errata', 'footnote', 'foreword', 'glossary', 'glossref', 'index', 'introduction',
+    'noteref', 'notice', 'pagebreak', 'part', 'preface', 'prologue', 'pullquote', 'qna', 'backlink',
+    'subtitle', 'tip', 'toc'
+])
+
+
+def getrole(epub_type):
+    return EPUB_TYPE_ROLES.get(epub_type)
+
+
+# Get the text suggesting the ARIA roles of an epub:type, or '' if there are none
+def role_message(roles):
+    roles = [role for role in roles if role is not None]
+    if not roles:
+        return ''
+    multiple_roles_msg = _(' (you must use only one role)') if len(roles) > 1 else ''
+    return '.' + _(' Matching ARIA role: ') + ', '.join(roles) + multiple_roles_msg + '.'
+
+
+# Only the first start tag of a snippet is parsed
+first_tag_re = re.compile(r"""\s*<[^\s/>!?]+((?:\s+[^\s=/>]+(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s"'>][^\s>]*))?)*)\s*/?>""")
+attribute_re = re.compile(r"""([^\s=/>]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s"'>][^\s>]*))?""")
+
+
+# Get the attributes of the first tag of a html snippet
+# Names are lowercased and, like HTML parsers do, the first of
+# duplicated attributes wins.
+def first_tag_attributes(snippet):
+    m = first_tag_re.match(snippet)
+    if m is None:
+        return {}
+    attrs = {}
+    for name, value in attribute_re.findall(m.group(1)):
+        name = name.lower()
+        if name in attrs:
+            continue
+        if value[:1] in ('"', "'"):
+            value = value[1:-1]
+        attrs[name] = unescape(value) if '&' in value else value
+    return attrs
+
+
+# Get the recommended ARIA roles for the first tag of a html snippet
+def snippet_roles(snippet):
+    epub_type = first_tag_attributes(snippet).get('epub:type')
+    if epub_type is None:
+        return []
+    return [getrole(epub_type_item) for epub_type_item in epub_type.split()]
+
+
+# Incremental reader for ACE's report.json
+# Walks the top level object of the report without building it: large
+# sections like 'data' and 'outlines' are skipped, and the documents in
+# 'assertions' are decoded one at a time, so memory use is bounded by
+# the largest document instead of the whole report.
+class ReportReader(object):
+
+    chunk_size = 1024 * 1024
+    skip_re = re.compile(r'["\[\]{}]')
+    string_re = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+    ws_re = re.compile(r'\s*')
+
+    def __init__(self, file):
+        self.file = file
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        self.earl_outcome = None
+
+    # Read more data, dropping what was already consumed
+    def fill(self, size=None):
+        data = self.file.read(max(size or 0, self.chunk_size))
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = self.ws_re.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                raise ValueError('Unexpected end of report')
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('Expected %r at offset %d of the buffer' % (char, self.pos))
+        self.pos += 1
+
+    # Decode the next value
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                value = end = None
+            # A value ending with the buffer may be truncated
+            if end is not None and (end < len(self.buf) or self.eof):
+                self.pos = end
+                return value
+            if not self.fill(len(self.buf)) and end is None:
+                raise ValueError('Invalid report')
+
+    # Skip the next value without decoding it
+    def skip_value(self):
+        if self.peek() not in '[{':
+            self.read_value()
+            return
+        depth = 0
+        while True:
+            m = self.skip_re.search(self.buf, self.pos)
+            if m is None:
+                self.pos = len(self.buf)
+                if not self.fill():
+                    raise ValueError('Unexpected end of report')
+                continue
+            char = m.group()
+            if char == '"':
+                s = self.string_re.match(self.buf, m.start())
+                if s is None or s.end() == len(self.buf):
+                    # Unterminated string, read more
+                    self.pos = m.start()
+                    if not self.fill(len(self.buf)):
+                        raise ValueError('Unexpected end of report')
+                    continue
+                self.pos = s.end()
+                continue
+            self.pos = m.end()
+            depth += 1 if char in '[{' else -1
+            if depth == 0:
+                return
+
+    # Yield each document of the 'assertions' array
+    def iter_documents(self):
+        self.expect('{')
+        if self.peek() == '}':
+            return
+        while True:
+            key = self.read_value()
+            self.expect(':')
+            if key == 'assertions':
+                self.expect('[')
+                if self.peek() != ']':
+                    while True:
+                        yield self.read_value()
+                        if self.peek() != ',':
+                            break
+                        self.pos += 1
+                self.expect(']')
+            elif key == 'earl:result':
+                self.earl_outcome = self.read_value()['earl:outcome']
+            else:
+                self.skip_value()
+            if self.peek() != ',':
+                break
+            self.pos += 1
+        self.expect('}')
+
+    # Yield compact (file_name, description, impact, title, epubcfi, snippet) records
+    def iter_assertions(self):
+        for assertion in self.iter_documents():
+            # Get file name
+            file_name = assertion['earl:testSubject']['url']
+            for earl_assertion in assertion['assertions']:
+                earl_result = earl_assertion['earl:result']
+                # Get epubcfi
+                if 'earl:pointer' in earl_result:
+                    epubcfi = earl_result['earl:pointer']['cfi'][0]
+                else:
+                    # ACE doesn't report line numbers for non-HTML files
+                    epubcfi = '/2'
+                yield (file_name, earl_result['dct:description'], earl_assertion['earl:test']['earl:impact'],
+                       earl_assertion['earl:test']['dct:title'], epubcfi, earl_result.get('html'))
+
+
+# Parse ACE's report.json
+# Returns the EARL outcome ('pass' or 'fail') and a ResultStore of
+# (msg_index, error_message, error_level, file_name, epubcfi) rows, with their rules.
+# If on_rows is given, it is called with each batch of parsed rows
+# while the rest of the report is still being read.
+# If details is a dict, it maps (error_message, error_level, file_name, epubcfi)
+# to the (rule_id, snippet) of the assertion.
+def parse_report(json_file_name, split_lines, on_rows=None, batch_size=500, details=None):
+    error_messages = ResultStore()
+    batch_start = 0
+    with io.open(json_file_name, 'r', encoding='utf-8') as file:
+        reader = ReportReader(file)
+        for file_name, description, error_level, error_id, epubcfi, snippet in reader.iter_assertions():
+
+            # Get error message
+            if split_lines:
+                error_message = description
+            else:
+                error_message = (description + '.').replace('\n', '. ').strip()
+
+            # Get html (snippet) and recommended ARIA role
+            roles = []
+            if snippet is not None:
+                roles = snippet_roles(snippet)
+
+            # Add suggested role:
+            if error_id == 'epub-type-has-matching-role':
+                error_message += role_message(roles)
+
+            if details is not None:
+                details[(error_message, error_level, file_name, epubcfi)] = (error_id, snippet)
+
+            # Save error information in a list
+            # Message index to help sorting
+            error_messages.append((len(error_messages), error_message, error_level, file_name, epubcfi), error_id)
+
+            if on_rows is not None and len(error_messages) - batch_start >= batch_size:
+                on_rows(error_messages[batch_start:])
+                batch_start = len(error_messages)
+
+    earl_outcome = reader.earl_outcome
+    if earl_outcome != 'fail':
+        return earl_outcome, ResultStore()
+    if on_rows is not None and len(error_messages) > batch_start:
+        on_rows(error_messages[batch_start:])
+    return earl_outcome, error_messages
@@ -0,0 +1,400 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Standard libraries
+import os.path
+
+# PyQt libraries
+try:
+    from qt.core import (Qt, QAbstractTableModel, QModelIndex, QBrush, QColor, QFont, QWidget, QHBoxLayout,
+                         QComboBox, QLineEdit, QLabel, QTreeWidget, QTreeWidgetItem)
+except ImportError:
+    from PyQt5.Qt import (Qt, QAbstractTableModel, QModelIndex, QBrush, QColor, QFont, QWidget, QHBoxLayout,
+                          QComboBox, QLineEdit, QLabel, QTreeWidget, QTreeWidgetItem)
+
+# Plugin libraries
+from calibre_plugins.ACE.store import SEVERITIES, ResultIndex, ResultStore
+
+# Load translation files (.mo) on the folder 'translations'
+load_translations()
+
+SEVERITY_RANK = dict((level, rank) for rank, level in enumerate(SEVERITIES))
+NO_FILTER = (None, None, None, '')
+# Rule filter of the errors without a rule (None in the store, which means any rule for set_filter)
+UNKNOWN_RULE = ''
+SEVERITY_COLORS = {
+    'critical': (255, 190, 190), 'serious': (255, 220, 224), 'moderate': (255, 255, 230), 'minor': (200, 255, 240),
+}
+
+
+# Table model over the parsed error messages for the ACE dock
+# Rows are kept in report order, in a ResultStore; sorting only reorders a
+# list of row numbers, using sort keys read from the store's columns.
+# Filtering (see set_filter) looks the rows up in a ResultIndex, and only
+# the matching ones are sorted and shown.
+class ResultsModel(QAbstractTableModel):
+
+    FILE, LINE, SEVERITY, MESSAGE = range(4)
+
+    def __init__(self, is_dark_theme=False, parent=None):
+        QAbstractTableModel.__init__(self, parent)
+        self.headers = [_('File'), _('Line'), _('Severity'), _('Error message')]
+        self.tooltips = [_('Sort by Filename'), _('Sort by position in the book'),
+                         _('Sort by Severity'), _('Sort by Error Message')]
+        self.severity_labels = {
+            'critical': _('Critical'), 'serious': _('Serious'), 'moderate': _('Moderate'), 'minor': _('Minor'),
+        }
+        self.backgrounds = dict((level, QBrush(QColor(*color))) for level, color in SEVERITY_COLORS.items())
+        self.foreground = QBrush(QColor('black')) if is_dark_theme else None
+        self.new_font = QFont()
+        self.new_font.setBold(True)
+
+        # (msg_index, error_message, error_level, file_name, epubcfi), in report order
+        self.error_messages = ResultStore()
+        # File id (see ResultStore.files) -> file name without folders
+        self.file_names = []
+        self.lines = {}
+        # msg_index of the errors not found in the last check (see history.py)
+        self.new = set()
+        # Display row -> row in error_messages
+        self.order = []
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+        # Column -> sort keys, and the (sort_column, sort_order, rows) of all
+        # rows sorted, until the rows or lines change
+        self.keys = {}
+        self.all_sorted = None
+        # (rank, file_name, rule, text) of set_filter, and the index it uses
+        self.filters = NO_FILTER
+        self.row_index = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation != Qt.Horizontal:
+            return None
+        if role == Qt.DisplayRole:
+            return self.headers[section]
+        if role == Qt.ToolTipRole:
+            return self.tooltips[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.order[index.row()]
+        store = self.error_messages
+        if role == Qt.DisplayRole:
+            column = index.column()
+            if column == self.FILE:
+                return self.file_names[store.file_ids[row]]
+            if column == self.LINE:
+                return self.lines.get(row)
+            if column == self.SEVERITY:
+                return self.severity_labels[SEVERITIES[store.rank(row)]]
+            return store.messages.strings[store.message_ids[row]]
+        if role == Qt.BackgroundRole:
+            return self.backgrounds[SEVERITIES[store.rank(row)]]
+        if role == Qt.ForegroundRole:
+            return self.foreground
+        if role == Qt.FontRole and row in self.new:
+            return self.new_font
+        if role == Qt.ToolTipRole and index.column() == self.MESSAGE:
+            message = store.messages.strings[store.message_ids[row]]
+            if row in self.new:
+                return message + '\n\n' + _('New since the last check')
+            return message
+        return None
+
+    # Get the (msg_index, error_message, error_level, file_name, epubcfi) tuple of a display row
+    def error_at(self, row):
+        return self.error_messages[self.order[row]]
+
+    # Get the rule (ACE's error id) of a display row, or None if unknown
+    def rule_at(self, row):
+        return self.error_messages.rule(self.order[row])
+
+    def append(self, error_messages):
+        if not error_messages:
+            return
+        store = self.error_messages
+        first = len(store)
+        self.keys = {}
+        self.all_sorted = None
+        self.row_index = None
+        if self.filters != NO_FILTER:
+            # Only the new rows that match are shown
+            self.beginResetModel()
+            store.extend(error_messages)
+            self.update_file_names()
+            self.show_rows(self.filtered_rows())
+            self.endResetModel()
+            return
+        self.beginInsertRows(QModelIndex(), len(self.order), len(self.order) + len(error_messages) - 1)
+        store.extend(error_messages)
+        self.update_file_names()
+        self.order.extend(range(first, len(store)))
+        self.endInsertRows()
+
+    def update_file_names(self):
+        for file_name in self.error_messages.files.strings[len(self.file_names):]:
+            self.file_names.append(os.path.split(file_name)[1])
+
+    # Replace the rows of some files with the rows of a new check of them
+    # The new rows take the place of the first old one (or go last if the
+    # files had none), and the rows after them are renumbered, with their
+    # lines and highlights. Returns the row of the first new row.
+    def replace_files(self, file_names, error_messages):
+        store = self.error_messages
+        file_ids = set(store.files.ids[name] for name in file_names if name in store.files.ids)
+        old = [row for row, file_id in enumerate(store.file_ids) if file_id in file_ids]
+        start = old[0] if old else len(store)
+        if not old or old[-1] - start + 1 == len(old):
+            rest = range(start + len(old), len(store))
+            after = store[start + len(old):]
+        else:
+            rest = [row for row in range(start, len(store)) if store.file_ids[row] not in file_ids]
+            after = ResultStore()
+            for row in rest:
+                after.append(store.row(row), store.rule(row))
+        moved = dict((row, start + len(error_messages) + i) for i, row in enumerate(rest))
+        moved.update((row, row) for row in range(start))
+
+        self.beginResetModel()
+        new_store = store[:start]
+        new_store.extend(error_messages)
+        new_store.extend(after)
+        self.error_messages = new_store
+        self.file_names = []
+        self.update_file_names()
+        self.lines = dict((moved[row], line) for row, line in self.lines.items() if row in moved)
+        self.new = set(moved[row] for row in self.new if row in moved)
+        self.keys = {}
+        self.all_sorted = None
+        self.row_index = None
+        self.show_rows(self.filtered_rows())
+        self.endResetModel()
+        return start
+
+    # Show only the rows of a severity rank, file name and rule, and with
+    # messages having words that start with the words of text. None (or
+    # '' for the text) shows the rows of any, and UNKNOWN_RULE the rows
+    # without a rule. The index is built on first use.
+    def set_filter(self, rank=None, file_name=None, rule=None, text=''):
+        self.filters = (rank, file_name, rule, text)
+        self.beginResetModel()
+        self.show_rows(self.filtered_rows())
+        self.endResetModel()
+
+    # Rows matching the filters, or None if all rows match
+    def filtered_rows(self):
+        store = self.error_messages
+        if self.filters == NO_FILTER:
+            return None
+        if self.row_index is None:
+            self.row_index = ResultIndex(store)
+        rank, file_name, rule, text = self.filters
+        # Names not in the results match no row
+        file_id = None if file_name is None else store.files.ids.get(file_name, -1)
+        rule_id = None if rule is None else store.rules.ids.get(None if rule == UNKNOWN_RULE else rule, -1)
+        return self.row_index.search(rank, file_id, rule_id, text)
+
+    # Show rows (all rows if None) in the order of the sort column
+    # All rows sorted are kept, as most keystrokes in the filter bar match all.
+    def show_rows(self, rows):
+        if rows is not None:
+            self.order = rows
+            self.sort_rows()
+            return
+        if self.all_sorted is None or self.all_sorted[:2] != (self.sort_column, self.sort_order):
+            self.order = list(range(len(self.error_messages)))
+            self.sort_rows()
+            self.all_sorted = (self.sort_column, self.sort_order, self.order)
+        self.order = list(self.all_sorted[2])
+
+    # Line numbers of the errors, by row (see navigation.resolve_lines)
+    def set_lines(self, lines):
+        self.lines = lines
+        self.keys.pop(self.LINE, None)
+        self.all_sorted = None
+        if self.order:
+            self.dataChanged.emit(self.index(0, self.LINE), self.index(len(self.order) - 1, self.LINE))
+        if self.sort_column == self.LINE:
+            self.sort(self.sort_column, self.sort_order)
+
+    # Highlight the errors not found in the last check
+    def set_new(self, new):
+        self.new = new
+        if self.order:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.order) - 1, len(self.headers) - 1))
+
+    # Sort keys of the rows of a column, or None to keep report order
+    # Files are sorted by name, lines by position in the book (files in
+    # report order), and messages alphabetically.
+    def sort_keys(self, column):
+        store = self.error_messages
+        if column == self.FILE:
+            return [self.file_names[file_id] for file_id in store.file_ids]
+        if column == self.LINE:
+            lines = self.lines
+            if not lines:
+                return store.file_ids
+            return [(file_id << 32) + lines.get(row, 0) for row, file_id in enumerate(store.file_ids)]
+        if column == self.SEVERITY:
+            if len(store.levels) == len(SEVERITIES):
+                return store.level_codes
+            return [store.rank(row) for row in range(len(store))]
+        if column == self.MESSAGE:
+            messages = store.messages.strings
+            return [messages[message_id] for message_id in store.message_ids]
+        return None
+
+    # Put the shown rows in the order of the sort column
+    def sort_rows(self):
+        column = self.sort_column
+        if column not in self.keys:
+            self.keys[column] = self.sort_keys(column)
+        keys = self.keys[column]
+        # Equal keys keep report order
+        self.order.sort()
+        if keys is not None:
+            self.order.sort(key=keys.__getitem__, reverse=self.sort_order == Qt.DescendingOrder)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column, self.sort_order = column, order
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        rows = [self.order[index.row()] for index in persistent]
+        self.sort_rows()
+        if persistent:
+            where = dict((row, i) for i, row in enumerate(self.order))
+            self.changePersistentIndexList(persistent, [self.index(where[row], index.column())
+                                                        for row, index in zip(rows, persistent)])
+        self.layoutChanged.emit()
+
+
+# Filters of the ACE dock: severity, file, rule and words of the messages
+# Every change filters the model right away (see ResultsModel.set_filter).
+class FilterBar(QWidget):
+
+    def __init__(self, model, parent=None):
+        QWidget.__init__(self, parent)
+        self.model = model
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.severity_box = QComboBox(self)
+        self.severity_box.setToolTip(_('Show only the errors of a severity'))
+        self.file_box = QComboBox(self)
+        self.file_box.setToolTip(_('Show only the errors of a file'))
+        self.rule_box = QComboBox(self)
+        self.rule_box.setToolTip(_('Show only the errors of an ACE rule'))
+        self.search_box = QLineEdit(self)
+        self.search_box.setPlaceholderText(_('Search messages'))
+        self.search_box.setToolTip(_('Show only the errors with messages having words that start with these'))
+        self.search_box.setClearButtonEnabled(True)
+        self.count_label = QLabel(self)
+        for box in (self.severity_box, self.file_box, self.rule_box):
+            layout.addWidget(box)
+            box.currentIndexChanged.connect(self.apply)
+        layout.addWidget(self.search_box, 1)
+        layout.addWidget(self.count_label)
+        self.search_box.textChanged.connect(self.apply)
+        self.refresh()
+
+    # Fill the boxes with the files and rules of the results, keeping the choices
+    def refresh(self):
+        store = self.model.error_messages
+        files = sorted(set(store.files.strings), key=lambda file_name: os.path.split(file_name)[1].lower())
+        items = (
+            (self.severity_box, _('All severities'),
+             [(self.model.severity_labels[level], rank) for rank, level in enumerate(SEVERITIES)]),
+            (self.file_box, _('All files'), [(os.path.split(file_name)[1], file_name) for file_name in files]),
+            (self.rule_box, _('All rules'), [(rule, rule) for rule in sorted(filter(None, store.rules.strings))] +
+             ([(_('Unknown rule'), UNKNOWN_RULE)] if None in store.rules.ids else [])),
+        )
+        for box, all_label, choices in items:
+            current = box.currentData()
+            box.blockSignals(True)
+            box.clear()
+            box.addItem(all_label, None)
+            for label, data in choices:
+                box.addItem(label, data)
+            box.setCurrentIndex(max(0, box.findData(current)) if current is not None else 0)
+            box.blockSignals(False)
+        self.apply()
+
+    # Show all the errors of a severity rank, file or rule
+    def show_only(self, rank=None, file_name=None, rule=None):
+        for box, data in ((self.severity_box, rank), (self.file_box, file_name), (self.rule_box, rule)):
+            box.blockSignals(True)
+            box.setCurrentIndex(max(0, box.findData(data)) if data is not None else 0)
+            box.blockSignals(False)
+        self.search_box.blockSignals(True)
+        self.search_box.clear()
+        self.search_box.blockSignals(False)
+        self.apply()
+
+    def apply(self, *args):
+        self.model.set_filter(self.severity_box.currentData(), self.file_box.currentData(),
+                              self.rule_box.currentData(), self.search_box.text())
+        if self.model.filters == NO_FILTER:
+            self.count_label.setText('')
+        else:
+            self.count_label.setText(_('{0} of {1}').format(len(self.model.order), len(self.model.error_messages)))
+
+
+# Number of errors by severity, rule and file, for the summary tab of the dock
+# Items hold the set_filter arguments that show their errors (see filters_of).
+class SummaryView(QTreeWidget):
+
+    def __init__(self, model, parent=None):
+        QTreeWidget.__init__(self, parent)
+        self.model = model
+        self.setHeaderLabels([_('Errors'), _('Count')])
+        self.setToolTip(_('Double-click a line to see its errors'))
+        self.refresh()
+
+    def refresh(self):
+        self.clear()
+        store = self.model.error_messages
+        ranks, files, rules = store.counts()
+        total = QTreeWidgetItem([_('All errors'), str(len(store))])
+        self.addTopLevelItem(total)
+
+        def add_group(title, children):
+            group = QTreeWidgetItem([title, ''])
+            self.addTopLevelItem(group)
+            for label, count, filters, tooltip in children:
+                item = QTreeWidgetItem([label, str(count)])
+                item.setData(0, Qt.UserRole, filters)
+                item.setTextAlignment(1, Qt.AlignRight)
+                if tooltip:
+                    item.setToolTip(0, tooltip)
+                group.addChild(item)
+            group.setExpanded(True)
+
+        add_group(_('Severity'), [(self.model.severity_labels[level], ranks[rank], (rank, None, None), None)
+                                  for rank, level in enumerate(SEVERITIES) if ranks[rank]])
+        # Most frequent first
+        add_group(_('Rule'), [(store.rules.strings[rule_id] or _('Unknown rule'), count,
+                               (None, None, store.rules.strings[rule_id] or UNKNOWN_RULE), None)
+                              for rule_id, count in rules.most_common()])
+        add_group(_('File'), [(os.path.split(store.files.strings[file_id])[1], count,
+                               (None, store.files.strings[file_id], None), store.files.strings[file_id])
+                              for file_id, count in files.most_common()])
+        self.resizeColumnToContents(0)
+
+    # (rank, file_name, rule) of the errors of an item, or None
+    def filters_of(self, item):
+        return item.data(0, Qt.UserRole)
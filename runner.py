@@ -0,0 +1,335 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Standard libraries
+import os
+import os.path
+import shutil
+import tempfile
+import threading
+import traceback
+
+# Calibre libraries
+from calibre.constants import iswindows, islinux
+
+# Plugin libraries
+from calibre_plugins.ACE.prefs import plugin_prefs
+from calibre_plugins.ACE.report import SEVERITIES, parse_report, severity_counts
+from calibre_plugins.ACE.store import ResultStore
+from calibre_plugins.ACE.timing import timed
+
+# Simple wrapper for ACE
+# The on_start keyword argument is called with the process once it is started
+# (so it can be killed, for instance). Commands go through the shell on
+# Windows and macOS, to find npm's shims, unless shell=False is given.
+def ace_wrapper(*args, **kwargs):
+    import subprocess
+    startupinfo = None
+    shell = kwargs.get('shell')
+    if shell is None:
+        shell = not islinux
+    # Stop the windows console popping up every time the program is run
+    if iswindows:
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startupinfo.wShowWindow = subprocess.SW_HIDE
+    process = subprocess.Popen(list(args), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               startupinfo=startupinfo, shell=shell)
+    if kwargs.get('on_start') is not None:
+        kwargs['on_start'](process)
+    ret = process.communicate()
+    return_code = process.returncode
+    return ret, return_code
+
+
+def which(name):
+    try:
+        from shutil import which
+    except ImportError:
+        from distutils.spawn import find_executable as which
+    return which(name)
+
+
+# Get the script of the ACE command line from npm's global node_modules folder
+def package_script(node_modules):
+    import json
+    package = os.path.join(node_modules, '@daisy', 'ace')
+    try:
+        with open(os.path.join(package, 'package.json'), 'rb') as f:
+            bin = json.loads(f.read().decode('utf-8')).get('bin')
+    except (EnvironmentError, ValueError):
+        return None
+    if isinstance(bin, dict):
+        bin = bin.get('ace')
+    if not bin:
+        return None
+    return os.path.join(package, bin)
+
+
+# Locate the Node.js binary and the script of ACE's command line
+# Returns (node, script), or None if they can't be found.
+def find_ace():
+    node, ace = which('node'), which('ace')
+    if node is None or ace is None:
+        return None
+    ace = os.path.realpath(ace)
+    if ace.endswith('.js'):
+        # On Linux and macOS, npm links the script itself
+        script = ace
+    else:
+        # npm's shims are next to the global node_modules folder on Windows,
+        # and in the bin folder next to lib/node_modules otherwise
+        script = package_script(os.path.join(os.path.dirname(ace), 'node_modules')) or \
+            package_script(os.path.join(os.path.dirname(os.path.dirname(ace)), 'lib', 'node_modules'))
+    if script is None or not os.path.isfile(script):
+        return None
+    return os.path.realpath(node), script
+
+
+def file_stamp(path):
+    st = os.stat(path)
+    return [st.st_mtime, st.st_size]
+
+
+# The resolved ACE command line
+# Finding ACE and its version takes a PATH lookup, npm's shim and a shell
+# on every call, so node and the ACE script are located once and run
+# directly. They are saved in prefs (the plugin preferences, if set) with
+# their modification times and sizes, and located again when these change,
+# for instance when ACE or Node.js are updated.
+# calibre's preferences are not thread-safe: an entry found by a worker
+# thread is only kept in memory, until save() is called on the main thread.
+class AceExecutable(object):
+
+    def __init__(self, prefs=None):
+        self.prefs = prefs
+        self.entry = None
+        self.unsaved = False
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def is_valid(entry):
+        if not entry:
+            return False
+        try:
+            return file_stamp(entry['node']) == entry['node_stamp'] and \
+                file_stamp(entry['script']) == entry['script_stamp']
+        except (EnvironmentError, KeyError):
+            return False
+
+    # Get the {'node', 'script', 'version', ...} entry, or None if ACE can't be found
+    def get(self):
+        with self.lock:
+            entry = self.entry
+            if entry is None and self.prefs is not None:
+                entry = self.prefs.get('ace_executable')
+            if not self.is_valid(entry):
+                entry = self.resolve()
+                self.unsaved = self.prefs is not None
+            self.entry = entry
+        # threading.main_thread() is Python 3 only
+        if isinstance(threading.current_thread(), threading._MainThread):
+            self.save()
+        return entry
+
+    # Save the entry found by get() to prefs, on the main thread
+    def save(self):
+        with self.lock:
+            if self.unsaved:
+                self.prefs['ace_executable'] = self.entry
+                self.unsaved = False
+
+    def resolve(self):
+        found = find_ace()
+        if found is None:
+            return None
+        node, script = found
+        try:
+            output, return_code = ace_wrapper(node, script, '-v', shell=False)
+        except EnvironmentError:
+            return None
+        version = output[0].decode('utf-8').strip()
+        if return_code != 0 or not version:
+            return None
+        return {'node': node, 'script': script, 'version': version,
+                'node_stamp': file_stamp(node), 'script_stamp': file_stamp(script)}
+
+    # Get the [node, script] command, or None if ACE can't be found
+    def command(self):
+        entry = self.get()
+        if entry is None:
+            return None
+        return [entry['node'], entry['script']]
+
+
+ace_executable = AceExecutable(plugin_prefs)
+
+
+# Get the version of the installed ACE, or None if it is not installed
+def get_ace_version():
+    entry = ace_executable.get()
+    if entry is not None:
+        return entry['version']
+    try:
+        output, return_code = ace_wrapper('ace', '-v')
+    except EnvironmentError:
+        return None
+    version = output[0].decode('utf-8').strip()
+    if return_code != 0 or not version:
+        return None
+    return version
+
+
+# Outcome of a single ACE check
+class AceResult(object):
+
+    def __init__(self, report_folder):
+        self.report_folder = report_folder
+        self.report_file_name = os.path.join(report_folder, 'report.html')
+        self.json_file_name = os.path.join(report_folder, 'report.json')
+        self.return_code = None
+        self.stdout = ''
+        self.stderr = ''
+        self.earl_outcome = None
+        self.error_messages = ResultStore()
+        # Formatted traceback, if the check raised an unexpected error
+        self.traceback = None
+        # CheckState for the next incremental check
+        self.state = None
+        # Number of documents checked again, if only the changed ones were checked
+        self.rechecked = None
+        # True if the results come from the report cache
+        self.cached = False
+        # ACE version used for the check, if it had to be looked up
+        self.ace_version = None
+        # True if ACE could not be found
+        self.not_installed = False
+
+    @property
+    def has_report(self):
+        return os.path.isfile(self.report_file_name)
+
+
+# Get a path to the book that ACE can check
+# ACE can check an unpacked book, so the folder of a cloned container can be
+# used as is: only the changed files are written to it, breaking their hard
+# links to the editor's files, and nothing is compressed. Otherwise the book
+# is zipped to temp.epub.
+# EpubContainer.commit() without a path zips the book over the original
+# EPUB (the clone keeps its path), so the base Container.commit is used to
+# only write the changed files, like calibre's clone_data does.
+def write_book(container, temp_dir, unpacked=False):
+    if unpacked:
+        from calibre.ebooks.oeb.polish.container import Container
+        Container.commit(container, keep_parsed=True)
+        return container.root
+    epub_path = os.path.join(temp_dir, 'temp.epub')
+    container.commit(epub_path)
+    return epub_path
+
+
+# Run ACE on an EPUB file and parse the resulting report
+# If an engine is given (see engine.py), the warm ACE process is used and
+# the command line is only a fallback for when the engine can't be started.
+# on_rows and details are passed to parse_report, to get the rows while they
+# are parsed and the rule and snippet of each one, and on_start to ace_wrapper.
+# If a PhaseTimer is given, running ACE and parsing the report are timed.
+def check_epub(epub_path, report_folder, user_lang, split_lines, engine=None, on_rows=None, on_start=None,
+               details=None, timer=None):
+    result = AceResult(report_folder)
+
+    # Define ACE command line parameters
+    # args = ['yarn', '--cwd', 'F:\\GitHub\\ace-tool\\ace', 'ace', '-f', '-o', report_folder, '-l', user_lang, epub_path]
+    args = ['ace', '-f', '-o', report_folder, '-l', user_lang, epub_path]
+
+    # Run ACE
+    with timed(timer, 'ace'):
+        output = None
+        if engine is not None:
+            from calibre_plugins.ACE.engine import EngineError
+            try:
+                output, result.return_code = engine.check(epub_path, report_folder, user_lang)
+            except EngineError as err:
+                result.stderr = '%s\n' % err
+        if output is None:
+            command = ace_executable.command()
+            if command is not None:
+                try:
+                    output, result.return_code = ace_wrapper(*(command + args[1:]), on_start=on_start, shell=False)
+                except EnvironmentError as err:
+                    # Node.js or ACE was removed since they were located
+                    output, result.return_code = (b'', ('%s\n' % err).encode('utf-8')), 1
+                    result.not_installed = True
+            else:
+                try:
+                    output, result.return_code = ace_wrapper(*args, on_start=on_start)
+                except EnvironmentError as err:
+                    output, result.return_code = (b'', ('%s\n' % err).encode('utf-8')), 1
+                    result.not_installed = True
+                # The shell couldn't find ACE either
+                stderr = output[1].decode('utf-8')
+                if result.return_code != 0 and ('\'ace\'' in stderr or 'ace: not found' in stderr or
+                                                'ace: command not found' in stderr):
+                    result.not_installed = True
+    result.stdout = output[0].decode('utf-8')
+    result.stderr += output[1].decode('utf-8')
+
+    # ACE only gives 1 as return code when the file can't be processed.
+    # Otherwise, it returns 0, even if the book has errors.
+    if result.return_code == 1:
+        return result
+
+    # If ACE succeeded, there should be a report file in the report folder
+    if result.has_report:
+        with timed(timer, 'parse'):
+            result.earl_outcome, result.error_messages = parse_report(result.json_file_name, split_lines, on_rows,
+                                                                       details=details)
+    return result
+
+
+# Result of the check of one book, without the error messages unless asked for
+class BookSummary(object):
+
+    def __init__(self, book_id, title):
+        self.book_id = book_id
+        self.title = title
+        # 'pass', 'fail' or 'error'
+        self.status = None
+        self.counts = dict.fromkeys(SEVERITIES, 0)
+        self.error = None
+        self.error_messages = None
+
+
+# Check one book with ACE
+# Unless a report folder is given, the report is written to a temporary
+# folder that is removed afterwards.
+def check_book(book_id, title, epub_path, user_lang, split_lines, on_start=None, report_folder=None,
+               keep_messages=False):
+    summary = BookSummary(book_id, title)
+    keep_report = report_folder is not None
+    if not keep_report:
+        report_folder = tempfile.mkdtemp(prefix='ace_')
+    try:
+        result = check_epub(epub_path, report_folder, user_lang, split_lines, on_start=on_start)
+        if result.return_code == 1 or not result.has_report:
+            summary.status = 'error'
+            summary.error = result.stderr.strip()
+        else:
+            summary.status = 'fail' if result.earl_outcome == 'fail' else 'pass'
+            summary.counts = severity_counts(result.error_messages)
+            if keep_messages:
+                summary.error_messages = result.error_messages
+    except Exception:
+        summary.status = 'error'
+        summary.error = traceback.format_exc()
+    finally:
+        if not keep_report:
+            shutil.rmtree(report_folder, ignore_errors=True)
+    return summary
@@ -0,0 +1,246 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Standard libraries
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+
+SEVERITIES = ('critical', 'serious', 'moderate', 'minor')
+
+
+# Strings stored once, and referred to by number
+class StringTable(object):
+
+    def __init__(self, strings=()):
+        self.ids = {}
+        self.strings = []
+        for string in strings:
+            self.id(string)
+
+    def id(self, string):
+        try:
+            return self.ids[string]
+        except KeyError:
+            self.ids[string] = len(self.strings)
+            self.strings.append(string)
+            return len(self.strings) - 1
+
+    def __len__(self):
+        return len(self.strings)
+
+    # Get a table of the strings used by ids, and the ids renumbered for it
+    def subset(self, ids):
+        numbers = {}
+        new_ids = [numbers.setdefault(i, len(numbers)) for i in ids]
+        table = StringTable()
+        table.strings = [self.strings[i] for i in sorted(numbers, key=numbers.get)]
+        table.ids = dict((string, i) for i, string in enumerate(table.strings))
+        return table, new_ids
+
+    # Get the ids of this table for the strings of another table
+    def mapping(self, other):
+        return [self.id(string) for string in other.strings]
+
+
+# Compact list of (msg_index, error_message, error_level, file_name, epubcfi) rows
+# Large reports repeat the same messages and file names thousands of times,
+# so the rows are stored in columns: numbers in arrays, pointing to tables
+# of messages, files, severities and rules. Rows are read back as tuples,
+# so the store can be used like the list it replaces.
+# Rows are numbered by position (msg_index), starting from offset, like
+# parse_report numbers them. The rule of each row (ACE's error id) is kept
+# when known.
+class ResultStore(object):
+
+    def __init__(self, rows=(), offset=0):
+        self.offset = offset
+        self.messages = StringTable()
+        self.files = StringTable()
+        # Known severities have their rank as code
+        self.levels = StringTable(SEVERITIES)
+        self.rules = StringTable()
+        self.message_ids = array(str('i'))
+        self.file_ids = array(str('i'))
+        self.level_codes = array(str('b'))
+        self.rule_ids = array(str('i'))
+        # Mostly unique, so not worth a table
+        self.cfis = []
+        self.extend(rows)
+
+    def append(self, error_msg, rule=None):
+        msg_index, error_message, error_level, file_name, epubcfi = error_msg
+        self.message_ids.append(self.messages.id(error_message))
+        self.level_codes.append(self.levels.id(error_level))
+        self.file_ids.append(self.files.id(file_name))
+        self.rule_ids.append(self.rules.id(rule))
+        self.cfis.append(epubcfi)
+
+    def columns(self):
+        return ((self.messages, self.message_ids), (self.levels, self.level_codes), (self.files, self.file_ids),
+                (self.rules, self.rule_ids))
+
+    def extend(self, rows):
+        if isinstance(rows, ResultStore):
+            # Column by column, looking up each string once
+            for (table, ids), (their_table, their_ids) in zip(self.columns(), rows.columns()):
+                mapping = table.mapping(their_table)
+                ids.extend(array(ids.typecode, [mapping[i] for i in their_ids]))
+            self.cfis.extend(rows.cfis)
+        else:
+            for error_msg in rows:
+                self.append(error_msg)
+
+    def row(self, i):
+        return (self.offset + i, self.messages.strings[self.message_ids[i]], self.levels.strings[self.level_codes[i]],
+                self.files.strings[self.file_ids[i]], self.cfis[i])
+
+    # Rule of a row, or None if unknown
+    def rule(self, i):
+        return self.rules.strings[self.rule_ids[i]]
+
+    # Severity rank of a row, unknown severities rank as minor
+    def rank(self, i):
+        return min(self.level_codes[i], len(SEVERITIES) - 1)
+
+    # Number of rows of each severity rank, and by file id and rule id
+    def counts(self):
+        ranks = [0] * len(SEVERITIES)
+        for code, count in Counter(self.level_codes).items():
+            ranks[min(code, len(SEVERITIES) - 1)] += count
+        return ranks, Counter(self.file_ids), Counter(self.rule_ids)
+
+    def __len__(self):
+        return len(self.cfis)
+
+    # A slice is a store of its own, numbered like in this one
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self.row(j) for j in range(start, stop, step)]
+            part = ResultStore(offset=self.offset + start)
+            for (table, ids), (part_table, part_ids) in zip(self.columns(), part.columns()):
+                if table is self.levels:
+                    # Known severities keep their codes
+                    part.levels.strings, part.levels.ids = list(table.strings), dict(table.ids)
+                    part_ids.extend(ids[start:stop])
+                    continue
+                subset, subset_ids = table.subset(ids[start:stop])
+                part_table.strings, part_table.ids = subset.strings, subset.ids
+                part_ids.extend(array(ids.typecode, subset_ids))
+            part.cfis = self.cfis[start:stop]
+            return part
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('row out of range')
+        return self.row(i)
+
+    def __iter__(self):
+        messages, levels, files = self.messages.strings, self.levels.strings, self.files.strings
+        for i, (message_id, level_code, file_id, epubcfi) in enumerate(
+                zip(self.message_ids, self.level_codes, self.file_ids, self.cfis)):
+            yield self.offset + i, messages[message_id], levels[level_code], files[file_id], epubcfi
+
+    def __bool__(self):
+        return len(self) > 0
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'ResultStore(%d rows, %d messages, %d files)' % (len(self), len(self.messages), len(self.files))
+
+
+# Rows of a ResultStore by severity, file, rule and message words
+# Built once, so the dock can be filtered on every keystroke without reading
+# every row again: the rows of the most selective filter are looked up, and
+# only those are tested against the other filters, using the store's columns.
+class ResultIndex(object):
+
+    word_re = re.compile(r'\w+', re.UNICODE)
+
+    def __init__(self, store):
+        self.store = store
+        # Level code / file id / rule id / message id -> rows, in report order
+        self.by_level = self.group(store.level_codes)
+        self.by_file = self.group(store.file_ids)
+        self.by_rule = self.group(store.rule_ids)
+        self.by_message = self.group(store.message_ids)
+        # Sorted words of the messages, and the ids of the messages that have them
+        words = {}
+        for message_id, message in enumerate(store.messages.strings):
+            for word in set(self.word_re.findall(message.lower())):
+                words.setdefault(word, []).append(message_id)
+        self.words = sorted(words)
+        self.word_messages = [words[word] for word in self.words]
+
+    @staticmethod
+    def group(ids):
+        groups = {}
+        for row, i in enumerate(ids):
+            try:
+                groups[i].append(row)
+            except KeyError:
+                groups[i] = array(str('i'), (row,))
+        return groups
+
+    # Ids of the messages with a word starting with prefix
+    def messages_with(self, prefix):
+        message_ids = set()
+        i = bisect_left(self.words, prefix)
+        while i < len(self.words) and self.words[i].startswith(prefix):
+            message_ids.update(self.word_messages[i])
+            i += 1
+        return message_ids
+
+    # Get the rows matching all the filters given: a severity rank (see
+    # ResultStore.rank), a file id, a rule id and text whose words must all
+    # start words of the message. Returns None if all rows match.
+    def search(self, rank=None, file_id=None, rule_id=None, text=''):
+        store = self.store
+        # (number of rows, rows, test of a row) of each filter
+        filters = []
+        if rank is not None:
+            codes = [code for code in self.by_level if min(code, len(SEVERITIES) - 1) == rank]
+            filters.append((sum(len(self.by_level[code]) for code in codes),
+                            chain.from_iterable(self.by_level[code] for code in codes),
+                            lambda row: store.rank(row) == rank))
+        if file_id is not None:
+            rows = self.by_file.get(file_id, ())
+            filters.append((len(rows), rows, lambda row: store.file_ids[row] == file_id))
+        if rule_id is not None:
+            rows = self.by_rule.get(rule_id, ())
+            filters.append((len(rows), rows, lambda row: store.rule_ids[row] == rule_id))
+        words = self.word_re.findall(text.lower())
+        if words:
+            message_ids = self.messages_with(words[0])
+            for word in words[1:]:
+                message_ids &= self.messages_with(word)
+            filters.append((sum(len(self.by_message[i]) for i in message_ids),
+                            chain.from_iterable(self.by_message[i] for i in message_ids),
+                            lambda row: store.message_ids[row] in message_ids))
+        # Filters matching every row don't filter anything
+        filters = [f for f in filters if f[0] < len(store)]
+        if not filters:
+            return None
+        filters.sort(key=lambda f: f[0])
+        tests = [test for size, rows, test in filters[1:]]
+        return [row for row in filters[0][1] if all(test(row) for test in tests)]
@@ -0,0 +1,106 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Standard libraries
+import os.path
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Calibre libraries
+from calibre.utils.config import config_dir
+
+# Load translation files (.mo) on the folder 'translations'
+load_translations()
+
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+
+
+def default_log_path():
+    return os.path.join(config_dir, 'plugins', 'ACE_performance.log')
+
+
+# Durations of the phases of a check, and facts about the checked book
+# Phases can be timed from the GUI thread and the worker thread; timing
+# the same phase more than once adds up the durations.
+class PhaseTimer(object):
+
+    def __init__(self):
+        self.start = time.time()
+        self.phases = OrderedDict()
+        # Book size, number of documents, number of assertions...
+        self.stats = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, name, duration):
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0) + duration
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, time.time() - start)
+
+    def total(self):
+        return time.time() - self.start
+
+    # Short breakdown for the status bar, slowest phases first
+    def summary(self, count=4):
+        phases = sorted(self.phases.items(), key=lambda item: item[1], reverse=True)[:count]
+        return _('Checked in {0:.1f} s ({1}).').format(
+            self.total(), ', '.join('%s %.1f s' % (name, duration) for name, duration in phases))
+
+    def record(self):
+        record = OrderedDict()
+        record['time'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.start))
+        record['total'] = round(self.total(), 3)
+        record['phases'] = OrderedDict((name, round(duration, 3)) for name, duration in self.phases.items())
+        record.update(self.stats)
+        return record
+
+
+# Time a phase if there is a timer
+@contextmanager
+def timed(timer, name):
+    if timer is None:
+        yield
+    else:
+        with timer.phase(name):
+            yield
+
+
+_logger = None
+
+
+def performance_logger():
+    global _logger
+    if _logger is None:
+        import logging
+        from logging.handlers import RotatingFileHandler
+        logger = logging.getLogger('calibre_plugins.ACE.performance')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        handler = RotatingFileHandler(default_log_path(), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                      encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        _logger = logger
+    return _logger
+
+
+# Append the timings of a check to the performance log, as a line of JSON
+def log_timings(timer):
+    import json
+    performance_logger().info(json.dumps(timer.record()))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# PyQt libraries
+try:
+    from qt.core import QThread, pyqtSignal
+except ImportError:
+    from PyQt5.Qt import QThread, pyqtSignal
+
+# Plugin libraries
+from calibre_plugins.ACE.runner import ace_wrapper, get_ace_version
+
+
+def is_connected():
+    import socket
+    try:
+        sock = socket.create_connection(('8.8.8.8', 53), 1)
+        sock.close()
+        return True
+    except:
+        return False
+
+
+# Looks up the installed and the latest ACE versions in the background
+# 'npm view' only asks the registry about ACE, unlike 'npm outdated -g',
+# which checks every global package.
+class UpdateChecker(QThread):
+
+    # Emitted with the installed version, the latest version and an error:
+    # 'offline', 'npm' (Node.js is not installed) or None
+    checked = pyqtSignal(object, object, object)
+
+    def run(self):
+        if not is_connected():
+            self.checked.emit(None, None, 'offline')
+            return
+        try:
+            installed = get_ace_version()
+        except EnvironmentError:
+            installed = None
+        try:
+            output, return_code = ace_wrapper('npm', 'view', '@daisy/ace', 'version')
+        except EnvironmentError:
+            self.checked.emit(installed, None, 'npm')
+            return
+        if return_code != 0:
+            self.checked.emit(installed, None, 'npm' if b"'npm'" in output[1] else None)
+            return
+        latest = output[0].decode('utf-8').strip() or None
+        self.checked.emit(installed, latest, None)
+
+
+# Installs the latest ACE in the background
+class UpdateInstaller(QThread):
+
+    # Emitted with the return code of npm and the installed version
+    installed = pyqtSignal(object, object)
+
+    def run(self):
+        try:
+            return_code = ace_wrapper('npm', 'install', '@daisy/ace', '-g')[1]
+            version = get_ace_version()
+        except EnvironmentError:
+            return_code, version = None, None
+        self.installed.emit(return_code, version)
+
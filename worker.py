@@ -0,0 +1,214 @@
+#!/usr/bin/env python2
+# vim:fileencoding=utf-8
+
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__ = 'GPL v3'
+__copyright__ = '2018-2022, Thiago Oliveira'
+__docformat__ = 'restructuredtext en'
+
+# Standard libraries
+import os
+import os.path
+import shutil
+import traceback
+
+# PyQt libraries
+try:
+    from qt.core import QThread, pyqtSignal
+except ImportError:
+    from PyQt5.Qt import QThread, pyqtSignal
+
+# Plugin libraries
+from calibre_plugins.ACE.runner import AceResult, check_epub, get_ace_version, write_book
+from calibre_plugins.ACE import incremental, parallel
+from calibre_plugins.ACE.navigation import resolve_lines
+from calibre_plugins.ACE.timing import timed
+
+
+# Runs a full ACE check outside the GUI thread
+# The container must be a clone of the editor's container (see clone_container),
+# so the user can keep editing the book while it is being written and checked.
+class AceWorker(QThread):
+
+    # Emitted with an AceResult once the check is done
+    result_ready = pyqtSignal(object)
+    # Emitted with batches of rows while a full report is being parsed
+    rows_ready = pyqtSignal(object)
+    # Emitted after result_ready with the line numbers of the errors (see navigation.resolve_lines)
+    lines_ready = pyqtSignal(object, object)
+    # Emitted after result_ready with the RunDiff since the last check of the book (see history.py)
+    history_ready = pyqtSignal(object)
+
+    # If engine_timeout is given, the warm ACE process is used (see engine.py),
+    # and closed after that many seconds without checks. state is the
+    # CheckState of the last check of this book. If given, only
+    # the documents changed since then are checked again (see incremental.py).
+    # If a ReportCache is given, unchanged books are not checked again.
+    # If parallel_parts is not None, large books are checked in parts at the
+    # same time (see parallel.py). If unpacked is True, ACE checks the folder
+    # of the container instead of a zipped copy (see write_book). If a
+    # RunHistory is given, the results are stored in it under the book's path.
+    # If a PhaseTimer is given, each phase of the check is timed. If only is
+    # a set of spine names, just these documents are checked, and the result
+    # only has their rows (see live checks in main.py).
+    def __init__(self, container, temp_dir, report_folder, user_lang, split_lines, engine_timeout=None,
+                 incremental_check=False, state=None, cache=None, ace_version=None, parallel_parts=None,
+                 unpacked=False, history=None, book=None, timer=None, only=None, parent=None):
+        QThread.__init__(self, parent)
+        self.container = container
+        self.temp_dir = temp_dir
+        self.report_folder = report_folder
+        self.user_lang = user_lang
+        self.split_lines = split_lines
+        self.engine_timeout = engine_timeout
+        self.incremental_check = incremental_check
+        self.state = state
+        self.cache = cache
+        self.ace_version = ace_version
+        self.parallel_parts = parallel_parts
+        self.unpacked = unpacked
+        self.history = history
+        self.book = book
+        self.timer = timer
+        self.only = only
+        # Rule and snippet of each assertion, for the history
+        self.details = {} if history is not None else None
+
+    def run(self):
+        result = AceResult(self.report_folder)
+        try:
+            try:
+                result = self.check()
+            except Exception:
+                result.traceback = traceback.format_exc()
+            self.result_ready.emit(result)
+
+            # Store the results and compare them with the last check
+            if self.history is not None and result.traceback is None and result.earl_outcome is not None:
+                try:
+                    with timed(self.timer, 'history'):
+                        run = self.history.record(self.book, result.earl_outcome, result.error_messages,
+                                                  result.ace_version or self.ace_version, self.user_lang,
+                                                  self.details)
+                        diff = self.history.diff(run)
+                except Exception:
+                    traceback.print_exc()
+                else:
+                    if diff is not None:
+                        self.history_ready.emit(diff)
+
+            # Resolve the line of each error while the user reads the results
+            if result.traceback is None and result.error_messages:
+                try:
+                    with timed(self.timer, 'lines'):
+                        lines, digests = resolve_lines(self.container, result.error_messages)
+                except Exception:
+                    # Errors can still be located when clicked
+                    traceback.print_exc()
+                else:
+                    self.lines_ready.emit(lines, digests)
+        finally:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            # The worker may outlive the check: don't keep the cloned book
+            self.container = self.details = None
+
+    def check(self):
+        settings = (self.user_lang, self.split_lines)
+        fingerprints = rechecked = cache_key = None
+        if self.timer is not None:
+            self.timer.stats['book_size'] = sum(os.path.getsize(path) for path in
+                                                self.container.name_path_map.values())
+            self.timer.stats['documents'] = len(incremental.spine_names(self.container))
+
+        # Live checks skip the report cache and the incremental state
+        # Restricting the spine only changes the clone: write_book writes
+        # its OPF to the clone's folder or to temp.epub, never to the book.
+        if self.only is not None:
+            incremental.restrict_spine(self.container, self.only)
+            with timed(self.timer, 'write'):
+                epub_path = write_book(self.container, self.temp_dir, self.unpacked)
+            result = check_epub(epub_path, self.report_folder, self.user_lang, self.split_lines,
+                                self.get_engine(), timer=self.timer)
+            if result.earl_outcome is not None:
+                # Package level assertions are already in the dock
+                assertions = incremental.group_by_file(self.container, result.error_messages)
+                result.error_messages = incremental.flatten(self.container, dict(
+                    (name, assertions[name]) for name in self.only if name in assertions))
+                result.rechecked = len(self.only)
+            return result
+        if self.incremental_check or self.cache is not None:
+            with timed(self.timer, 'fingerprint'):
+                fingerprints = incremental.fingerprint(self.container)
+
+        # Reuse the results of an identical book
+        if self.cache is not None:
+            # The version saved in prefs misses updates made with npm, so
+            # the installed one is used (see runner.AceExecutable)
+            ace_version = get_ace_version()
+            if ace_version is not None:
+                cache_key = self.cache.key(fingerprints, ace_version, self.user_lang, self.split_lines)
+                with timed(self.timer, 'cache'):
+                    cached = self.cache.get(cache_key, self.report_folder)
+                if cached is not None:
+                    result = AceResult(self.report_folder)
+                    result.earl_outcome, result.error_messages = cached
+                    result.return_code = 0
+                    result.cached = True
+                    result.ace_version = ace_version
+                    if self.incremental_check:
+                        assertions = incremental.group_by_file(self.container, result.error_messages)
+                        result.state = incremental.CheckState(settings, fingerprints, assertions)
+                    return result
+
+        if self.incremental_check:
+            rechecked = incremental.changed_documents(self.container, self.state, fingerprints, settings)
+            if rechecked is not None:
+                # Like for live checks, only the clone changes
+                incremental.restrict_spine(self.container, rechecked)
+
+        parts = 1
+        if rechecked is None and self.parallel_parts is not None:
+            parts = parallel.part_count(self.container, self.parallel_parts)
+        if parts > 1:
+            result = parallel.check_parallel(self.container, self.temp_dir, self.report_folder,
+                                             self.user_lang, self.split_lines, parts, self.unpacked,
+                                             details=self.details, timer=self.timer)
+        else:
+            with timed(self.timer, 'write'):
+                epub_path = write_book(self.container, self.temp_dir, self.unpacked)
+            # Rows of partial checks are merged before being shown
+            on_rows = self.rows_ready.emit if rechecked is None else None
+            result = check_epub(epub_path, self.report_folder, self.user_lang, self.split_lines,
+                                self.get_engine(), on_rows, details=self.details, timer=self.timer)
+        if self.cache is not None:
+            result.ace_version = ace_version
+
+        # Only complete reports are cached
+        if cache_key is not None and rechecked is None and result.earl_outcome is not None:
+            self.cache.put(cache_key, self.report_folder, result.earl_outcome, result.error_messages)
+
+        # Remember the results of each file for the next check
+        if self.incremental_check and result.earl_outcome is not None:
+            assertions = incremental.group_by_file(self.container, result.error_messages)
+            if rechecked is not None:
+                assertions, result.error_messages = incremental.merge(
+                    self.container, self.state, rechecked, assertions)
+                result.earl_outcome = 'fail' if result.error_messages else 'pass'
+                result.rechecked = len(rechecked)
+            result.state = incremental.CheckState(settings, fingerprints, assertions)
+        return result
+
+    # Get the warm ACE process, or None to use the command line
+    # Finding ACE runs node and npm, so the engine is set up on this thread;
+    # if that fails, the check falls back to the command line.
+    def get_engine(self):
+        if self.engine_timeout is None:
+            return None
+        from calibre_plugins.ACE.engine import EngineError, get_engine
+        try:
+            return get_engine(self.engine_timeout)
+        except (EnvironmentError, EngineError):
+            traceback.print_exc()
+            return None